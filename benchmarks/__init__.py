@@ -0,0 +1,4 @@
+"""
+Benchmarks for the EFT Chatbot
+Run from the repository root, e.g. python -m benchmarks.db_connections
+"""
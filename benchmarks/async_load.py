@@ -0,0 +1,131 @@
+"""
+Load test for the model call path: blocking worker threads vs async handlers
+
+Simulates many chat sessions each sending a message at the same moment, all
+answered by the local fake OpenAI server. The synchronous run pushes them
+through a fixed pool of worker threads calling the blocking client, as Gradio
+workers did; the async run awaits modules.model_client.complete_chat on one
+event loop, where waiting on the model holds no thread at all.
+A third run streams the replies and reports time to first token, which is
+what the user perceives as the wait.
+Reports how many sessions the fake API saw at once, throughput and latency.
+
+Usage:
+    python -m benchmarks.async_load --sessions 200 --workers 8 --latency 2.0
+"""
+
+import os
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import OpenAI
+
+from modules import model_client
+from benchmarks.common import percentile
+from benchmarks.fake_openai_server import start_fake_server
+
+PROMPT = [
+    {"role": "system", "content": "You are Sarah, an EFT therapist chatbot."},
+    {"role": "user", "content": "I've been feeling really anxious about work lately"}
+]
+
+def run_sync(base_url, sessions, workers):
+    """Each session's call occupies a worker thread for the full model latency"""
+    client = OpenAI(api_key="bench", base_url=base_url, max_retries=0)
+
+    def handle(submitted):
+        client.chat.completions.create(model="bench", messages=PROMPT)
+        return (time.perf_counter() - submitted) * 1000.0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(handle, time.perf_counter()) for _ in range(sessions)]
+        latencies = [future.result() for future in futures]
+    return latencies, time.perf_counter() - start
+
+async def _run_async(sessions):
+    async def handle():
+        submitted = time.perf_counter()
+        await model_client.complete_chat(PROMPT, model="bench")
+        return (time.perf_counter() - submitted) * 1000.0
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(handle() for _ in range(sessions)))
+    elapsed = time.perf_counter() - start
+    await model_client.close_model_client()
+    return list(latencies), elapsed
+
+def run_async(base_url, sessions, max_concurrency):
+    """Sessions await the model on one event loop; only the semaphore limits them"""
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["OPENAI_BASE_URL"] = base_url
+    model_client.MODEL_MAX_CONCURRENCY = max_concurrency
+    model_client.reset_model_client()
+    return asyncio.run(_run_async(sessions))
+
+async def _run_stream(sessions):
+    async def handle():
+        submitted = time.perf_counter()
+        first_token = None
+        async for _ in model_client.stream_chat(PROMPT, model="bench"):
+            if first_token is None:
+                first_token = (time.perf_counter() - submitted) * 1000.0
+        return first_token, (time.perf_counter() - submitted) * 1000.0
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(handle() for _ in range(sessions)))
+    elapsed = time.perf_counter() - start
+    await model_client.close_model_client()
+    return [r[0] for r in results], [r[1] for r in results], elapsed
+
+def run_stream(base_url, sessions, max_concurrency):
+    """Like run_async, but streamed, recording time to first token as well"""
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["OPENAI_BASE_URL"] = base_url
+    model_client.MODEL_MAX_CONCURRENCY = max_concurrency
+    model_client.reset_model_client()
+    return asyncio.run(_run_stream(sessions))
+
+def report(label, latencies, elapsed, server):
+    print(
+        f"{label:<34} sessions={len(latencies):<5} "
+        f"peak_concurrent={server.peak_in_flight:<5} "
+        f"wall={elapsed:6.2f}s "
+        f"replies/s={len(latencies) / elapsed:7.1f} "
+        f"p50={percentile(latencies, 50) / 1000:.2f}s "
+        f"p95={percentile(latencies, 95) / 1000:.2f}s"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Async vs blocking model call load test")
+    parser.add_argument("--sessions", type=int, default=200, help="Concurrent chat sessions")
+    parser.add_argument("--workers", type=int, default=8, help="Worker threads for the blocking run")
+    parser.add_argument("--max-concurrency", type=int, default=model_client.MODEL_MAX_CONCURRENCY,
+                        help="In-flight model call limit for the async run")
+    parser.add_argument("--latency", type=float, default=2.0, help="Fake model latency in seconds")
+    args = parser.parse_args()
+
+    server = start_fake_server(latency=args.latency)
+    print(f"Fake API at {server.base_url}, latency {args.latency:.1f}s\n")
+
+    try:
+        latencies, elapsed = run_sync(server.base_url, args.sessions, args.workers)
+        report(f"blocking, {args.workers} workers", latencies, elapsed, server)
+
+        server.reset_stats()
+        latencies, elapsed = run_async(server.base_url, args.sessions, args.max_concurrency)
+        report(f"async, limit {args.max_concurrency}", latencies, elapsed, server)
+
+        server.reset_stats()
+        first_tokens, latencies, elapsed = run_stream(server.base_url, args.sessions, args.max_concurrency)
+        report(f"async streamed, limit {args.max_concurrency}", latencies, elapsed, server)
+        print(f"{'':<34} time to first token "
+              f"p50={percentile(first_tokens, 50) / 1000:.2f}s "
+              f"p95={percentile(first_tokens, 95) / 1000:.2f}s")
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
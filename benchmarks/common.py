@@ -0,0 +1,56 @@
+"""
+Shared helpers for the benchmark scripts
+"""
+
+import os
+import time
+import tempfile
+import statistics
+
+from modules import database
+
+def use_temp_database(name="bench.db"):
+    """Point modules.database at a fresh database in a temporary directory"""
+    temp_dir = tempfile.mkdtemp(prefix="eft_bench_")
+    database.close_pool()
+    database.DB_PATH = os.path.join(temp_dir, name)
+    database.setup_database()
+    return database.DB_PATH
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+def time_calls(func, iterations):
+    """Call func() repeatedly and return per-call latencies in milliseconds"""
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    return latencies
+
+def summarise(label, latencies):
+    """Print throughput and latency percentiles for a set of samples"""
+    total_seconds = sum(latencies) / 1000.0
+    throughput = len(latencies) / total_seconds if total_seconds else 0.0
+    print(
+        f"{label:<44} n={len(latencies):<7} "
+        f"mean={statistics.mean(latencies):.3f}ms "
+        f"p50={percentile(latencies, 50):.3f}ms "
+        f"p95={percentile(latencies, 95):.3f}ms "
+        f"p99={percentile(latencies, 99):.3f}ms "
+        f"ops/s={throughput:,.0f}"
+    )
+
+def file_size_mb(path):
+    """Size of a SQLite database including its WAL file, in megabytes"""
+    size = 0
+    for candidate in (path, path + "-wal"):
+        if os.path.exists(candidate):
+            size += os.path.getsize(candidate)
+    return size / (1024 * 1024)
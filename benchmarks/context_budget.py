@@ -0,0 +1,80 @@
+"""
+Prompt size per turn with and without the token-budgeted context window
+
+Plays a long synthetic conversation against the local fake OpenAI server,
+which also answers the background summary requests, and prints the prompt
+tokens each turn would send with the full history versus what
+modules.context_window actually sends.
+
+Usage:
+    python -m benchmarks.context_budget --turns 40 --budget 1500 --recent-turns 4
+"""
+
+import os
+import asyncio
+import argparse
+
+from modules import model_client, context_window
+from benchmarks.fake_openai_server import start_fake_server
+
+# Stands in for build_personalised_prompt's system message, which is about this size
+SYSTEM_PROMPT = (
+    "You are Sarah, an EFT (Emotional Freedom Techniques) therapist chatbot. "
+    "Your role is to provide supportive EFT tapping guidance. Be warm, conversational, and helpful. "
+) * 6
+
+USER_TURNS = [
+    "I've been feeling really anxious about my presentation at work next week",
+    "It sits in my chest, like a tight band, maybe a 7 out of 10",
+    "I keep imagining everyone staring at me and me forgetting what to say",
+    "Okay, let's tap on that",
+    "It's down to about a 5 now, but the worry about forgetting is still there",
+    "My manager will be there and I really want to make a good impression",
+]
+
+async def play(turns, window):
+    history = []
+    print(f"{'turn':>4} {'full history':>13} {'sent':>6} {'summarised msgs':>16}")
+    for turn in range(turns):
+        history.append({"role": "user", "content": USER_TURNS[turn % len(USER_TURNS)]})
+        full = [{"role": "system", "content": SYSTEM_PROMPT}] + history
+        sent = window.fit(full)
+
+        reply = await model_client.complete_chat(sent, model="bench")
+        history.append({"role": "assistant", "content": reply})
+        window.schedule_summary(history)
+
+        if turn % 5 == 4 or turn == turns - 1:
+            print(f"{turn + 1:>4} {context_window.count_message_tokens(full):>13} "
+                  f"{context_window.count_message_tokens(sent):>6} {window.summarised_upto:>16}")
+
+    # Let a summary still in flight finish before the process exits
+    await asyncio.sleep(0.5)
+    await model_client.close_model_client()
+
+def main():
+    parser = argparse.ArgumentParser(description="Context window token budget benchmark")
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--budget", type=int, default=context_window.CONTEXT_TOKEN_BUDGET)
+    parser.add_argument("--recent-turns", type=int, default=context_window.CONTEXT_RECENT_TURNS)
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake model latency in seconds")
+    args = parser.parse_args()
+
+    server = start_fake_server(latency=args.latency)
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    model_client.reset_model_client()
+
+    try:
+        window = context_window.ContextWindow(args.budget, args.recent_turns)
+        asyncio.run(play(args.turns, window))
+    finally:
+        server.shutdown()
+
+    stats = context_window.get_context_stats()
+    print(f"\nAverage prompt tokens per turn: {stats['avg_prompt_tokens_full']:.0f} full history, "
+          f"{stats['avg_prompt_tokens_sent']:.0f} sent "
+          f"({stats['summaries']} summaries, {stats['summary_failures']} failed)")
+
+if __name__ == "__main__":
+    main()
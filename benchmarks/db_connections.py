@@ -0,0 +1,58 @@
+"""
+Benchmark per-call latency of database helpers with and without the connection pool
+
+Usage:
+    python -m benchmarks.db_connections [iterations]
+"""
+
+import sys
+import uuid
+import sqlite3
+import datetime
+
+from modules import database
+from benchmarks.common import use_temp_database, time_calls, summarise
+
+def store_message_unpooled(session_id):
+    """The original store_message: a fresh connection and commit per call"""
+    conn = sqlite3.connect(database.DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO messages (message_id, session_id, timestamp, sender, content, emotion) VALUES (?, ?, ?, ?, ?, ?)",
+        (str(uuid.uuid4()), session_id, datetime.datetime.now().isoformat(), "user", "I feel anxious", "anxious")
+    )
+    conn.commit()
+    conn.close()
+
+def session_count_unpooled(user_id):
+    """The original get_user_session_count: a fresh connection per call"""
+    conn = sqlite3.connect(database.DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM sessions WHERE user_id = ?", (user_id,))
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
+
+def main(iterations=2000):
+    db_path = use_temp_database()
+    print(f"Benchmark database: {db_path}")
+    
+    user_id = str(uuid.uuid4())
+    session_id = database.create_session(user_id)
+    
+    # Before: one connection per call, default rollback journal
+    summarise("store_message (connect per call)",
+              time_calls(lambda: store_message_unpooled(session_id), iterations))
+    summarise("get_user_session_count (connect per call)",
+              time_calls(lambda: session_count_unpooled(user_id), iterations))
+    
+    # After: pooled connections with WAL and statement cache
+    summarise("store_message (pooled)",
+              time_calls(lambda: database.store_message(session_id, "user", "I feel anxious", "anxious"), iterations))
+    summarise("get_user_session_count (pooled)",
+              time_calls(lambda: database.get_user_session_count(user_id), iterations))
+    
+    database.close_pool()
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
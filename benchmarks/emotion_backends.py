@@ -0,0 +1,104 @@
+"""
+PyTorch versus int8 ONNX Runtime emotion backends on CPU
+
+Each backend runs in its own process so resident memory is measured
+without the other's libraries loaded. For each backend it reports:
+  - load time
+  - single-message latency
+  - batched throughput
+  - peak RSS
+It also checks label agreement between the two on the parity corpus.
+
+Export the ONNX model first:
+    python -m modules.emotion_onnx
+
+Usage:
+    python -m benchmarks.emotion_backends --messages 256 --threads 4
+"""
+
+import sys
+import json
+import time
+import resource
+import argparse
+import subprocess
+
+from benchmarks.common import percentile
+
+def run_worker(backend, messages, batch_size, threads):
+    """Measure one backend in this process and print the results as JSON"""
+    from modules import emotion_onnx
+    from modules.emotion_analysis import EmotionAnalyzer
+
+    emotion_onnx.ONNX_INTRA_OP_THREADS = threads
+    if backend == "torch" and threads:
+        import torch
+        torch.set_num_threads(threads)
+
+    analyzer = EmotionAnalyzer(backend)
+    start = time.perf_counter()
+    if not analyzer.load():
+        print(json.dumps({"backend": backend, "error": "model did not load"}))
+        return
+    load_seconds = time.perf_counter() - start
+
+    corpus = emotion_onnx.PARITY_TEXTS
+    texts = [corpus[i % len(corpus)] for i in range(messages)]
+
+    latencies = []
+    for text in texts:
+        start = time.perf_counter()
+        analyzer.detect_emotion(text)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        analyzer.detect_emotions(texts[i:i + batch_size])
+    throughput = len(texts) / (time.perf_counter() - start)
+
+    print(json.dumps({
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "throughput": throughput,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        "labels": [result[0]["label"] for result in analyzer.classifier(list(corpus), batch_size=len(corpus))]
+    }))
+
+def measure(backend, args):
+    command = [sys.executable, "-m", "benchmarks.emotion_backends", "--worker", backend,
+               "--messages", str(args.messages), "--batch-size", str(args.batch_size), "--threads", str(args.threads)]
+    output = subprocess.run(command, capture_output=True, text=True).stdout
+    lines = [line for line in output.splitlines() if line.startswith("{")]
+    return json.loads(lines[-1]) if lines else {"backend": backend, "error": "worker failed"}
+
+def main():
+    parser = argparse.ArgumentParser(description="Emotion backend benchmark")
+    parser.add_argument("--messages", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads (0: library default)")
+    parser.add_argument("--worker", choices=["torch", "onnx"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.messages, args.batch_size, args.threads)
+        return
+
+    results = [measure(backend, args) for backend in ("torch", "onnx")]
+    print(f"{'backend':<8} {'load':>7} {'p50':>9} {'p95':>9} {'msgs/s':>9} {'peak RSS':>10}")
+    for result in results:
+        if "error" in result:
+            print(f"{result['backend']:<8} {result['error']}")
+            continue
+        print(f"{result['backend']:<8} {result['load_seconds']:>6.2f}s {result['p50_ms']:>7.2f}ms "
+              f"{result['p95_ms']:>7.2f}ms {result['throughput']:>9.1f} {result['peak_rss_mb']:>8.0f}MB")
+
+    torch_result, onnx_result = results
+    if "labels" in torch_result and "labels" in onnx_result:
+        same = sum(a == b for a, b in zip(torch_result["labels"], onnx_result["labels"]))
+        print(f"\nlabel agreement on the parity corpus: {same}/{len(torch_result['labels'])}")
+
+if __name__ == "__main__":
+    main()
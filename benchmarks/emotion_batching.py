@@ -0,0 +1,107 @@
+"""
+Emotion inference throughput against batch size on CPU
+
+Loads the real emotion model and measures:
+  1. detect_emotions() throughput with fixed batch sizes
+  2. concurrent callers tagging one message each, either calling the model
+     directly (one forward pass per message) or through the EmotionBatcher
+
+Needs transformers and torch; the model is downloaded on first use.
+
+Usage:
+    python -m benchmarks.emotion_batching --messages 512 --callers 32
+"""
+
+import time
+import argparse
+import threading
+
+from modules.emotion_analysis import EmotionAnalyzer, EmotionBatcher
+from benchmarks.common import percentile
+
+SAMPLE_MESSAGES = [
+    "I've been feeling really anxious about work lately",
+    "My chest feels tight whenever I think about the presentation",
+    "I'm so angry at my brother for what he said",
+    "I feel sad and I don't really know why",
+    "Honestly I'm a bit better after that round",
+    "It's about a 7 right now",
+    "I keep worrying that I'll lose my job",
+    "I miss my mum so much since she passed",
+    "Everything feels like too much at the moment and I can't switch off at night",
+    "I'm frustrated that nothing seems to help",
+    "That was surprising, I didn't expect to feel lighter",
+    "I'm scared of flying and I have a trip next week",
+    "I feel calm now, thank you",
+    "My partner and I argued again this morning and I'm still shaking",
+    "I don't know, just tired and low",
+    "I'm grateful for this, it really helped",
+]
+
+def messages(count):
+    return [SAMPLE_MESSAGES[i % len(SAMPLE_MESSAGES)] for i in range(count)]
+
+def batch_throughput(analyzer, texts, batch_size):
+    """Messages per second tagging texts in fixed-size batches"""
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        analyzer.detect_emotions(texts[i:i + batch_size])
+    return len(texts) / (time.perf_counter() - start)
+
+def concurrent_callers(detect, texts, callers):
+    """Tag texts from several threads at once; returns (messages/s, per-message latencies in ms)"""
+    latencies = []
+    lock = threading.Lock()
+    pending = list(texts)
+
+    def caller():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                text = pending.pop()
+            start = time.perf_counter()
+            detect(text)
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000.0)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=caller) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(texts) / (time.perf_counter() - start), latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="Emotion micro-batching benchmark")
+    parser.add_argument("--messages", type=int, default=512, help="Messages per measurement")
+    parser.add_argument("--callers", type=int, default=32, help="Concurrent callers for the batcher comparison")
+    parser.add_argument("--batch-sizes", default="1,2,4,8,16,32,64")
+    parser.add_argument("--wait-ms", type=float, default=5.0, help="Batcher collection window")
+    args = parser.parse_args()
+
+    analyzer = EmotionAnalyzer()
+    if not analyzer.load():
+        print("Emotion model could not be loaded; nothing to measure")
+        return
+    texts = messages(args.messages)
+
+    print(f"{'batch size':>10} {'msgs/s':>9}")
+    for batch_size in (int(size) for size in args.batch_sizes.split(",")):
+        print(f"{batch_size:>10} {batch_throughput(analyzer, texts, batch_size):>9.1f}")
+
+    print(f"\n{args.callers} concurrent callers, one message each:")
+    print(f"{'path':<28} {'msgs/s':>9} {'p50':>9} {'p95':>9}")
+    batchers = [(f"batcher (<= {size}, {args.wait_ms:g}ms)", EmotionBatcher(analyzer, size, args.wait_ms / 1000.0))
+                for size in (8, 16, 32)]
+    paths = [("one pass per message", analyzer.detect_emotion)]
+    paths += [(label, batcher.detect_emotion) for label, batcher in batchers]
+    for label, detect in paths:
+        throughput, latencies = concurrent_callers(detect, texts, args.callers)
+        print(f"{label:<28} {throughput:>9.1f} {percentile(latencies, 50):>7.1f}ms {percentile(latencies, 95):>7.1f}ms")
+    for label, batcher in batchers:
+        print(f"{label}: average batch {batcher.stats()['avg_batch_size']:.1f}")
+
+if __name__ == "__main__":
+    main()
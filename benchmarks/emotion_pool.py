@@ -0,0 +1,79 @@
+"""
+Emotion inference in the app process versus the worker pool
+
+Concurrent callers tag messages, first with the analyzer in this process
+(one GIL) and then through the worker pool with 1, 2, 4... workers, to
+show how throughput scales per core. For each pool size the memory of the
+pool process and its workers is read from /proc. It compares the sum of
+their PSS (shared pages counted once) with what the same number of
+independent processes would use, each holding its own copy of the model.
+
+Needs the emotion model (transformers and torch, or the ONNX export with
+EFT_EMOTION_BACKEND=onnx). Linux only, for /proc.
+
+Usage:
+    python -m benchmarks.emotion_pool --messages 512 --callers 32 --max-workers 8
+"""
+
+import os
+import argparse
+
+from modules.emotion_analysis import EmotionAnalyzer
+from modules.emotion_pool import EmotionWorkerPool
+from benchmarks.emotion_batching import messages, concurrent_callers
+from benchmarks.common import percentile
+
+def memory_mb(pid):
+    """(RSS, PSS) of a process in megabytes"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name] = int(rest.split()[0]) / 1024.0
+    return values["Rss"], values["Pss"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Emotion worker pool benchmark")
+    parser.add_argument("--messages", type=int, default=512)
+    parser.add_argument("--callers", type=int, default=32, help="Concurrent callers (app request threads)")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    texts = messages(args.messages)
+
+    print(f"{'inference':<18} {'msgs/s':>9} {'p50':>9} {'p95':>9} {'sum RSS':>9} {'sum PSS':>9} {'separate':>9}")
+
+    analyzer = EmotionAnalyzer()
+    if not analyzer.load():
+        print("Emotion model could not be loaded; nothing to measure")
+        return
+    throughput, latencies = concurrent_callers(analyzer.detect_emotion, texts, args.callers)
+    print(f"{'in-process':<18} {throughput:>9.1f} {percentile(latencies, 50):>7.1f}ms {percentile(latencies, 95):>7.1f}ms")
+
+    workers = 1
+    while workers <= args.max_workers:
+        pool = EmotionWorkerPool(workers=workers)
+        pool.start_background_load()
+        if not pool.wait_until_ready(300):
+            print(f"{workers} workers: pool did not start")
+            return
+
+        # Warm every worker before measuring
+        concurrent_callers(pool.detect_emotion, texts[:workers * 4], workers)
+        throughput, latencies = concurrent_callers(pool.detect_emotion, texts, args.callers)
+
+        usage = [memory_mb(pid) for pid in [pool.server_pid] + pool.worker_pids]
+        total_rss = sum(rss for rss, _ in usage)
+        total_pss = sum(pss for _, pss in usage)
+        # Each independent process would be about the size of the one that loaded the model
+        separate = usage[0][0] * workers
+        label = f"pool, {workers} worker{'s' if workers > 1 else ''}"
+        print(f"{label:<18} {throughput:>9.1f} {percentile(latencies, 50):>7.1f}ms {percentile(latencies, 95):>7.1f}ms "
+              f"{total_rss:>7.0f}MB {total_pss:>7.0f}MB {separate:>7.0f}MB")
+        if pool.stats()["fallbacks"]:
+            print(f"{'':<18} {pool.stats()['fallbacks']} requests fell back to keywords")
+        pool.close()
+        workers *= 2
+
+if __name__ == "__main__":
+    main()
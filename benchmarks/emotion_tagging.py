@@ -0,0 +1,72 @@
+"""
+Inline versus deferred emotion tagging on the message path
+
+Records user messages through SessionTracker the way a turn does, and
+reports how long each record takes:
+  - inline: the model classifies the message before it is stored
+  - deferred: it is stored pending and the emotion tagger classifies it
+    in the background
+For deferred tagging it also reports how long the tagger takes to clear
+the backlog, and checks that every message ends up tagged.
+
+Needs the emotion model (transformers and torch, or the ONNX export with
+EFT_EMOTION_BACKEND=onnx).
+
+Usage:
+    python -m benchmarks.emotion_tagging --messages 500
+"""
+
+import time
+import argparse
+
+from modules import database
+from modules import session_tracker
+from benchmarks.common import use_temp_database, percentile, time_calls
+from benchmarks.emotion_batching import messages
+
+def record_all(tracker, texts, inline):
+    """Record each text as a user message; returns per-message latencies in ms"""
+    pending = iter(texts)
+    if inline:
+        def record():
+            text = next(pending)
+            tracker.record_message("user", text, tracker.detect_emotion(text))
+    else:
+        def record():
+            tracker.record_message("user", next(pending))
+    return time_calls(record, len(texts))
+
+def main():
+    parser = argparse.ArgumentParser(description="Emotion tagging benchmark")
+    parser.add_argument("--messages", type=int, default=500)
+    args = parser.parse_args()
+    texts = messages(args.messages)
+
+    use_temp_database()
+    if not session_tracker.get_emotion_analyzer().load():
+        print("Emotion model could not be loaded; nothing to measure")
+        return
+
+    tracker = session_tracker.SessionTracker()
+    tracker.start_session("bench-user")
+
+    print(f"{'tagging':<10} {'p50':>9} {'p95':>9} {'p99':>9} {'drain':>9}")
+    inline = record_all(tracker, texts, inline=True)
+    print(f"{'inline':<10} {percentile(inline, 50):>7.2f}ms {percentile(inline, 95):>7.2f}ms "
+          f"{percentile(inline, 99):>7.2f}ms")
+
+    tagger = session_tracker.get_emotion_tagger()
+    start = time.perf_counter()
+    deferred = record_all(tracker, texts, inline=False)
+    backlog = tagger.backlog()
+    session_tracker.shutdown_emotion_tagger()
+    drain_seconds = time.perf_counter() - start
+    print(f"{'deferred':<10} {percentile(deferred, 50):>7.2f}ms {percentile(deferred, 95):>7.2f}ms "
+          f"{percentile(deferred, 99):>7.2f}ms {drain_seconds:>8.2f}s")
+    print(f"\nbacklog after the last message: {backlog}")
+
+    untagged = database.query_all_shards("SELECT COUNT(*) FROM messages WHERE emotion_pending = 1")[0][0]
+    print(f"messages still pending after drain: {untagged}")
+
+if __name__ == "__main__":
+    main()
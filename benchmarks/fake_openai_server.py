@@ -0,0 +1,237 @@
+"""
+Local stand-in for the OpenAI chat completions API
+
+Answers POST /v1/chat/completions after a configurable delay, so the chat
+pipeline can be load tested without network access or API spend. Point the
+app or a benchmark at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+Streamed requests (stream=True) get the first token after a fraction of the
+latency and the remaining words spread over the rest of it.
+
+Faults can be injected per request, at independent rates: 500 errors, 429
+rate limits, slow replies (a long tail) and stalls that outlast any sane
+client timeout.
+
+Usage:
+    python -m benchmarks.fake_openai_server --port 8808 --latency 2.0 --jitter 0.5
+    python -m benchmarks.fake_openai_server --error-rate 0.1 --slow-rate 0.05 --slow-latency 10
+"""
+
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = (
+    "That sounds really difficult. On a scale of 0 to 10, how intense does "
+    "that feeling seem right now?"
+)
+
+# Share of the latency spent before the first streamed token
+TIME_TO_FIRST_TOKEN_SHARE = 0.15
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """Threaded HTTP server that records how many requests it is serving at once"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, latency=2.0, jitter=0.0, reply=DEFAULT_REPLY):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.reply = reply
+
+        # Fault injection; each is the share of requests affected
+        self.error_rate = 0.0
+        self.rate_limit_rate = 0.0
+        self.slow_rate = 0.0
+        self.slow_latency = 10.0  # seconds
+        self.stall_rate = 0.0
+        self.stall_seconds = 120.0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        # The messages of every request, when set to a list
+        self.recorded_prompts = None
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def delay(self):
+        """Simulated model latency for one request, in seconds"""
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def pick_fault(self):
+        """Choose the fault for one request: "error", "rate_limit", "slow", "stall" or None"""
+        roll = random.random()
+        for fault, rate in (("error", self.error_rate), ("rate_limit", self.rate_limit_rate),
+                            ("slow", self.slow_rate), ("stall", self.stall_rate)):
+            if roll < rate:
+                return fault
+            roll -= rate
+        return None
+
+    def set_faults(self, error_rate=0.0, rate_limit_rate=0.0, slow_rate=0.0, stall_rate=0.0):
+        """Replace the fault injection rates (all zero restores normal service)"""
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.slow_rate = slow_rate
+        self.stall_rate = stall_rate
+
+    def enter(self):
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up early (timeouts, cancelled hedges) are expected here
+        pass
+
+    def reset_stats(self):
+        with self._lock:
+            self.peak_in_flight = self.in_flight
+            self.requests = 0
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if self.server.recorded_prompts is not None:
+            self.server.recorded_prompts.append(request.get("messages", []))
+
+        self.server.enter()
+        try:
+            fault = self.server.pick_fault()
+            if fault == "error":
+                self._send_json(500, {"error": {"message": "Injected server error", "type": "server_error"}})
+                return
+            if fault == "rate_limit":
+                self._send_json(429, {"error": {"message": "Injected rate limit", "type": "rate_limit_error"}})
+                return
+            if fault == "stall":
+                time.sleep(self.server.stall_seconds)
+            elif fault == "slow":
+                time.sleep(self.server.slow_latency)
+
+            if request.get("stream"):
+                self._stream_reply(request)
+                return
+            time.sleep(self.server.delay())
+        finally:
+            self.server.leave()
+
+        self._send_json(200, {
+            "id": f"chatcmpl-fake-{self.server.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake-model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.server.reply},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        })
+
+    def _stream_reply(self, request):
+        """Send the reply as server-sent events, one word per chunk"""
+        delay = self.server.delay()
+        words = self.server.reply.split(" ")
+        per_word = delay * (1 - TIME_TO_FIRST_TOKEN_SHARE) / max(1, len(words))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        time.sleep(delay * TIME_TO_FIRST_TOKEN_SHARE)
+        for i, word in enumerate(words):
+            self._send_event({
+                "id": "chatcmpl-fake-stream",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "fake-model"),
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if i == 0 else " " + word},
+                    "finish_reason": None
+                }]
+            })
+            time.sleep(per_word)
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+    def _send_event(self, payload):
+        self._send_chunk(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+    def _send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_fake_server(port=0, latency=2.0, jitter=0.0):
+    """
+    Start the fake server on a background thread
+
+    Args:
+        port: Port to listen on (0 picks a free one)
+        latency: Mean simulated model latency in seconds
+        jitter: Uniform +/- variation on the latency in seconds
+
+    Returns:
+        The running FakeOpenAIServer; call shutdown() when done
+    """
+    server = FakeOpenAIServer(("127.0.0.1", port), latency, jitter)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server")
+    parser.add_argument("--port", type=int, default=8808)
+    parser.add_argument("--latency", type=float, default=2.0, help="Mean response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Uniform +/- delay variation in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with a 429")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Share of requests delayed by --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=10.0, help="Extra delay for slow requests in seconds")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Share of requests that hang for two minutes")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(("127.0.0.1", args.port), args.latency, args.jitter)
+    server.slow_latency = args.slow_latency
+    server.set_faults(args.error_rate, args.rate_limit_rate, args.slow_rate, args.stall_rate)
+    print(f"Fake OpenAI API listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark message insert throughput and file size for random TEXT keys
+versus time-ordered 16-byte BLOB keys
+
+Usage:
+    python -m benchmarks.id_keys [messages] [batch_size]
+"""
+
+import os
+import sys
+import time
+import uuid
+import sqlite3
+import tempfile
+import datetime
+
+from modules.ids import new_id
+from benchmarks.common import file_size_mb
+
+SESSIONS = 1000
+
+SCHEMAS = {
+    "uuid4 TEXT": ("TEXT", lambda: str(uuid.uuid4())),
+    "uuid7 BLOB": ("BLOB", new_id),
+}
+
+def run(label, messages, batch_size):
+    key_type, make_id = SCHEMAS[label]
+    path = os.path.join(tempfile.mkdtemp(prefix="eft_ids_"), "ids.db")
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f'''
+    CREATE TABLE messages (
+        message_id {key_type} PRIMARY KEY,
+        session_id {key_type},
+        timestamp TIMESTAMP,
+        sender TEXT,
+        content TEXT,
+        emotion TEXT
+    )
+    ''')
+    conn.execute("CREATE INDEX idx_messages_session_time ON messages (session_id, timestamp, sender, emotion)")
+    
+    sessions = [make_id() for _ in range(SESSIONS)]
+    now = datetime.datetime.now().isoformat()
+    
+    start = time.perf_counter()
+    for offset in range(0, messages, batch_size):
+        rows = [
+            (make_id(), sessions[i % SESSIONS], now, "user", "I have been feeling anxious about work", "anxious")
+            for i in range(offset, min(offset + batch_size, messages))
+        ]
+        conn.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?)", rows)
+        conn.commit()
+    elapsed = time.perf_counter() - start
+    
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    conn.close()
+    
+    print(f"{label:<12} messages={messages:,} inserts/s={messages / elapsed:,.0f} "
+          f"pages={page_count:,} size={file_size_mb(path):.1f}MB")
+
+def main(messages=1_000_000, batch_size=1000):
+    for label in SCHEMAS:
+        run(label, messages, batch_size)
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,203 @@
+"""
+Keyword detectors: per-detector substring loops versus the shared compiled matcher
+
+Compares the substring checks the detectors used before (kept here as the
+baseline) with the shared KeywordMatcher on:
+  1. accuracy over a labelled corpus of messages, including the substring
+     false positives ("tapestry", "machine", "sit down") and spellings
+     the old lists missed ("dont", "suicidal", "self harm")
+  2. time to run every user-message detector on a message (suicide,
+     tapping request, emotion keywords, ethics)
+  3. time to check a full reply for a tapping sequence
+
+Exits non-zero if the matcher gets any corpus entry wrong, so it doubles
+as the accuracy check for changes to the keyword lists.
+
+Usage:
+    python -m benchmarks.keyword_matching --iterations 20000
+"""
+
+import sys
+import argparse
+
+from modules.pipeline import contains_suicide_risk
+from modules.emotion_analysis import detect_emotion_keywords
+from modules.ethics import EthicsGuide
+from modules.animation_trigger import TAPPING_POINTS
+from modules.tapping_parser import has_tapping_indicators, is_tapping_request
+from modules.keyword_matcher import scan_keywords
+from benchmarks.common import percentile, time_calls
+from benchmarks.emotion_batching import SAMPLE_MESSAGES
+
+ETHICS = EthicsGuide()
+
+# (detector, text, expected result)
+ACCURACY_CORPUS = [
+    ("suicide", "I've been thinking about suicide", True),
+    ("suicide", "I feel suicidal tonight", True),
+    ("suicide", "Sometimes I just want to die", True),
+    ("suicide", "I dont want to live like this anymore", True),
+    ("suicide", "I don’t want to live anymore", True),
+    ("suicide", "I want to end  it all", True),
+    ("suicide", "Everyone would be better off dead without me", True),
+    ("suicide", "The plants died while I was away", False),
+    ("suicide", "I want to end it alliance talks", False),
+    ("suicide", "I'm so tired of work", False),
+    ("emotion", "I've been feeling really anxious about work lately", "anxious"),
+    ("emotion", "I keep worrying that I'll lose my job", "anxious"),
+    ("emotion", "I'm so stressed out", "anxious"),
+    ("emotion", "I feel sad and I don't really know why", "sad"),
+    ("emotion", "I'm feeling down today", "sad"),
+    ("emotion", "Still grieving for my dad", "sad"),
+    ("emotion", "I'm frustrated that nothing seems to help", "angry"),
+    ("emotion", "I'm happy, the interview went well", "happy"),
+    ("emotion", "I'm grateful for this, it really helped", "positive"),
+    ("emotion", "I sat down and wrote it all out", "neutral"),
+    ("emotion", "The sky was blue this morning", "neutral"),
+    ("emotion", "I made dinner for the kids", "neutral"),
+    ("emotion", "We talked about the content of the course", "neutral"),
+    ("emotion", "The goodwill at the shop was nice", "neutral"),
+    ("emotion", "I'm not unhappy exactly, just tired", "sad"),
+    ("tapping_request", "Can we tap on this?", True),
+    ("tapping_request", "let's go again", True),
+    ("tapping_request", "lets tap", True),
+    ("tapping_request", "I'd like another round please", True),
+    ("tapping_request", "Start tapping", True),
+    ("tapping_request", "My grandmother's tapestry is on the wall", False),
+    ("tapping_request", "The tap in the kitchen is dripping", True),
+    ("tapping_request", "I left the water running", False),
+    ("animation", "Eyebrow: All this worry", "eyebrow"),
+    ("animation", "Karate Chop: Even though I feel this anxiety...", "karate chop"),
+    ("animation", "Under the arm: This tightness", None),
+    ("animation", "Under Arm: This tightness", "under arm"),
+    ("animation", "The machine at work keeps breaking", None),
+    ("animation", "Chin: I'm letting it go", "chin"),
+    ("animation", "Top of head: Releasing this now", "top of head"),
+    ("sequence", "Let's begin tapping through the points.\nKarate Chop: ...\nEyebrow: ...", True),
+    ("sequence", "Karate chop: even though...\nTop of Head: this stress", True),
+    ("sequence", "Here is a tapping sequence for you", True),
+    ("sequence", "Try tapping on the karate chop point while you breathe", False),
+    ("sequence", "A karate chop tapestry with eyebrowless faces", False),
+    ("ethics", "Tell me about self-harm methods", False),
+    ("ethics", "tell me about self harm methods", False),
+    ("ethics", "I want to talk about illegal activities", False),
+    ("ethics", "I'm worried about exploitation at work", False),
+    ("ethics", "I feel exploited at work", True),
+    ("ethics", "How does tapping work?", True),
+]
+
+def animation_point(text):
+    """The point detect_animation would pick for a step, without checking the GIFs exist"""
+    found = scan_keywords(text)
+    return next((point for point in TAPPING_POINTS if f"point:{point}" in found), None)
+
+DETECTORS = {
+    "suicide": contains_suicide_risk,
+    "emotion": detect_emotion_keywords,
+    "tapping_request": is_tapping_request,
+    "animation": animation_point,
+    "sequence": has_tapping_indicators,
+    "ethics": lambda text: ETHICS.check_content(text)[0],
+}
+
+# The substring checks the detectors used before the shared matcher
+OLD_SUICIDE_TERMS = ["suicide", "kill myself", "end my life", "take my life", "don't want to live",
+                     "want to die", "end it all", "no reason to live", "better off dead"]
+OLD_EMOTIONS = {
+    "anxious": ["anxious", "worried", "nervous", "stress", "panic", "afraid", "scared", "terrified"],
+    "sad": ["sad", "unhappy", "depressed", "down", "blue", "upset", "miserable", "grief"],
+    "angry": ["angry", "mad", "furious", "annoyed", "irritated", "frustrated", "upset"],
+    "happy": ["happy", "glad", "joy", "pleased", "delighted", "content", "satisfied"],
+    "positive": ["better", "good", "relieved", "hopeful", "grateful", "thankful"]
+}
+OLD_TAPPING_PHRASES = ["let's tap", "another round", "start tapping", "do tapping", "let's go again", "tap", "tapping"]
+OLD_SEQUENCE_PHRASES = ["tapping through the points", "tapping sequence", "tap through each point"]
+
+def old_emotion(text):
+    text = text.lower()
+    for emotion, keywords in OLD_EMOTIONS.items():
+        if any(keyword in text for keyword in keywords):
+            return emotion
+    return "neutral"
+
+def old_animation_point(text):
+    text = text.lower()
+    return next((point for point in TAPPING_POINTS if point in text), None)
+
+def old_sequence(text):
+    text = text.lower()
+    return (any(phrase in text for phrase in OLD_SEQUENCE_PHRASES) or
+            ("karate chop" in text and any(point in text for point in ["top of head", "eyebrow", "collarbone"])))
+
+def old_ethics(text):
+    text = text.lower()
+    return not any(topic in text for topic in ETHICS.high_risk_topics)
+
+OLD_DETECTORS = {
+    "suicide": lambda text: any(term in text.lower() for term in OLD_SUICIDE_TERMS),
+    "emotion": old_emotion,
+    "tapping_request": lambda text: any(phrase in text.lower() for phrase in OLD_TAPPING_PHRASES),
+    "animation": old_animation_point,
+    "sequence": old_sequence,
+    "ethics": old_ethics,
+}
+
+def check_accuracy(detectors):
+    """Share of the corpus each detector gets right, and the entries it gets wrong"""
+    correct = {}
+    totals = {}
+    wrong = []
+    for detector, text, expected in ACCURACY_CORPUS:
+        got = detectors[detector](text)
+        totals[detector] = totals.get(detector, 0) + 1
+        if got == expected:
+            correct[detector] = correct.get(detector, 0) + 1
+        else:
+            wrong.append((detector, text, expected, got))
+    return {detector: correct.get(detector, 0) / total for detector, total in totals.items()}, wrong
+
+def user_message_checks(detectors, text):
+    """Every detector that runs on an incoming user message"""
+    detectors["suicide"](text)
+    detectors["tapping_request"](text)
+    detectors["emotion"](text)
+    detectors["ethics"](text)
+
+def main():
+    parser = argparse.ArgumentParser(description="Keyword matcher benchmark and accuracy check")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    old_accuracy, old_wrong = check_accuracy(OLD_DETECTORS)
+    new_accuracy, new_wrong = check_accuracy(DETECTORS)
+    print(f"{'detector':<16} {'substring':>10} {'matcher':>10}")
+    for detector in DETECTORS:
+        print(f"{detector:<16} {old_accuracy[detector]:>10.0%} {new_accuracy[detector]:>10.0%}")
+    print(f"{'all':<16} {1 - len(old_wrong) / len(ACCURACY_CORPUS):>10.0%} "
+          f"{1 - len(new_wrong) / len(ACCURACY_CORPUS):>10.0%}")
+    for detector, text, expected, got in new_wrong:
+        print(f"  matcher wrong: {detector} {text!r}: expected {expected!r}, got {got!r}")
+
+    reply = "Let's begin tapping through the points.\n" + "\n".join(
+        f"{point.title()}: Even though I feel this anxiety in my chest, I deeply and completely accept myself"
+        for point in TAPPING_POINTS
+    )
+    # Every iteration gets a distinct text, so the matcher's cache of recent
+    # texts only helps the detectors that share one message, as in the app
+    cases = [
+        ("user message, all detectors", lambda detectors, i: user_message_checks(
+            detectors, f"{SAMPLE_MESSAGES[i % len(SAMPLE_MESSAGES)]} ({i})")),
+        (f"reply of {len(reply)} chars, sequence check", lambda detectors, i: detectors["sequence"](f"{reply} ({i})")),
+    ]
+    print(f"\n{'case':<38} {'':<10} {'p50':>9} {'p95':>9}")
+    for label, case in cases:
+        for name, detectors in (("substring", OLD_DETECTORS), ("matcher", DETECTORS)):
+            counter = iter(range(args.iterations))
+            latencies = time_calls(lambda: case(detectors, next(counter)), args.iterations)
+            print(f"{label:<38} {name:<10} {percentile(latencies, 50) * 1000:>7.1f}us "
+                  f"{percentile(latencies, 95) * 1000:>7.1f}us")
+
+    sys.exit(1 if new_wrong else 0)
+
+if __name__ == "__main__":
+    main()
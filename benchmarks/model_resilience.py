@@ -0,0 +1,137 @@
+"""
+Tail latency and failure handling of the model client under injected faults
+
+Runs the same batch of chat calls against the local fake OpenAI server with
+the resilience features off (no retries, hedging or breaker, long deadline)
+and on (deadline, jittered retries, p95 hedging, circuit breaker), for each
+fault scenario: a slow tail, intermittent 5xx/429 errors, stalled requests
+and a full outage. Both complete_chat and stream_chat are driven; for
+streams the "first" column is the p95 time to the first chunk, which is
+what stream hedging races on. A run that ends with scheduler slots still
+held by abandoned streams is reported as a leak and fails the script.
+
+Usage:
+    python -m benchmarks.model_resilience --calls 300 --sessions 20
+    python -m benchmarks.model_resilience --mode stream
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+from modules import model_client
+from benchmarks.common import percentile
+from benchmarks.fake_openai_server import start_fake_server
+
+PROMPT = [{"role": "user", "content": "I've been feeling really anxious about work lately"}]
+
+SCENARIOS = {
+    "slow tail (5% +3s)": {"slow_rate": 0.05},
+    "errors (15% 500, 5% 429)": {"error_rate": 0.15, "rate_limit_rate": 0.05},
+    "stalls (3% hang)": {"stall_rate": 0.03},
+    "outage (100% 500)": {"error_rate": 1.0},
+}
+
+CONFIGS = {
+    "plain": {"MODEL_MAX_RETRIES": 0, "MODEL_HEDGE_PERCENTILE": 0,
+              "BREAKER_FAILURE_THRESHOLD": 10 ** 9, "MODEL_DEADLINE": 10.0},
+    "resilient": {"MODEL_MAX_RETRIES": 2, "MODEL_HEDGE_PERCENTILE": 95,
+                  "BREAKER_FAILURE_THRESHOLD": 5, "MODEL_DEADLINE": 3.0},
+}
+
+async def complete():
+    await model_client.complete_chat(PROMPT, model="bench")
+    return None
+
+async def stream():
+    """Read a whole streamed reply; returns the time to its first chunk in ms"""
+    start = time.perf_counter()
+    first_chunk = None
+    async for _ in model_client.stream_chat(PROMPT, model="bench"):
+        if first_chunk is None:
+            first_chunk = (time.perf_counter() - start) * 1000.0
+    return first_chunk
+
+MODES = {"complete": complete, "stream": stream}
+
+async def run_calls(call, calls, sessions):
+    """Spread calls over concurrent sessions; returns (latencies_ms, first_chunk_ms, successes, leaked_slots)"""
+    queue = asyncio.Queue()
+    for _ in range(calls):
+        queue.put_nowait(None)
+    latencies = []
+    first_chunks = []
+    successes = 0
+
+    async def session():
+        nonlocal successes
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                first_chunk = await call()
+                successes += 1
+                if first_chunk is not None:
+                    first_chunks.append(first_chunk)
+            except Exception:
+                pass
+            latencies.append((time.perf_counter() - start) * 1000.0)
+
+    await asyncio.gather(*(session() for _ in range(sessions)))
+    scheduler = model_client.get_model_call_stats()["scheduler"]
+    await model_client.close_model_client()
+    return latencies, first_chunks, successes, scheduler["active"] if scheduler else 0
+
+def configure(settings):
+    for name, value in settings.items():
+        setattr(model_client, name, value)
+    model_client.reset_model_client()
+
+def main():
+    parser = argparse.ArgumentParser(description="Model client resilience benchmark")
+    parser.add_argument("--calls", type=int, default=300, help="Calls per scenario and configuration")
+    parser.add_argument("--sessions", type=int, default=20, help="Concurrent sessions issuing calls")
+    parser.add_argument("--latency", type=float, default=0.1, help="Normal fake model latency in seconds")
+    parser.add_argument("--mode", choices=["complete", "stream", "both"], default="both")
+    args = parser.parse_args()
+    modes = list(MODES) if args.mode == "both" else [args.mode]
+
+    server = start_fake_server(latency=args.latency, jitter=args.latency / 2)
+    server.slow_latency = 3.0
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+
+    print(f"{'scenario':<26} {'call':<9} {'client':<10} {'ok':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} "
+          f"{'first':>8} {'api reqs':>9} {'retries':>8} {'hedges':>7} {'rejected':>9}")
+    leaks = 0
+    try:
+        for scenario, faults in SCENARIOS.items():
+            for mode in modes:
+                for config, settings in CONFIGS.items():
+                    configure(settings)
+                    server.set_faults()
+                    server.reset_stats()
+                    server.set_faults(**faults)
+
+                    latencies, first_chunks, successes, leaked = asyncio.run(
+                        run_calls(MODES[mode], args.calls, args.sessions)
+                    )
+                    stats = model_client.get_model_call_stats()
+                    first = f"{percentile(first_chunks, 95) / 1000:>7.2f}s" if first_chunks else f"{'-':>8}"
+                    print(
+                        f"{scenario:<26} {mode:<9} {config:<10} {successes / args.calls:>6.1%} "
+                        f"{percentile(latencies, 50) / 1000:>7.2f}s {percentile(latencies, 95) / 1000:>7.2f}s "
+                        f"{percentile(latencies, 99) / 1000:>7.2f}s {max(latencies) / 1000:>7.2f}s {first} "
+                        f"{server.requests:>9} {stats['retries']:>8} {stats['hedges']:>7} {stats['rejected']:>9}"
+                    )
+                    if leaked:
+                        print(f"  LEAK {leaked} scheduler slots still held after the run")
+                        leaks += 1
+    finally:
+        server.shutdown()
+    sys.exit(1 if leaks else 0)
+
+if __name__ == "__main__":
+    main()
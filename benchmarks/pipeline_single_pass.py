@@ -0,0 +1,136 @@
+"""
+Each user message is stored once and classified once
+
+Sends messages from several concurrent sessions through the pipeline
+(prepare_turn, then generate against the local fake OpenAI server, then
+the assistant reply recorded as main.generate_response does). The mix
+includes ordinary turns, tapping requests (no context built) and crisis
+turns (no model call). Once the journal and emotion tagger have drained,
+it checks that:
+  - every user message has exactly one stored row, tagged with an emotion
+  - every user message went through emotion inference exactly once
+  - the persist stage ran once per message
+Emotion inference is counted where the pipeline hands texts to it: the
+tracker's detect_emotion with inline tagging, or the tagger's
+detect_emotions with deferred tagging (the default).
+
+Needs gradio installed, since the prompt builder imports modules.auth.
+
+Usage:
+    python -m benchmarks.pipeline_single_pass --sessions 6 --turns 5
+    python -m benchmarks.pipeline_single_pass --tagging inline
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+from collections import Counter
+
+from modules import database, model_client, pipeline, session_tracker
+from modules.chat_state import ChatState
+from benchmarks.common import use_temp_database
+from benchmarks.fake_openai_server import start_fake_server
+
+classified = Counter()
+
+def count_inference():
+    """Count the texts handed to emotion inference, by text"""
+    detect_emotion = session_tracker.SessionTracker.detect_emotion
+    detect_emotions = session_tracker.detect_emotions
+
+    def counted_detect_emotion(self, content):
+        classified[content] += 1
+        return detect_emotion(self, content)
+
+    def counted_detect_emotions(texts):
+        classified.update(texts)
+        return detect_emotions(texts)
+
+    session_tracker.SessionTracker.detect_emotion = counted_detect_emotion
+    # Read when the tagger is created, so this must run before its first use
+    session_tracker.detect_emotions = counted_detect_emotions
+
+def message_for(index, turn):
+    text = f"[session {index}, turn {turn}]"
+    if turn == 1:
+        return f"{text} let's tap"
+    if turn == 3 and index % 3 == 0:
+        return f"{text} I feel like I want to die"
+    return f"{text} I'm anxious about work"
+
+async def run_session(index, turns):
+    chat_state = ChatState(user_id=f"single-pass-user-{index}")
+    await asyncio.to_thread(chat_state.session_tracker.start_session, chat_state.user_id)
+    sent = []
+    for turn in range(turns):
+        message = message_for(index, turn)
+        prepared = await pipeline.prepare_turn(
+            message, chat_state, build_context="let's tap" not in message
+        )
+        sent.append(prepared.text)
+        if prepared.prompt is None:
+            continue
+        reply = "".join([delta async for delta in pipeline.generate(prepared)])
+        await asyncio.to_thread(chat_state.session_tracker.record_message, "assistant", reply)
+    return sent
+
+async def run(sessions, turns):
+    sent = await asyncio.gather(*(run_session(index, turns) for index in range(sessions)))
+    await model_client.close_model_client()
+    return [text for texts in sent for text in texts]
+
+def check(sent, persist_runs):
+    """Every message stored or classified other than exactly once"""
+    problems = []
+    rows = Counter()
+    for content, emotion, pending in database.query_all_shards(
+        "SELECT content, emotion, emotion_pending FROM messages WHERE sender = 'user'"
+    ):
+        rows[content] += 1
+        if emotion is None or pending:
+            problems.append(f"{content!r} was stored without an emotion")
+
+    for text in sent:
+        if rows[text] != 1:
+            problems.append(f"{text!r} has {rows[text]} stored rows")
+        if classified[text] != 1:
+            problems.append(f"{text!r} went through emotion inference {classified[text]} times")
+    if persist_runs != len(sent):
+        problems.append(f"persist ran {persist_runs} times for {len(sent)} messages")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-pass pipeline check")
+    parser.add_argument("--sessions", type=int, default=6)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--tagging", choices=["deferred", "inline"], default=pipeline.EMOTION_TAGGING)
+    parser.add_argument("--latency", type=float, default=0.1, help="Fake model time to stream a reply")
+    args = parser.parse_args()
+
+    use_temp_database()
+    pipeline.EMOTION_TAGGING = session_tracker.EMOTION_TAGGING = args.tagging
+    count_inference()
+
+    server = start_fake_server(latency=args.latency)
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    model_client.reset_model_client()
+
+    try:
+        sent = asyncio.run(run(args.sessions, args.turns))
+    finally:
+        server.shutdown()
+    # Write out the journal and tag what it stored as pending
+    session_tracker.shutdown_emotion_tagger()
+    session_tracker.shutdown_message_journal()
+
+    problems = check(sent, pipeline.get_pipeline_stats()["persist"]["count"])
+    print(f"{len(sent)} user messages ({args.tagging} tagging): "
+          f"{'each stored and classified once' if not problems else f'{len(problems)} problems'}")
+    for problem in problems[:10]:
+        print(f"  {problem}")
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Check that the hot per-user and per-session queries are served by indexes
+
+Runs EXPLAIN QUERY PLAN for each query against a freshly migrated database
+and exits non-zero if any plan falls back to a full table scan.
+
+Usage:
+    python -m benchmarks.query_plans
+"""
+
+import sys
+
+from modules import database
+from benchmarks.common import use_temp_database
+
+# (description, query, parameters, index that must appear in the plan)
+HOT_QUERIES = [
+    (
+        "get_user_recent_emotions",
+        """
+        SELECT m.emotion
+        FROM messages m
+        JOIN sessions s ON m.session_id = s.session_id
+        WHERE s.user_id = ? AND m.sender = 'user' AND m.emotion IS NOT NULL
+        ORDER BY m.timestamp DESC
+        LIMIT ?
+        """,
+        ("user", 5),
+        ["idx_sessions_user_start", "idx_messages_session_time"],
+    ),
+    (
+        "has_recent_assessment",
+        "SELECT assessment_id FROM assessments WHERE user_id = ? AND completed_at > ? LIMIT 1",
+        ("user", "2024-01-01"),
+        ["idx_assessments_user_completed"],
+    ),
+    (
+        "get_latest_assessment",
+        """
+        SELECT gad7_score, phq9_score, is_high_risk, has_suicide_risk, completed_at
+        FROM assessments WHERE user_id = ? ORDER BY completed_at DESC LIMIT 1
+        """,
+        ("user",),
+        ["idx_assessments_user_completed"],
+    ),
+    (
+        "get_user_session_count",
+        """
+        SELECT (SELECT COUNT(*) FROM sessions WHERE user_id = ?)
+             + (SELECT COUNT(*) FROM archived_sessions WHERE user_id = ?)
+        """,
+        ("user", "user"),
+        ["idx_sessions_user_start", "idx_archived_sessions_user"],
+    ),
+    (
+        "mark_tapping_step_completed",
+        "UPDATE tapping_steps SET completed = 1, completed_at = ? WHERE session_id = ? AND step_number = ?",
+        ("now", "session", 0),
+        ["idx_tapping_steps_session_step"],
+    ),
+    (
+        "has_given_consent",
+        "SELECT consent_id FROM consent WHERE user_id = ? AND consent_version = ?",
+        ("user", "1.0"),
+        ["idx_consent_user_version"],
+    ),
+]
+
+def main():
+    use_temp_database("plans.db")
+    failures = 0
+    
+    with database.get_connection() as conn:
+        # Give the planner statistics so it does not guess on empty tables
+        conn.execute("ANALYZE")
+        
+        for name, query, params, expected_indexes in HOT_QUERIES:
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + query, params)]
+            missing = [index for index in expected_indexes if not any(index in step for step in plan)]
+            full_scans = [
+                step for step in plan
+                if step.startswith("SCAN") and "INDEX" not in step and step != "SCAN CONSTANT ROW"
+            ]
+            
+            status = "ok" if not missing and not full_scans else "FAIL"
+            if status == "FAIL":
+                failures += 1
+            print(f"[{status}] {name}")
+            for step in plan:
+                print(f"       {step}")
+    
+    database.close_pool()
+    return failures
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
@@ -0,0 +1,103 @@
+"""
+Cancelled waiters must not leak FairScheduler slots
+
+Fills every slot, queues waiters behind them and cancels them the ways the
+model client does (hedge losers, deadlines, client disconnects):
+  - while still queued
+  - in the same loop iteration as a release that would admit them, so the
+    dispatcher meets a cancelled future
+  - just after being admitted, before their task resumes
+The remaining waiters then run to completion. The check fails unless every
+surviving waiter was admitted and the scheduler ends with no active slots
+and an empty queue.
+
+Usage:
+    python -m benchmarks.scheduler_cancellation --rounds 200
+"""
+
+import sys
+import random
+import asyncio
+import argparse
+
+from modules.scheduler import FairScheduler, PRIORITY_NORMAL, PRIORITY_CRISIS
+
+async def waiter(scheduler, user_id, priority, admitted):
+    ticket = await scheduler.acquire(user_id, 10, priority)
+    admitted.append(ticket)
+    await asyncio.sleep(0)
+    scheduler.release(ticket, 5)
+
+async def run_round(rng, slots, waiters):
+    """One round of queueing and cancelling; returns the problems found"""
+    scheduler = FairScheduler(slots, requests_per_minute=10 ** 6, tokens_per_minute=10 ** 9)
+    holders = [await scheduler.acquire(f"holder-{i}") for i in range(slots)]
+
+    admitted = []
+    tasks = [
+        asyncio.ensure_future(waiter(
+            scheduler, f"user-{rng.randrange(4)}",
+            PRIORITY_CRISIS if rng.random() < 0.2 else PRIORITY_NORMAL, admitted
+        ))
+        for _ in range(waiters)
+    ]
+    await asyncio.sleep(0)  # every waiter is queued
+
+    # Cancelled while queued
+    cancelled = set(rng.sample(range(waiters), waiters // 3))
+    for index in cancelled:
+        tasks[index].cancel()
+
+    # Cancelled together with the release that reaches them
+    remaining = [index for index in range(waiters) if index not in cancelled]
+    racing = rng.sample(remaining, min(len(remaining), slots // 2 or 1))
+    for index in racing:
+        tasks[index].cancel()
+    scheduler.release(holders.pop())
+    cancelled.update(racing)
+
+    # Some of these were admitted by the release and have not resumed yet
+    if holders:
+        scheduler.release(holders.pop())
+    for index, task in enumerate(tasks):
+        if index not in cancelled and rng.random() < 0.3:
+            task.cancel()
+
+    for ticket in holders:
+        scheduler.release(ticket)
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    problems = []
+    errors = [result for result in results
+              if isinstance(result, BaseException) and not isinstance(result, asyncio.CancelledError)]
+    if errors:
+        problems.append(f"waiters raised {errors[0]!r}")
+    survivors = sum(1 for result in results if not isinstance(result, BaseException))
+    if len(admitted) < survivors:
+        problems.append(f"only {len(admitted)} of {survivors} surviving waiters were admitted")
+    stats = scheduler.stats()
+    if stats["active"] != 0 or stats["queue_depth"] != 0:
+        problems.append(f"ended with {stats['active']} active slots and {stats['queue_depth']} queued")
+    return problems
+
+async def run(rounds, seed):
+    rng = random.Random(seed)
+    problems = []
+    for _ in range(rounds):
+        problems += await run_round(rng, rng.randint(1, 4), rng.randint(2, 20))
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Scheduler cancellation check")
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    problems = asyncio.run(run(args.rounds, args.seed))
+    print(f"{args.rounds} rounds: {'no leaked slots' if not problems else f'{len(problems)} problems'}")
+    for problem in problems[:10]:
+        print(f"  {problem}")
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
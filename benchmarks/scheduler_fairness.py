@@ -0,0 +1,92 @@
+"""
+Fair-share scheduling under a burst from one heavy user
+
+One user fires a large burst of requests while light users chat at a normal
+pace and a crisis session sends a few turns, all through the model client
+against the local fake OpenAI server with a request-per-minute limit. The
+same load runs with every request in one shared FIFO queue and with the
+fair scheduler (per-user turns plus the crisis lane), and the time each
+class of user waits for a reply is compared.
+
+Usage:
+    python -m benchmarks.scheduler_fairness --burst 150 --light-users 10 --rpm 1200
+"""
+
+import os
+import time
+import asyncio
+import argparse
+
+from modules import model_client, scheduler
+from benchmarks.common import percentile
+from benchmarks.fake_openai_server import start_fake_server
+
+PROMPT = [{"role": "user", "content": "I've been feeling really anxious about work lately"}]
+
+async def timed_call(results, label, user_id, priority):
+    start = time.perf_counter()
+    try:
+        await model_client.complete_chat(PROMPT, model="bench", user_id=user_id, priority=priority)
+    except Exception:
+        pass
+    results.setdefault(label, []).append(time.perf_counter() - start)
+
+async def light_user(results, user_id, turns, fair):
+    for _ in range(turns):
+        await timed_call(results, "light users", user_id if fair else None, scheduler.PRIORITY_NORMAL)
+        await asyncio.sleep(0.5)
+
+async def crisis_user(results, turns, fair):
+    await asyncio.sleep(1.0)
+    for _ in range(turns):
+        priority = scheduler.PRIORITY_CRISIS if fair else scheduler.PRIORITY_NORMAL
+        await timed_call(results, "crisis session", "crisis-user" if fair else None, priority)
+
+async def run(burst, light_users, fair):
+    results = {}
+    heavy_id = "heavy-user" if fair else None
+    await asyncio.gather(
+        *(timed_call(results, "heavy user burst", heavy_id, scheduler.PRIORITY_NORMAL) for _ in range(burst)),
+        *(light_user(results, f"light-{i}", 5, fair) for i in range(light_users)),
+        crisis_user(results, 3, fair)
+    )
+    stats = model_client.get_model_call_stats()["scheduler"]
+    await model_client.close_model_client()
+    return results, stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Fair-share scheduler benchmark")
+    parser.add_argument("--burst", type=int, default=150, help="Requests in the heavy user's burst")
+    parser.add_argument("--light-users", type=int, default=10)
+    parser.add_argument("--rpm", type=int, default=1200, help="Requests-per-minute limit")
+    parser.add_argument("--concurrency", type=int, default=8, help="In-flight request limit")
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake model latency in seconds")
+    args = parser.parse_args()
+
+    server = start_fake_server(latency=args.latency)
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    model_client.MODEL_MAX_CONCURRENCY = args.concurrency
+    model_client.MODEL_DEADLINE = 300.0
+    scheduler.MODEL_REQUESTS_PER_MINUTE = args.rpm
+
+    print(f"{'scheduling':<10} {'user class':<18} {'n':>4} {'p50 wait':>9} {'p95 wait':>9} {'max':>8}")
+    try:
+        for fair in (False, True):
+            model_client.reset_model_client()
+            # The bucket starts full; drain it so the limit applies from the start of the run
+            model_client.get_scheduler()._requests.level = 0
+            results, stats = asyncio.run(run(args.burst, args.light_users, fair))
+            mode = "fair" if fair else "fifo"
+            for label, waits in results.items():
+                waits_ms = [w * 1000.0 for w in waits]
+                print(f"{mode:<10} {label:<18} {len(waits):>4} "
+                      f"{percentile(waits_ms, 50) / 1000:>8.2f}s {percentile(waits_ms, 95) / 1000:>8.2f}s "
+                      f"{max(waits):>7.2f}s")
+            print(f"{'':<10} peak queue depth {stats['peak_queue_depth']}, "
+                  f"admission wait p95 {stats['wait_p95']:.2f}s\n")
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
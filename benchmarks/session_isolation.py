@@ -0,0 +1,139 @@
+"""
+Concurrent browser sessions must not see each other's state
+
+Drives several ChatStates through main.handle_user_message at once, with
+their turns interleaved on one event loop against the local fake OpenAI
+server. Every message carries its session's tag ("[session 3]"), and the
+check fails if a session's chat history, tracked context, stored session
+id or any prompt sent to the model holds another session's tag. Half the
+sessions ask for a tapping round, and only those may end up with tapping
+steps. Each session also gets its own ScreeningState, scored differently,
+and must keep its own result.
+
+Needs the app's dependencies (gradio, python-dotenv), since it imports main.
+
+Usage:
+    python -m benchmarks.session_isolation --sessions 8 --turns 3
+"""
+
+import re
+import os
+import sys
+import asyncio
+import argparse
+
+from modules import model_client
+from modules.chat_state import ChatState
+from modules.screening import ensure_screening_state, get_screening_status
+from benchmarks.common import use_temp_database
+from benchmarks.fake_openai_server import start_fake_server
+
+TAG_RE = re.compile(r"\[session (\d+)\]")
+
+def tag(index):
+    return f"[session {index}]"
+
+def foreign_tags(index, texts):
+    """Session tags in texts other than this session's own"""
+    return {int(found) for text in texts for found in TAG_RE.findall(text or "")} - {index}
+
+async def run_session(handle_user_message, index, chat_state, turns):
+    """Send this session's messages one after another; returns its final chat history"""
+    history = []
+    for turn in range(turns):
+        if turn == turns - 1 and index % 2 == 0:
+            message = f"{tag(index)} let's tap"
+        else:
+            message = f"{tag(index)} I'm worried about thing {turn}"
+        async for history, _, _, chat_state in handle_user_message(message, history, chat_state):
+            # Hand the loop to the other sessions between streamed updates
+            await asyncio.sleep(0)
+    return history
+
+async def run(handle_user_message, states, turns):
+    histories = await asyncio.gather(*(
+        run_session(handle_user_message, index, state, turns) for index, state in enumerate(states)
+    ))
+    await model_client.close_model_client()
+    return histories
+
+def screen(index):
+    """A ScreeningState scored from the session's index; odd sessions are high risk"""
+    state = ensure_screening_state(None)
+    state.has_consented = True
+    state.gad7_scores = [index % 4] * 7
+    state.is_high_risk = index % 2 == 1
+    state.current_assessment = "results"
+    return state
+
+def check(states, histories, screenings, prompts):
+    """Every cross-talk problem found"""
+    problems = []
+    session_ids = [state.session_tracker.get_current_session_id() for state in states]
+    if len(set(session_ids)) != len(states):
+        problems.append(f"sessions share database session ids: {session_ids}")
+
+    for index, (state, history) in enumerate(zip(states, histories)):
+        shown = foreign_tags(index, [message["content"] for message in history])
+        if shown:
+            problems.append(f"session {index} was shown messages of sessions {sorted(shown)}")
+        tracked = foreign_tags(index, [message["content"] for message in state.session_tracker.get_chat_session()])
+        if tracked:
+            problems.append(f"session {index} tracks context of sessions {sorted(tracked)}")
+        if not any(tag(index) in message["content"] for message in history if message["role"] == "user"):
+            problems.append(f"session {index} lost its own messages")
+
+        asked_to_tap = index % 2 == 0
+        if bool(state.tapping_steps) != asked_to_tap or state.tapping_rounds != int(asked_to_tap):
+            problems.append(f"session {index} has tapping state it didn't ask for "
+                            f"({len(state.tapping_steps)} steps, {state.tapping_rounds} rounds)")
+
+        status = get_screening_status(screenings[index])
+        if status["gad7_score"] != (index % 4) * 7 or status["eligible"] != (index % 2 == 0):
+            problems.append(f"session {index} screening changed: {status}")
+
+    for prompt in prompts:
+        senders = {int(found) for message in prompt if message.get("role") == "user"
+                   for found in TAG_RE.findall(message.get("content") or "")}
+        if len(senders) > 1:
+            problems.append(f"a model prompt mixed sessions {sorted(senders)}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent session isolation check")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=3, help="Messages per session; the last asks even sessions for tapping")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake model time to stream a reply")
+    args = parser.parse_args()
+
+    use_temp_database()
+    server = start_fake_server(latency=args.latency, jitter=args.latency / 2)
+    server.recorded_prompts = []
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    model_client.reset_model_client()
+
+    # Imported here, after the temporary database is in place, since main sets it up on import
+    from main import handle_user_message
+
+    states = []
+    for index in range(args.sessions):
+        state = ChatState(user_id=f"isolation-user-{index}")
+        state.session_tracker.start_session(state.user_id)
+        states.append(state)
+    screenings = [screen(index) for index in range(args.sessions)]
+
+    try:
+        histories = asyncio.run(run(handle_user_message, states, args.turns))
+    finally:
+        server.shutdown()
+
+    problems = check(states, histories, screenings, server.recorded_prompts)
+    print(f"{args.sessions} sessions x {args.turns} turns, {len(server.recorded_prompts)} model calls: "
+          f"{'no cross-talk' if not problems else f'{len(problems)} problems'}")
+    for problem in problems:
+        print(f"  {problem}")
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
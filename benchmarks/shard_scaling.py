@@ -0,0 +1,102 @@
+"""
+Load test: message write throughput as the number of shards grows
+
+Writers are separate processes, so they contend only on SQLite's per-file
+writer lock and not on the GIL. Each process owns a set of users and stores
+messages one at a time, so every call is its own commit - the same pattern
+as synchronous chat turns. With --synchronous FULL every commit also waits
+for an fsync, which holds the writer lock for longer; that is the case
+sharding is meant to help, since each shard has its own lock.
+
+Sharding can only help while commits wait on each other. If the machine has
+fewer cores than writers, or fsync is nearly free, the extra shard files
+cost more than they save and speedup stays at or below 1x.
+
+Usage:
+    python -m benchmarks.shard_scaling --processes 4 --synchronous FULL
+    python -m benchmarks.shard_scaling --messages 200 --shards 1 4
+"""
+
+import os
+import time
+import uuid
+import argparse
+import tempfile
+import multiprocessing
+
+from modules import database
+
+USERS_PER_WRITER = 4
+
+def configure(db_path, shards, synchronous):
+    """Point modules.database at db_path with the given shard count and sync mode"""
+    database.close_pool()
+    database.DB_PATH = db_path
+    database.DB_SHARDS = shards
+    database.CONNECTION_PRAGMAS = [
+        f"PRAGMA synchronous={synchronous}" if pragma.startswith("PRAGMA synchronous") else pragma
+        for pragma in database.CONNECTION_PRAGMAS
+    ]
+
+def writer(db_path, shards, synchronous, session_ids, messages, start_event):
+    """Writer process: store messages round-robin across its sessions"""
+    configure(db_path, shards, synchronous)
+    start_event.wait()
+    for i in range(messages):
+        session_id = session_ids[i % len(session_ids)]
+        database.store_message(session_id, "user", f"Message {i}", "anxious")
+    database.close_pool()
+
+def run(shards, processes, messages, synchronous):
+    """Return messages/second for one shard configuration"""
+    db_path = os.path.join(tempfile.mkdtemp(prefix="eft_shards_"), "eft_chatbot.db")
+    configure(db_path, shards, synchronous)
+    database.setup_database()
+
+    # Sessions are created up front so only message writes are timed
+    sessions = [
+        [database.create_session(str(uuid.uuid4())) for _ in range(USERS_PER_WRITER)]
+        for _ in range(processes)
+    ]
+    database.close_pool()
+
+    context = multiprocessing.get_context("spawn")
+    start_event = context.Event()
+    workers = [
+        context.Process(target=writer, args=(db_path, shards, synchronous, session_ids, messages, start_event))
+        for session_ids in sessions
+    ]
+    for worker in workers:
+        worker.start()
+    # Let every process finish importing before the clock starts
+    time.sleep(2.0)
+    start = time.perf_counter()
+    start_event.set()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    total = messages * processes
+    stored = database.count_rows("messages")
+    if stored != total:
+        print(f"Warning: expected {total} messages, found {stored}")
+    database.close_pool()
+    return total / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded write throughput")
+    parser.add_argument("--messages", type=int, default=500, help="Messages stored by each writer process")
+    parser.add_argument("--processes", type=int, default=4, help="Concurrent writer processes")
+    parser.add_argument("--synchronous", choices=["NORMAL", "FULL"], default="FULL")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.processes} writer processes, synchronous={args.synchronous}")
+    baseline = None
+    for shards in args.shards:
+        throughput = run(shards, args.processes, args.messages, args.synchronous)
+        baseline = baseline or throughput
+        print(f"shards={shards:<3} writes/s={throughput:,.0f}  speedup={throughput / baseline:.2f}x")
+
+if __name__ == "__main__":
+    main()
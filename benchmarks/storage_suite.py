@@ -0,0 +1,259 @@
+"""
+Storage-layer benchmark and load-generation suite
+
+Generates synthetic users, sessions, messages and tapping sequences at a
+configurable scale, then drives every public modules.database function
+single-threaded and from concurrent threads. Reports throughput,
+p50/p95/p99 latency and database size, and can compare against a saved
+baseline to catch regressions.
+
+The consent and assessment lookups are cached in-process, so the database
+caches are cleared before every timed call (outside the timing) to measure
+the queries themselves. Those lookups are then timed again with the caches
+left warm, reported as "(cached)".
+
+Usage:
+    python -m benchmarks.storage_suite --messages 100000 --threads 8
+    python -m benchmarks.storage_suite --messages 1000000 --save baseline.json
+    python -m benchmarks.storage_suite --compare baseline.json --tolerance 0.25
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import datetime
+import threading
+
+from modules import database
+from modules.cache import DATABASE_CACHES, clear_all_caches
+from benchmarks.common import percentile, file_size_mb
+
+EMOTIONS = ["anxious", "sad", "angry", "happy", "positive", "neutral"]
+PHRASES = [
+    "I've been feeling really anxious about work lately",
+    "My chest feels tight when I think about it",
+    "Maybe a 6 out of 10",
+    "A bit better now, thank you",
+    "I keep worrying that I'll let everyone down",
+]
+TAPPING_SEQUENCE = [
+    "Karate chop: Even though I feel this anxiety, I deeply and completely accept myself.",
+    "Top of head: This anxiety",
+    "Eyebrow: All this worry",
+    "Side of eye: This tightness in my chest",
+    "Under eye: Worrying about work",
+    "Under nose: All this pressure",
+    "Chin: This anxious feeling",
+    "Collarbone: I can let it go",
+    "Under arm: Feeling calmer now",
+]
+# Functions served from the in-process lookup caches when warm
+CACHED_LOOKUPS = ["has_given_consent", "has_recent_assessment", "get_latest_assessment"]
+MESSAGES_PER_SESSION = 20
+GENERATION_BATCH = 2000
+
+def generate(users, messages):
+    """
+    Populate the database with synthetic history
+
+    Returns:
+        (user_ids, session_ids) for use by the workload
+    """
+    user_ids = [f"bench-user-{i}" for i in range(users)]
+    start = time.perf_counter()
+
+    with database.get_connection() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (user_id, username, password_hash) VALUES (?, ?, ?)",
+            [(user_id, user_id, "x") for user_id in user_ids]
+        )
+        conn.commit()
+
+    session_count = max(1, messages // MESSAGES_PER_SESSION)
+    session_ids = [database.create_session(user_ids[i % users]) for i in range(session_count)]
+
+    rows = []
+    base = datetime.datetime.now() - datetime.timedelta(days=30)
+    for i in range(messages):
+        session_id = session_ids[i % session_count]
+        sender = "user" if i % 2 == 0 else "assistant"
+        emotion = random.choice(EMOTIONS) if sender == "user" else None
+        timestamp = (base + datetime.timedelta(seconds=i)).isoformat()
+        rows.append(database.build_message_row(session_id, sender, random.choice(PHRASES), emotion, timestamp))
+        if len(rows) >= GENERATION_BATCH:
+            database.store_messages(rows)
+            rows = []
+    database.store_messages(rows)
+
+    # Roughly one tapping round per five sessions
+    for session_id in session_ids[::5]:
+        database.store_tapping_sequence(session_id, TAPPING_SEQUENCE)
+
+    for user_id in user_ids:
+        database.record_consent(user_id)
+        database.store_assessment_results(user_id, random.randint(0, 21), random.randint(0, 27), False, False)
+
+    elapsed = time.perf_counter() - start
+    print(f"Generated {users:,} users, {session_count:,} sessions, {messages:,} messages in {elapsed:.1f}s")
+    return user_ids, session_ids
+
+def build_workload(user_ids, session_ids):
+    """Map each public database function to a callable exercising it with random inputs"""
+    def pick_user():
+        return random.choice(user_ids)
+
+    def pick_session():
+        return random.choice(session_ids)
+
+    def write_batch():
+        session_id = pick_session()
+        database.store_messages([
+            database.build_message_row(session_id, "user", random.choice(PHRASES), random.choice(EMOTIONS))
+            for _ in range(10)
+        ])
+
+    return {
+        "create_session": lambda: database.create_session(pick_user()),
+        "end_session": lambda: database.end_session(pick_session()),
+        "store_message": lambda: database.store_message(
+            pick_session(), "user", random.choice(PHRASES), random.choice(EMOTIONS)),
+        "store_messages (x10)": write_batch,
+        "record_consent": lambda: database.record_consent(pick_user()),
+        "has_given_consent": lambda: database.has_given_consent(pick_user()),
+        "store_assessment_results": lambda: database.store_assessment_results(
+            pick_user(), random.randint(0, 21), random.randint(0, 27), False, False),
+        "has_recent_assessment": lambda: database.has_recent_assessment(pick_user()),
+        "get_latest_assessment": lambda: database.get_latest_assessment(pick_user()),
+        "store_tapping_sequence": lambda: database.store_tapping_sequence(pick_session(), TAPPING_SEQUENCE),
+        "mark_tapping_step_completed": lambda: database.mark_tapping_step_completed(
+            pick_session(), random.randint(0, 8)),
+        "get_user_session_count": lambda: database.get_user_session_count(pick_user()),
+        "get_user_recent_emotions": lambda: database.get_user_recent_emotions(pick_user()),
+        "get_user_emotion_histogram": lambda: database.get_user_emotion_histogram(pick_user()),
+    }
+
+def clear_database_caches():
+    clear_all_caches(DATABASE_CACHES)
+
+def measure(func, operations, threads, before_call=None):
+    """
+    Run func operations times spread over threads
+
+    Args:
+        func: Callable to time
+        operations: Total calls across all threads
+        threads: Number of concurrent threads
+        before_call: Optional callable run untimed before every call
+
+    Returns:
+        Dictionary of throughput and latency percentiles
+    """
+    latencies = []
+    lock = threading.Lock()
+    per_thread = max(1, operations // threads)
+
+    def worker():
+        local = []
+        for _ in range(per_thread):
+            if before_call:
+                before_call()
+            start = time.perf_counter()
+            func()
+            local.append((time.perf_counter() - start) * 1000.0)
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "ops_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+def compare(results, baseline, tolerance):
+    """
+    Compare p95 latency against a baseline run
+
+    Returns:
+        List of regression descriptions
+    """
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous or not previous["p95_ms"]:
+            continue
+        change = (current["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"]
+        if change > tolerance:
+            regressions.append(
+                f"{key}: p95 {previous['p95_ms']:.3f}ms -> {current['p95_ms']:.3f}ms (+{change:.0%})"
+            )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="EFT Chatbot storage benchmark suite")
+    parser.add_argument("--messages", type=int, default=10_000, help="Synthetic messages to generate (10k to 10M)")
+    parser.add_argument("--users", type=int, default=None, help="Synthetic users (default: messages / 200)")
+    parser.add_argument("--operations", type=int, default=1000, help="Calls per function per run")
+    parser.add_argument("--threads", type=int, default=8, help="Threads for the concurrent run")
+    parser.add_argument("--shards", type=int, default=1, help="Number of storage shards")
+    parser.add_argument("--db-dir", default=None, help="Directory for the benchmark database")
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95 increase over baseline")
+    args = parser.parse_args()
+
+    random.seed(7303)
+    db_dir = args.db_dir or tempfile.mkdtemp(prefix="eft_suite_")
+    database.close_pool()
+    database.DB_PATH = os.path.join(db_dir, "eft_chatbot.db")
+    database.DB_SHARDS = args.shards
+    database.setup_database()
+
+    users = args.users or max(10, args.messages // 200)
+    user_ids, session_ids = generate(users, args.messages)
+    workload = build_workload(user_ids, session_ids)
+
+    results = {}
+    print(f"\n{'function':<30} {'threads':>7} {'ops/s':>10} {'p50':>9} {'p95':>9} {'p99':>9}")
+    runs = [(name, func, clear_database_caches) for name, func in workload.items()]
+    runs += [(f"{name} (cached)", workload[name], None) for name in CACHED_LOOKUPS]
+    for threads in sorted({1, args.threads}):
+        for name, func, before_call in runs:
+            stats = measure(func, args.operations, threads, before_call)
+            results[f"{name} [{threads}t]"] = stats
+            print(f"{name:<30} {threads:>7} {stats['ops_per_sec']:>10,.0f} "
+                  f"{stats['p50_ms']:>7.3f}ms {stats['p95_ms']:>7.3f}ms {stats['p99_ms']:>7.3f}ms")
+
+    size = sum(file_size_mb(path) for path in database.get_all_db_paths())
+    print(f"\nDatabase size: {size:.1f}MB across {len(database.get_all_db_paths())} file(s)")
+    database.close_pool()
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"messages": args.messages, "results": results, "db_size_mb": size}, f, indent=2)
+        print(f"Saved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Replies are only cut short for a local tapping round on tapping turns
+
+Sends messages through main.handle_user_message against the local fake
+OpenAI server and checks, for each case, whether the model's reply streamed
+through unchanged or was stopped at the karate chop line and replaced by a
+locally built round. The stored reply must match the model's word for word
+unless the round was built locally. The cutover needs both a karate chop setup statement
+("Even though ...") and a tapping turn: the user asked to tap, or the
+session has already started tapping.
+
+Needs the app's dependencies (gradio, python-dotenv), since it imports main.
+
+Usage:
+    python -m benchmarks.tapping_cutover
+"""
+
+import os
+import sys
+import asyncio
+
+from modules import model_client
+from modules.chat_state import ChatState
+from modules.tapping_scripts import get_script_stats
+from benchmarks.common import use_temp_database
+from benchmarks.fake_openai_server import start_fake_server
+from benchmarks.tapping_rounds import MODEL_ROUND
+
+EXPLANATION = """Good question! It's the first point we tap in each round.
+
+Karate chop: the fleshy outer edge of your hand, between the base of your little finger and your wrist.
+
+Tap it with the fingertips of your other hand while saying the setup statement. We can try it together whenever you feel ready."""
+
+# (label, user message, model reply, session already tapping, expect a local round)
+CASES = [
+    ("explanation", "Where exactly is the karate chop point?", EXPLANATION, False, False),
+    ("explanation mid-session", "Where exactly is the karate chop point?", EXPLANATION, True, False),
+    ("unrequested round", "I'm really anxious about my job interview", MODEL_ROUND, False, False),
+    ("round mid-session", "It's down to a 4 now", MODEL_ROUND, True, True),
+]
+
+async def run_case(handle_user_message, message, reply, tapping, server):
+    """Send one message; returns (stored assistant reply, whether the round was built locally)"""
+    server.reply = reply
+    chat_state = ChatState(user_id="cutover-user")
+    chat_state.session_tracker.start_session(chat_state.user_id)
+    if tapping:
+        chat_state.tapping_rounds = 1
+    replaced = get_script_stats()["model_scripts_replaced"]
+    history = []
+    async for history, _, _, chat_state in handle_user_message(message, history, chat_state):
+        pass
+    await model_client.close_model_client()
+    stored = chat_state.session_tracker.get_chat_session()[-1]["content"]
+    return stored, get_script_stats()["model_scripts_replaced"] > replaced
+
+def main():
+    use_temp_database()
+    server = start_fake_server(latency=0.2)
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+
+    # Imported here, after the temporary database is in place, since main sets it up on import
+    from main import handle_user_message
+
+    problems = []
+    try:
+        for label, message, reply, tapping, expect_local in CASES:
+            model_client.reset_model_client()
+            stored, local = asyncio.run(run_case(handle_user_message, message, reply, tapping, server))
+            if local != expect_local:
+                problems.append(f"{label}: {'cut over' if local else 'not cut over'}, expected the opposite")
+            elif not local and stored != reply.strip():
+                problems.append(f"{label}: reply changed on the way through: {stored!r}")
+    finally:
+        server.shutdown()
+
+    print(f"{len(CASES)} cases: {'cutover only on tapping turns' if not problems else f'{len(problems)} problems'}")
+    for problem in problems:
+        print(f"  {problem}")
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
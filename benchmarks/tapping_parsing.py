@@ -0,0 +1,208 @@
+"""
+Tapping sequence parsing: line-by-line prefix stripping versus the single-pass parser
+
+Builds a corpus of model-style replies from a fixed seed, varying:
+  - numbering and bullets ("3.", "4)", "(5)", "Step 6:", "-", "*", "•", none)
+  - markdown bold around the point
+  - point aliases ("side of the eye", "underarm")
+  - separators (colon, dash, quote)
+  - setup phrases on the line after "Karate chop:"
+  - commentary between points
+  - closing rating prompts
+Each reply is generated from a known sequence, so the benchmark first
+checks that parse_tapping_sequence recovers it exactly: the intro, every
+(point, phrase) step in order, and the closing prompt. It also checks
+that parsing a sequence's own step_lines() gives back the same steps.
+It also checks that prose mentioning a point ("Collarbone pain is
+self-reported - ...") is never read as a step, since a karate chop line
+read that way would cut the model's reply short. Then it reports throughput
+for the old parser (kept here as the baseline) and the new one.
+
+Exits non-zero if any reply parses wrongly.
+
+Usage:
+    python -m benchmarks.tapping_parsing --replies 2000 --seed 7
+"""
+
+import sys
+import time
+import random
+import argparse
+
+from modules.tapping_parser import (
+    TAPPING_POINT_NAMES, POINT_ALIASES, TappingSequence, TappingStreamParser,
+    parse_step_line, parse_tapping_sequence
+)
+
+INTROS = [
+    "Thank you for sharing that. Let's do a round of tapping on this anxiety.",
+    "I hear how heavy this feels.\nLet's begin tapping through the points.",
+    "Okay, follow along with me as we tap through each point:",
+    "",
+]
+PHRASES = [
+    "Even though I feel this anxiety in my chest, I deeply and completely accept myself.",
+    "This worry about tomorrow.",
+    "All this pressure I'm putting on myself.",
+    "What if I say the wrong thing?",
+    "This tight feeling - right here.",
+    "I can let some of this go.",
+    "It's okay to feel nervous: it makes sense.",
+    "This sadness about my mum.",
+]
+CLOSINGS = [
+    "Take a deep breath. How intense does the anxiety feel now, on a scale of 0 to 10?",
+    "Breathe in and out. What number would you give it now, from 0-10?",
+    None,
+]
+COMMENTARY = ["Take a breath between points.", "Keep tapping gently, about seven times."]
+
+# Lines that name a point but are not steps
+NOT_STEPS = [
+    "Collarbone pain is self-reported by many people - it's very common.",
+    "Karate chop is a well-known EFT point — it's on the side of your hand.",
+    "The karate chop point is on the outer edge of the hand – tap it gently.",
+    "Eyebrow-raising as it sounds, tapping can help.",
+    "Under eye circles can come from poor sleep - try to rest tonight.",
+    "Chin up — you're doing really well.",
+    "Top of head to toes, notice where you feel it - then rate it.",
+]
+
+NUMBERINGS = [
+    lambda i: "", lambda i: f"{i}. ", lambda i: f"{i}) ", lambda i: f"({i}) ",
+    lambda i: f"Step {i}: ", lambda i: "- ", lambda i: "* ", lambda i: "• ",
+]
+SEPARATORS = [": ", " - ", " – ", ":  "]
+
+def render_reply(rng, sequence):
+    """Write a sequence out the way a model might"""
+    lines = [sequence.intro, ""] if sequence.intro else []
+    numbering = rng.choice(NUMBERINGS)
+    bold = rng.random() < 0.3
+    separator = rng.choice(SEPARATORS)
+    quote = rng.choice(['"', "'", "“", ""])
+    for index, (point, phrase) in enumerate(sequence.steps, 1):
+        name = rng.choice([point, point.title(), point.capitalize()] + POINT_ALIASES.get(point, []))
+        name = f"**{name}**" if bold else name
+        quoted = f"{quote}{phrase}{'”' if quote == '“' else quote}"
+        if index == 1 and rng.random() < 0.2:
+            # Setup statement on its own line
+            lines.append(f"{numbering(index)}{name}:")
+            lines.append(quoted)
+        else:
+            lines.append(f"{numbering(index)}{name}{separator}{quoted}")
+        if index < len(sequence.steps) and rng.random() < 0.1:
+            lines.append(rng.choice(COMMENTARY))
+    if sequence.closing:
+        lines += ["", sequence.closing]
+    return "\n".join(lines)
+
+def build_corpus(count, seed):
+    """(reply, expected sequence) pairs"""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        points = TAPPING_POINT_NAMES if rng.random() < 0.7 else TAPPING_POINT_NAMES[1:]
+        steps = [(point, rng.choice(PHRASES)) for point in points]
+        expected = TappingSequence(rng.choice(INTROS), steps, rng.choice(CLOSINGS))
+        corpus.append((render_reply(rng, expected), expected))
+    return corpus
+
+def check_prose():
+    """NOT_STEPS lines the parser reads as steps, alone or opening a streamed reply"""
+    wrong = []
+    for line in NOT_STEPS:
+        parser = TappingStreamParser()
+        parser.feed(f"{line}\nHow does that feel?\n")
+        if parse_step_line(line) is not None or parser.starts_with_setup():
+            wrong.append(line)
+    return wrong
+
+def strip_quotes(phrase):
+    """Phrases keep whatever quotes the reply put around them"""
+    return phrase.strip("\"'“”")
+
+def check(corpus):
+    """Entries whose parse differs from the sequence they were generated from"""
+    failures = []
+    for reply, expected in corpus:
+        parsed = parse_tapping_sequence(reply)
+        steps = [(point, strip_quotes(phrase)) for point, phrase in parsed.steps]
+        if (parsed.intro, steps, parsed.closing) != (expected.intro, expected.steps, expected.closing):
+            failures.append((reply, expected, parsed))
+            continue
+        # Re-parsing the formatted steps gives the same steps back
+        if parse_tapping_sequence("\n".join(parsed.step_lines())).steps != parsed.steps:
+            failures.append((reply, expected, parsed))
+    return failures
+
+# The parser used before TappingSequence: strip a fixed list of prefixes,
+# then look for every point in every line
+OLD_PREFIXES = ['•', '*', '-', '1.', '2.', '3.', '4.', '5.', '6.', '7.', '8.', '9.']
+
+def old_parse_line(line):
+    line = line.strip()
+    if not line:
+        return None
+    for point in TAPPING_POINT_NAMES:
+        if point in line.lower():
+            clean_line = line
+            for prefix in OLD_PREFIXES:
+                if clean_line.startswith(prefix):
+                    clean_line = clean_line[len(prefix):].strip()
+            if not point.lower() in clean_line.lower()[:20]:
+                if ":" in clean_line:
+                    reminder_phrase = clean_line.split(":", 1)[1].strip()
+                else:
+                    reminder_phrase = clean_line
+                return f"{point.title()}: {reminder_phrase}"
+            return clean_line
+    return None
+
+def old_parse(text):
+    """Steps via split_tapping_instructions, then a second scan for the intro"""
+    steps = [step for step in (old_parse_line(line) for line in text.split("\n")) if step]
+    intro_lines = []
+    for line in text.split("\n"):
+        if old_parse_line(line):
+            break
+        intro_lines.append(line)
+    return "\n".join(intro_lines).strip(), steps
+
+def throughput(parse, replies, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for reply in replies:
+            parse(reply)
+    return len(replies) * repeats / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Tapping sequence parser benchmark and property check")
+    parser.add_argument("--replies", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.replies, args.seed)
+    failures = check(corpus)
+    old_exact = sum(len(old_parse(reply)[1]) == len(expected.steps) for reply, expected in corpus)
+    print(f"replies parsed exactly: {len(corpus) - len(failures)}/{len(corpus)} "
+          f"(old parser found the right number of steps in {old_exact})")
+    for reply, expected, parsed in failures[:5]:
+        print(f"\n--- reply\n{reply}\n--- expected\n{expected!r}\n--- parsed\n{parsed!r}")
+    prose_wrong = check_prose()
+    print(f"prose lines left alone: {len(NOT_STEPS) - len(prose_wrong)}/{len(NOT_STEPS)}")
+    for line in prose_wrong:
+        print(f"  read as a step: {line!r}")
+
+    replies = [reply for reply, _ in corpus]
+    lines = sum(reply.count("\n") + 1 for reply in replies)
+    print(f"\n{'parser':<16} {'replies/s':>10} {'lines/s':>11}")
+    for name, parse in (("old", old_parse), ("TappingSequence", parse_tapping_sequence)):
+        rate = throughput(parse, replies, args.repeats)
+        print(f"{name:<16} {rate:>10,.0f} {rate * lines / len(replies):>11,.0f}")
+
+    sys.exit(1 if failures or prose_wrong else 0)
+
+if __name__ == "__main__":
+    main()
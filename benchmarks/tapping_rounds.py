@@ -0,0 +1,127 @@
+"""
+Model-written versus locally built tapping rounds
+
+Streams a typical model reply containing a full nine-point round from the
+local fake OpenAI server and measures how long it takes until the steps are
+ready and how many completion tokens arrive. It compares two cases:
+  - letting the model write the whole round
+  - stopping the stream at the karate chop line and building the round
+    with the local template engine
+
+Before timing anything it checks the setup statements built from a set of
+user messages, and exits non-zero if any quotes back a broken issue.
+
+Usage:
+    python -m benchmarks.tapping_rounds --rounds 50 --latency 4
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+from contextlib import aclosing
+
+from modules import model_client
+from modules.context_window import count_tokens
+from modules.tapping_parser import TappingStreamParser
+from modules.tapping_scripts import build_script_for_session, extract_issue
+from benchmarks.common import percentile, time_calls
+from benchmarks.fake_openai_server import start_fake_server
+
+PROMPT = [{"role": "user", "content": "I'm really anxious about my job interview tomorrow, it's a 7"}]
+
+MODEL_ROUND = """Thank you for sharing that. Let's do a round of tapping on this anxiety about your interview. Follow along as we go tapping through the points:
+
+Karate chop: "Even though I feel really anxious about my job interview tomorrow, I deeply and completely accept myself."
+Top of head: "This anxiety about my interview."
+Eyebrow: "All this worry about how it will go."
+Side of eye: "What if I say the wrong thing?"
+Under eye: "This tight feeling in my chest."
+Under nose: "I really want this job."
+Chin: "All this pressure I'm putting on myself."
+Collarbone: "It's okay to feel nervous."
+Under arm: "I can let some of this anxiety go."
+
+Take a deep breath. How intense does the anxiety feel now, on a scale of 0 to 10?"""
+
+# (user message, issue the setup statement should quote, "" for none)
+ISSUE_CASES = [
+    ("I'm really anxious about my job interview tomorrow, it's a 7", "about my job interview tomorrow"),
+    ("Can we tap on my fear of flying?", "about my fear of flying"),
+    ("I'm worried that it will go badly", "that it will go badly"),
+    ("I'm upset because my sister ignored me", "because my sister ignored me"),
+    ("I've felt low since my dad died", "since my dad died"),
+    ("can you help me with tapping?", ""),
+    ("I think that I'm just tired", ""),
+    ("I'm nervous about tapping", ""),
+    ("tap on I don't know", ""),
+    ("I'm stressed about it", ""),
+    ("It's been hard with work and everything", ""),
+]
+
+def check_issues():
+    """Cases whose setup statement doesn't quote the expected issue"""
+    wrong = []
+    for message, expected in ISSUE_CASES:
+        chat = [{"role": "user", "content": message}]
+        issue = extract_issue(chat)
+        setup = build_script_for_session(chat, "anxious")[0]
+        if issue != expected or (not expected and "right now" not in setup):
+            wrong.append((message, expected, issue, setup))
+    return wrong
+
+async def stream_round(local):
+    """Stream one reply; returns (seconds until the steps are ready, completion tokens received)"""
+    parser = TappingStreamParser()
+    start = time.perf_counter()
+    async with aclosing(model_client.stream_chat(PROMPT, model="bench")) as stream:
+        async for delta in stream:
+            parser.feed(delta)
+            if local and parser.starts_with_setup():
+                build_script_for_session(PROMPT, "anxious")
+                break
+    parser.close()
+    return time.perf_counter() - start, count_tokens(parser.text)
+
+async def run(rounds, local):
+    results = [await stream_round(local) for _ in range(rounds)]
+    await model_client.close_model_client()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Tapping round generation benchmark")
+    parser.add_argument("--rounds", type=int, default=50, help="Rounds per configuration")
+    parser.add_argument("--latency", type=float, default=4.0, help="Fake model time to stream the full reply")
+    args = parser.parse_args()
+
+    wrong = check_issues()
+    print(f"setup statements quoting the right issue: {len(ISSUE_CASES) - len(wrong)}/{len(ISSUE_CASES)}")
+    for message, expected, issue, setup in wrong:
+        print(f"  {message!r}: expected {expected!r}, got {issue!r} in {setup!r}")
+
+    server = start_fake_server(latency=args.latency)
+    server.reply = MODEL_ROUND
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+
+    print(f"{'round written by':<18} {'p50 ready':>10} {'p95 ready':>10} {'tokens/round':>13}")
+    try:
+        for local in (False, True):
+            model_client.reset_model_client()
+            results = asyncio.run(run(args.rounds, local))
+            ready_ms = [seconds * 1000.0 for seconds, _ in results]
+            tokens = sum(count for _, count in results) / len(results)
+            label = "template engine" if local else "model"
+            print(f"{label:<18} {percentile(ready_ms, 50) / 1000:>9.2f}s "
+                  f"{percentile(ready_ms, 95) / 1000:>9.2f}s {tokens:>13.0f}")
+    finally:
+        server.shutdown()
+
+    build_ms = time_calls(lambda: build_script_for_session(PROMPT, "anxious"), 1000)
+    print(f"\nlocal build: p50 {percentile(build_ms, 50) * 1000:.0f}us, p99 {percentile(build_ms, 99) * 1000:.0f}us")
+
+    sys.exit(1 if wrong else 0)
+
+if __name__ == "__main__":
+    main()
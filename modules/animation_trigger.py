@@ -1,4 +1,5 @@
 import os
+from modules.keyword_matcher import register_keywords, scan_keywords
 
 # Map tapping points to absolute GIF filenames
 TAPPING_POINTS = {
@@ -12,6 +13,8 @@ TAPPING_POINTS = {
     "under arm": os.path.abspath("static/animations/under_arm.gif"),
     "karate chop": os.path.abspath("static/animations/karate_chop.gif")  # New addition
 }
+for _point in TAPPING_POINTS:
+    register_keywords(f"point:{_point}", [_point])
 
 # Add at the top of the file
 print("Animation directory contents:")
@@ -24,12 +27,11 @@ else:
 
 # Then update the detect_animation function
 def detect_animation(message_text):
-    message_lower = message_text.lower()
+    found = scan_keywords(message_text)
     print(f"Looking for animation in: {message_text}")
     
     for point, path in TAPPING_POINTS.items():
-        print(f"Checking if '{point}' is in message...")
-        if point in message_lower:
+        if f"point:{point}" in found:
             print(f"Match found for '{point}'!")
             if os.path.exists(path):
                 print(f"Animation file exists: {path}")
@@ -0,0 +1,292 @@
+"""
+Archive module for EFT Chatbot
+Moves old, ended sessions out of the live database into compressed monthly archive files
+"""
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import datetime
+from contextlib import closing
+from modules import database
+from modules.ids import id_to_bytes, id_to_str
+
+# Archival settings
+ARCHIVE_AFTER_DAYS = int(os.getenv("EFT_ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("EFT_ARCHIVE_BATCH_SIZE", "20"))  # sessions per write transaction
+ARCHIVE_BATCH_PAUSE = 0.05  # seconds between batches so live writers get the lock
+ARCHIVE_COMPRESSION_LEVEL = 6
+
+def get_archive_dir():
+    """Directory holding the monthly archive files (next to the live database)"""
+    return os.getenv(
+        "EFT_ARCHIVE_DIR",
+        os.path.join(os.path.dirname(database.DB_PATH), "eft_archive")
+    )
+
+def archive_path_for(start_time):
+    """Monthly archive file for a session that started at start_time"""
+    month = (start_time or "unknown")[:7].replace("-", "_")
+    return os.path.join(get_archive_dir(), f"eft_archive_{month}.db")
+
+def _open_archive(path):
+    """Open (creating if needed) a monthly archive file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=database.DB_BUSY_TIMEOUT)
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS archived_sessions (
+        session_id BLOB PRIMARY KEY,
+        user_id TEXT,
+        start_time TIMESTAMP,
+        end_time TIMESTAMP,
+        payload BLOB
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_archived_sessions_user ON archived_sessions (user_id)")
+    conn.commit()
+    return conn
+
+def _compress(document):
+    return zlib.compress(json.dumps(document).encode("utf-8"), ARCHIVE_COMPRESSION_LEVEL)
+
+def _decompress(payload):
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+def _read_session(conn, session_id):
+    """Collect a session's messages and tapping steps as a JSON-serialisable document"""
+    messages = [
+        {
+            "message_id": id_to_str(row[0]),
+            "timestamp": row[1],
+            "sender": row[2],
+            "content": row[3],
+            "emotion": row[4]
+        }
+        for row in conn.execute(
+            """
+            SELECT message_id, timestamp, sender, content, emotion
+            FROM messages WHERE session_id = ? ORDER BY timestamp
+            """,
+            (session_id,)
+        )
+    ]
+    tapping_steps = [
+        {
+            "step_number": row[0],
+            "step_content": row[1],
+            "completed": bool(row[2]),
+            "completed_at": row[3]
+        }
+        for row in conn.execute(
+            """
+            SELECT step_number, step_content, completed, completed_at
+            FROM tapping_steps WHERE session_id = ? ORDER BY step_number
+            """,
+            (session_id,)
+        )
+    ]
+    return {"messages": messages, "tapping_steps": tapping_steps}
+
+def _archive_batch(db_path, cutoff, batch_size):
+    """
+    Archive one batch of sessions from a single database file
+
+    Returns:
+        Number of sessions archived
+    """
+    # Read phase: no write lock is held while sessions are copied out
+    with database.get_connection(db_path) as conn:
+        candidates = conn.execute(
+            """
+            SELECT session_id, user_id, start_time, end_time
+            FROM sessions
+            WHERE end_time IS NOT NULL AND end_time < ?
+            ORDER BY end_time
+            LIMIT ?
+            """,
+            (cutoff, batch_size)
+        ).fetchall()
+        documents = {row[0]: _read_session(conn, row[0]) for row in candidates}
+
+    if not candidates:
+        return 0
+
+    # Write the archive copies first; replacing makes a re-run after a crash safe
+    by_file = {}
+    for session_id, user_id, start_time, end_time in candidates:
+        by_file.setdefault(archive_path_for(start_time), []).append(
+            (session_id, user_id, start_time, end_time, _compress(documents[session_id]))
+        )
+    for path, rows in by_file.items():
+        with closing(_open_archive(path)) as archive:
+            archive.executemany(
+                "INSERT OR REPLACE INTO archived_sessions VALUES (?, ?, ?, ?, ?)", rows
+            )
+            archive.commit()
+
+    # Short write transaction on the live database: index the sessions and drop them
+    now = datetime.datetime.now().isoformat()
+    with database.get_connection(db_path) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for path, rows in by_file.items():
+            for session_id, user_id, start_time, end_time, _ in rows:
+                conn.execute(
+                    "INSERT OR REPLACE INTO archived_sessions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (session_id, user_id, start_time, end_time, os.path.basename(path),
+                     len(documents[session_id]["messages"]), now)
+                )
+                conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+                conn.execute("DELETE FROM tapping_steps WHERE session_id = ?", (session_id,))
+                conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        conn.commit()
+
+    return len(candidates)
+
+def archive_old_sessions(max_age_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE,
+                         max_batches=None):
+    """
+    Move ended sessions older than max_age_days into monthly archive files
+
+    Args:
+        max_age_days: Archive sessions that ended more than this many days ago
+        batch_size: Sessions moved per write transaction
+        max_batches: Stop after this many batches per database file (None for no limit)
+
+    Returns:
+        Number of sessions archived
+    """
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=max_age_days)).isoformat()
+    total = 0
+
+    for db_path in database.get_shard_paths():
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            try:
+                moved = _archive_batch(db_path, cutoff, batch_size)
+            except Exception as e:
+                print(f"Error archiving sessions from {db_path}: {e}")
+                break
+            if not moved:
+                break
+            total += moved
+            batches += 1
+            time.sleep(ARCHIVE_BATCH_PAUSE)
+
+    if total:
+        print(f"Archived {total} sessions older than {max_age_days} days")
+    return total
+
+def _lookup_archived(session_id):
+    """Find an archived session's index row and the live database that holds it"""
+    session_key = id_to_bytes(session_id)
+    try:
+        db_path = database.shard_path_for_session(session_key)
+    except KeyError:
+        # A session that was never routed was never archived either
+        return None, session_key, None
+    with database.get_connection(db_path) as conn:
+        row = conn.execute(
+            "SELECT user_id, archive_file FROM archived_sessions WHERE session_id = ?",
+            (session_key,)
+        ).fetchone()
+    return db_path, session_key, row
+
+def list_archived_sessions(user_id):
+    """
+    List a user's archived sessions
+
+    Returns:
+        List of dictionaries describing each archived session
+    """
+    with database.get_connection(database.shard_path_for_user(user_id)) as conn:
+        rows = conn.execute(
+            """
+            SELECT session_id, start_time, end_time, archive_file, message_count
+            FROM archived_sessions WHERE user_id = ? ORDER BY start_time
+            """,
+            (user_id,)
+        ).fetchall()
+
+    return [
+        {
+            "session_id": id_to_str(row[0]),
+            "start_time": row[1],
+            "end_time": row[2],
+            "archive_file": row[3],
+            "message_count": row[4]
+        }
+        for row in rows
+    ]
+
+def export_archived_session(session_id):
+    """
+    Export an archived session with its messages and tapping steps
+
+    Returns:
+        Dictionary with the session data, or None if it is not archived
+    """
+    try:
+        _, session_key, row = _lookup_archived(session_id)
+        if not row:
+            return None
+
+        path = os.path.join(get_archive_dir(), row[1])
+        with closing(_open_archive(path)) as archive:
+            record = archive.execute(
+                "SELECT user_id, start_time, end_time, payload FROM archived_sessions WHERE session_id = ?",
+                (session_key,)
+            ).fetchone()
+        if not record:
+            return None
+
+        document = _decompress(record[3])
+        document.update({
+            "session_id": id_to_str(session_key),
+            "user_id": record[0],
+            "start_time": record[1],
+            "end_time": record[2]
+        })
+        return document
+    except Exception as e:
+        print(f"Error exporting archived session {session_id}: {e}")
+        return None
+
+def delete_archived_session(session_id):
+    """
+    Permanently delete an archived session and its index entry
+
+    Returns:
+        Boolean indicating whether the session was found and deleted
+    """
+    try:
+        db_path, session_key, row = _lookup_archived(session_id)
+        if not row:
+            return False
+
+        path = os.path.join(get_archive_dir(), row[1])
+        with closing(_open_archive(path)) as archive:
+            archive.execute("DELETE FROM archived_sessions WHERE session_id = ?", (session_key,))
+            archive.commit()
+
+        with database.get_connection(db_path) as conn:
+            conn.execute("DELETE FROM archived_sessions WHERE session_id = ?", (session_key,))
+            conn.commit()
+        return True
+    except Exception as e:
+        print(f"Error deleting archived session {session_id}: {e}")
+        return False
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Archive old EFT Chatbot sessions")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="Archive sessions that ended more than this many days ago")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE,
+                        help="Sessions moved per write transaction")
+    args = parser.parse_args()
+
+    database.ensure_db_exists()
+    archive_old_sessions(args.days, args.batch_size)
@@ -5,9 +5,12 @@ Handles user registration, login, and session management
 
 import hashlib
 import uuid
-import sqlite3
 import gradio as gr
-from modules.database import DB_PATH
+from modules.database import get_connection
+from modules.cache import TTLCache, MISSING, DATABASE_CACHES
+
+# Usernames are looked up on every chat turn to personalise the prompt
+_username_cache = TTLCache("usernames", group=DATABASE_CACHES)
 
 def hash_password(password):
     """Create a secure hash of a password"""
@@ -18,26 +21,24 @@ def register_user(username, password):
     if not username or not password:
         return {"success": False, "message": "Username and password are required"}
         
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Check if username exists
-    cursor.execute("SELECT username FROM users WHERE username = ?", (username,))
-    if cursor.fetchone():
-        conn.close()
-        return {"success": False, "message": "Username already exists"}
-    
-    # Create new user
-    user_id = str(uuid.uuid4())
-    password_hash = hash_password(password)
-    
-    cursor.execute(
-        "INSERT INTO users (user_id, username, password_hash) VALUES (?, ?, ?)",
-        (user_id, username, password_hash)
-    )
-    
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Check if username exists
+        cursor.execute("SELECT username FROM users WHERE username = ?", (username,))
+        if cursor.fetchone():
+            return {"success": False, "message": "Username already exists"}
+        
+        # Create new user
+        user_id = str(uuid.uuid4())
+        password_hash = hash_password(password)
+        
+        cursor.execute(
+            "INSERT INTO users (user_id, username, password_hash) VALUES (?, ?, ?)",
+            (user_id, username, password_hash)
+        )
+        
+        conn.commit()
     
     return {"success": True, "user_id": user_id, "message": "Registration successful"}
 
@@ -46,41 +47,40 @@ def login_user(username, password):
     if not username or not password:
         return {"success": False, "message": "Username and password are required"}
         
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "SELECT user_id, password_hash FROM users WHERE username = ?", 
-        (username,)
-    )
-    result = cursor.fetchone()
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "SELECT user_id, password_hash FROM users WHERE username = ?", 
+            (username,)
+        )
+        result = cursor.fetchone()
     
     if not result:
-        conn.close()
         return {"success": False, "message": "Invalid username or password"}
     
     user_id, stored_hash = result
     
     if hash_password(password) != stored_hash:
-        conn.close()
         return {"success": False, "message": "Invalid username or password"}
     
-    conn.close()
     return {"success": True, "user_id": user_id, "message": "Login successful"}
 
 def get_username(user_id):
     """Get username from user_id"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    cached = _username_cache.get(user_id)
+    if cached is not MISSING:
+        return cached
     
-    cursor.execute("SELECT username FROM users WHERE user_id = ?", (user_id,))
-    result = cursor.fetchone()
+    with get_connection() as conn:
+        cursor = conn.execute("SELECT username FROM users WHERE user_id = ?", (user_id,))
+        result = cursor.fetchone()
     
-    conn.close()
+    if not result:
+        # Not cached, so the id resolves once its user exists
+        return None
     
-    if result:
-        return result[0]
-    return None
+    username = result[0]
+    _username_cache.set(user_id, username)
+    return username
 
 def create_auth_interface():
     """Create login/registration interface with Gradio"""
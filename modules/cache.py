@@ -0,0 +1,148 @@
+"""
+Cache module for EFT Chatbot
+In-process TTL/LRU caches for per-user lookups, with hit/miss counters for monitoring
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+CACHE_TTL = float(os.getenv("EFT_CACHE_TTL", "300"))  # seconds
+CACHE_MAX_ENTRIES = int(os.getenv("EFT_CACHE_MAX_ENTRIES", "10000"))
+
+# Group of caches holding database rows, cleared when the connection pool closes
+DATABASE_CACHES = "database"
+
+# Sentinel returned by get() on a miss, since None is a valid cached value
+MISSING = object()
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a fixed time"""
+
+    def __init__(self, name, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, group=None):
+        self.name = name
+        self.group = group  # clear_all_caches(group) empties only caches in this group
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value, tag)
+        self._tags = {}  # tag -> set of keys, for invalidating everything about one user
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        with _registry_lock:
+            _registry[name] = self
+
+    def get(self, key):
+        """Return the cached value for key, or MISSING"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+
+            expires_at, value, tag = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return MISSING
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, tag=None):
+        """
+        Cache a value
+
+        Args:
+            key: Hashable cache key
+            value: Value to cache
+            tag: Optional group (e.g. a user id) that invalidate_tag clears together
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (time.monotonic() + self.ttl, value, tag)
+            if tag is not None:
+                self._tags.setdefault(tag, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def items(self):
+        """Unexpired (key, value) pairs, least recently used first"""
+        now = time.monotonic()
+        with self._lock:
+            return [(key, value) for key, (expires_at, value, _) in self._entries.items() if expires_at >= now]
+
+    def invalidate(self, key):
+        """Drop a single key"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def invalidate_tag(self, tag):
+        """Drop every key cached under tag"""
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        """Drop everything"""
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key):
+        """Remove key; caller must hold the lock"""
+        _, _, tag = self._entries.pop(key)
+        if tag is not None:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+def get_cache_stats():
+    """Hit/miss counters for every cache, keyed by cache name"""
+    with _registry_lock:
+        caches = list(_registry.values())
+    return {cache.name: cache.stats() for cache in caches}
+
+def clear_all_caches(group=None):
+    """
+    Empty every cache, or only those in one group
+
+    Args:
+        group: Optional group name (e.g. DATABASE_CACHES, for caches of rows
+            that go stale when the database file is replaced)
+    """
+    with _registry_lock:
+        caches = [cache for cache in _registry.values() if group is None or cache.group == group]
+    for cache in caches:
+        cache.clear()
@@ -0,0 +1,51 @@
+"""
+Chat State module for EFT Chatbot
+Per-browser-session conversation and tapping state, held in a Gradio gr.State
+"""
+
+from modules.session_tracker import SessionTracker
+
+class ChatState:
+    """Everything one browser session needs, so concurrent users never share state"""
+    
+    def __init__(self, user_id=None):
+        self.user_id = user_id
+        self.session_tracker = SessionTracker()
+        self.tapping_steps = []
+        self.step_index = 0
+        self.awaiting_tapping_steps = False
+        self.tapping_closing = None  # the reply's own rating prompt for the end of the round
+        self.tapping_rounds = 0  # rounds started this session, so each one can vary its phrases
+        # Set once the user has mentioned self-harm; later model calls use the crisis lane
+        self.crisis_flagged = False
+    
+    @property
+    def tapping_active(self):
+        """True once this session has started tapping, so a model reply may carry the next round"""
+        return self.tapping_rounds > 0
+    
+    def start_tapping(self, tapping_steps, closing=None):
+        """Begin stepping through a tapping sequence"""
+        self.tapping_steps = list(tapping_steps)
+        self.tapping_closing = closing
+        self.step_index = 0
+        self.awaiting_tapping_steps = True
+        self.tapping_rounds += 1
+    
+    def reset_tapping(self):
+        """Forget any tapping sequence in progress"""
+        self.tapping_steps = []
+        self.tapping_closing = None
+        self.step_index = 0
+        self.awaiting_tapping_steps = False
+
+def ensure_chat_state(chat_state):
+    """
+    Return the session's ChatState, creating it on first use
+    
+    gr.State deep-copies its initial value for every new session, so the
+    state starts as None and is built lazily here instead.
+    """
+    if chat_state is None:
+        chat_state = ChatState()
+    return chat_state
@@ -0,0 +1,187 @@
+"""
+Context Window module for EFT Chatbot
+Keeps prompts inside a token budget: recent turns verbatim, older turns folded into a rolling summary
+"""
+
+import os
+import asyncio
+import threading
+from modules.model_client import complete_chat
+from modules.scheduler import PRIORITY_BACKGROUND
+
+# Prompt budget, counted with tiktoken when it is installed (chars / 4 otherwise)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("EFT_CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_RECENT_TURNS = int(os.getenv("EFT_CONTEXT_RECENT_TURNS", "4"))  # user + assistant pairs kept verbatim
+
+# Summarise once this many messages have dropped out of the recent window
+SUMMARY_BATCH_MESSAGES = int(os.getenv("EFT_SUMMARY_BATCH_MESSAGES", "4"))
+SUMMARY_MODEL = os.getenv("EFT_SUMMARY_MODEL", "gpt-3.5-turbo-0125")
+SUMMARY_TEMPERATURE = 0.2
+
+# OpenAI adds a few tokens of framing to every message
+TOKENS_PER_MESSAGE = 4
+
+SUMMARY_INSTRUCTIONS = """You maintain a running summary of an EFT tapping session between a user and Sarah, an EFT therapist chatbot.
+Update the summary with the new messages. Keep what matters for continuing the session: the issue being worked on,
+where the user feels it, intensity ratings (0-10) and how they changed, setup statements and reminder phrases used,
+and anything the user asked Sarah to remember. Write at most 150 words in plain prose."""
+
+_encoding = None
+_encoding_loaded = False
+_stats_lock = threading.Lock()
+_stats = {
+    "turns": 0,
+    "prompt_tokens_full": 0,
+    "prompt_tokens_sent": 0,
+    "last_prompt_tokens_full": 0,
+    "last_prompt_tokens_sent": 0,
+    "summaries": 0,
+    "summary_failures": 0
+}
+
+def _get_encoding():
+    """Load the tiktoken encoding once; None when tiktoken is not installed"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"tiktoken unavailable, estimating tokens from length: {e}")
+    return _encoding
+
+def count_tokens(text):
+    """Count the tokens in a piece of text"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(text) // 4 + 1
+
+def count_message_tokens(messages):
+    """Count the prompt tokens for a list of chat messages"""
+    return sum(count_tokens(message["content"]) + TOKENS_PER_MESSAGE for message in messages)
+
+def _update_stats(full_tokens, sent_tokens):
+    with _stats_lock:
+        _stats["turns"] += 1
+        _stats["prompt_tokens_full"] += full_tokens
+        _stats["prompt_tokens_sent"] += sent_tokens
+        _stats["last_prompt_tokens_full"] = full_tokens
+        _stats["last_prompt_tokens_sent"] = sent_tokens
+
+def _count_summary(succeeded):
+    with _stats_lock:
+        _stats["summaries" if succeeded else "summary_failures"] += 1
+
+def get_context_stats():
+    """Prompt tokens per turn with the full history (before) and as actually sent (after)"""
+    with _stats_lock:
+        stats = dict(_stats)
+    turns = stats["turns"]
+    stats["avg_prompt_tokens_full"] = stats["prompt_tokens_full"] / turns if turns else 0.0
+    stats["avg_prompt_tokens_sent"] = stats["prompt_tokens_sent"] / turns if turns else 0.0
+    return stats
+
+class ContextWindow:
+    """
+    Per-session prompt builder with a rolling summary
+
+    The summary covers history[:summarised_upto]; everything after it is
+    sent verbatim, newest first, until the token budget runs out.
+    """
+
+    def __init__(self, token_budget=CONTEXT_TOKEN_BUDGET, recent_turns=CONTEXT_RECENT_TURNS):
+        self.token_budget = token_budget
+        self.recent_messages = recent_turns * 2
+        self.summary = ""
+        self.summarised_upto = 0
+        self._epoch = 0  # bumped on reset so a late summary for an old session is discarded
+        self._task = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Forget the summary (e.g. when a new session starts)"""
+        with self._lock:
+            self.summary = ""
+            self.summarised_upto = 0
+            self._epoch += 1
+
+    def fit(self, messages):
+        """
+        Trim a prompt to the token budget
+
+        Args:
+            messages: The system prompt followed by the full conversation history
+
+        Returns:
+            The system prompt, the summary (if any) and as many of the newest
+            unsummarised messages as fit, always including the last one
+        """
+        system, history = messages[:1], messages[1:]
+        with self._lock:
+            summary = self.summary
+            summarised_upto = min(self.summarised_upto, len(history))
+
+        prompt = list(system)
+        if summary:
+            prompt.append({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+
+        remaining = self.token_budget - count_message_tokens(prompt)
+        kept = []
+        for message in reversed(history[summarised_upto:]):
+            cost = count_message_tokens([message])
+            if kept and cost > remaining:
+                break
+            kept.append(message)
+            remaining -= cost
+        prompt.extend(reversed(kept))
+
+        _update_stats(count_message_tokens(messages), count_message_tokens(prompt))
+        return prompt
+
+    def schedule_summary(self, history):
+        """
+        Start a background refresh of the summary if enough turns have left the recent window
+
+        Must be called from a running event loop; returns the task, or None if
+        nothing needs summarising or a refresh is already running.
+        """
+        with self._lock:
+            if self._task is not None and not self._task.done():
+                return None
+            cutoff = len(history) - self.recent_messages
+            if cutoff - self.summarised_upto < SUMMARY_BATCH_MESSAGES:
+                return None
+            pending = list(history[self.summarised_upto:cutoff])
+            summary, epoch = self.summary, self._epoch
+            self._task = asyncio.get_running_loop().create_task(
+                self._refresh_summary(summary, pending, cutoff, epoch)
+            )
+            return self._task
+
+    async def _refresh_summary(self, summary, pending, cutoff, epoch):
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in pending)
+        try:
+            new_summary = await complete_chat(
+                [
+                    {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+                    {"role": "user", "content": f"Summary so far:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"}
+                ],
+                model=SUMMARY_MODEL,
+                temperature=SUMMARY_TEMPERATURE,
+                priority=PRIORITY_BACKGROUND
+            )
+        except Exception as e:
+            # Older turns stay verbatim (budget permitting) until the next attempt
+            print(f"Error refreshing conversation summary: {e}")
+            _count_summary(False)
+            return
+
+        with self._lock:
+            if epoch == self._epoch:
+                self.summary = new_summary
+                self.summarised_upto = cutoff
+        _count_summary(True)
@@ -4,49 +4,266 @@ Handles SQLite database operations for user accounts, sessions, and messages
 """
 
 import sqlite3
-import uuid
 import datetime
 import os
 import time
+import json
+import queue
+import threading
+import zlib
+from collections import Counter
+from contextlib import contextmanager
 from pathlib import Path
+from modules.migrations import upgrade, get_schema_version
+from modules.ids import new_id, id_to_bytes, id_to_str
+from modules.cache import TTLCache, MISSING, DATABASE_CACHES, clear_all_caches
 
 # Set a fixed path for the database in the user's home directory
 DB_PATH = os.path.join(os.path.expanduser("~"), "eft_chatbot.db")
 print(f"Using database at: {DB_PATH}")
 
+# Connection pool settings
+DB_POOL_SIZE = int(os.getenv("EFT_DB_POOL_SIZE", "8"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("EFT_DB_STATEMENT_CACHE_SIZE", "256"))
+DB_BUSY_TIMEOUT = 30.0  # seconds to wait on a locked database
+
+# Number of recent emotions kept per user in the emotion summary
+EMOTION_RING_SIZE = int(os.getenv("EFT_EMOTION_RING_SIZE", "50"))
+
+# Emotion value for a message row whose emotion will be tagged later; stored
+# as NULL with emotion_pending = 1 until apply_emotion_tags fills it in
+EMOTION_PENDING = "pending"
+
+# Pragmas applied once to every pooled connection
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+]
+
+class ConnectionPool:
+    """Pool of long-lived SQLite connections for a single database file"""
+    
+    def __init__(self, db_path, size=DB_POOL_SIZE):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+    
+    def _connect(self):
+        """Open a new connection and apply the pool pragmas"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=DB_BUSY_TIMEOUT,
+            check_same_thread=False,
+            cached_statements=DB_STATEMENT_CACHE_SIZE
+        )
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    def acquire(self):
+        """Take an idle connection, opening a new one while under the size limit"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        
+        # Pool exhausted, wait for a connection to be released
+        return self._idle.get(timeout=DB_BUSY_TIMEOUT)
+    
+    def release(self, conn):
+        """Return a connection to the pool, discarding any open transaction"""
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            conn.close()
+            with self._lock:
+                self._created -= 1
+            return
+        self._idle.put(conn)
+    
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled connection"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+    
+    def close(self):
+        """Close every idle connection; busy ones are closed when released"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+# Optional sharding of user-scoped tables across several database files
+DB_SHARDS = int(os.getenv("EFT_DB_SHARDS", "1"))
+SHARDED_TABLES = ["sessions", "messages", "tapping_steps", "assessments", "user_emotion_summary"]
+SESSION_ROUTE_CACHE_SIZE = 10000
+
+_pools = {}
+_pool_lock = threading.Lock()
+
+# Read-through cache for consent and assessment lookups, tagged by user id
+_user_lookup_cache = TTLCache("user_lookups", group=DATABASE_CACHES)
+_session_routes = {}
+_session_routes_lock = threading.Lock()
+
+def get_pool(db_path=None):
+    """Get the connection pool for a database file (DB_PATH by default)"""
+    db_path = db_path or DB_PATH
+    with _pool_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = ConnectionPool(db_path)
+            _pools[db_path] = pool
+        return pool
+
+def close_pool():
+    """Close all pooled connections (e.g. before replacing the database file)"""
+    with _pool_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+    with _session_routes_lock:
+        _session_routes.clear()
+    # Emotion results don't depend on the database, so they survive a pool reset
+    clear_all_caches(DATABASE_CACHES)
+
+def get_connection(db_path=None):
+    """
+    Borrow a pooled connection to the database
+    
+    Usage:
+        with get_connection() as conn:
+            conn.execute(...)
+    """
+    return get_pool(db_path).connection()
+
+def is_sharded():
+    """Whether user-scoped tables are split across shard files"""
+    return DB_SHARDS > 1
+
+def get_shard_paths():
+    """Paths of every file holding user-scoped tables"""
+    if not is_sharded():
+        return [DB_PATH]
+    root, ext = os.path.splitext(DB_PATH)
+    return [f"{root}.shard{index}{ext or '.db'}" for index in range(DB_SHARDS)]
+
+def get_all_db_paths():
+    """Main database followed by any shard files"""
+    if not is_sharded():
+        return [DB_PATH]
+    return [DB_PATH] + get_shard_paths()
+
+def shard_path_for_user(user_id):
+    """Route a user to the file holding their sessions, messages and assessments"""
+    if not is_sharded():
+        return DB_PATH
+    # crc32 is stable across processes, unlike hash()
+    index = zlib.crc32(str(user_id).encode("utf-8")) % DB_SHARDS
+    return get_shard_paths()[index]
+
+def _record_session_route(session_id, user_id):
+    """Remember which user (and so which shard) owns a session"""
+    with get_connection() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO session_routes (session_id, user_id) VALUES (?, ?)",
+            (id_to_bytes(session_id), user_id)
+        )
+        conn.commit()
+    _cache_session_route(session_id, user_id)
+
+def _cache_session_route(session_id, user_id):
+    with _session_routes_lock:
+        if len(_session_routes) >= SESSION_ROUTE_CACHE_SIZE:
+            _session_routes.clear()
+        _session_routes[id_to_bytes(session_id)] = user_id
+
+def shard_path_for_session(session_id):
+    """
+    Route a session to its owner's shard
+    
+    Raises:
+        KeyError in sharded mode if the session has no route; its rows belong
+        in a shard, so they are never written to the main file instead
+    """
+    if not is_sharded():
+        return DB_PATH
+    
+    session_key = id_to_bytes(session_id)
+    with _session_routes_lock:
+        user_id = _session_routes.get(session_key)
+    
+    if user_id is None:
+        with get_connection() as conn:
+            row = conn.execute(
+                "SELECT user_id FROM session_routes WHERE session_id = ?", (session_key,)
+            ).fetchone()
+        if not row:
+            raise KeyError(f"No shard route for session {id_to_str(session_key)}")
+        user_id = row[0]
+        _cache_session_route(session_id, user_id)
+    
+    return shard_path_for_user(user_id)
+
+def query_all_shards(query, params=()):
+    """
+    Run a read-only query against every shard and concatenate the rows
+    
+    Intended for admin and reporting queries that span all users.
+    """
+    rows = []
+    for path in get_shard_paths():
+        with get_connection(path) as conn:
+            rows.extend(conn.execute(query, params).fetchall())
+    return rows
+
+def count_rows(table):
+    """Count rows in a user-scoped table across all shards"""
+    if table not in SHARDED_TABLES:
+        raise ValueError(f"Not a user-scoped table: {table}")
+    return sum(row[0] for row in query_all_shards(f"SELECT COUNT(*) FROM {table}"))
+
 def ensure_db_exists():
-    """Make sure the database file exists"""
-    # If database doesn't exist, create it
+    """Make sure the database file exists and its schema is up to date"""
     if not os.path.exists(DB_PATH):
         print(f"Database not found at {DB_PATH}, creating new database...")
-        setup_database()
     else:
         print(f"Database found at {DB_PATH}, checking structure...")
-        try:
-            # Simple validation - try to query users table
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='users'")
-            if not cursor.fetchone():
-                print("Users table not found, recreating database...")
-                conn.close()
-                backup_and_recreate_db()
-            else:
-                print("Database structure appears valid")
-                
-                # Check for required tables
-                verify_all_tables(conn)
-                
-            conn.close()
-        except Exception as e:
-            print(f"Database validation error: {e}")
-            print("Recreating database...")
-            try:
-                conn.close()
-            except:
-                pass
-            
-            backup_and_recreate_db()
+    
+    try:
+        setup_database()
+    except sqlite3.DatabaseError as e:
+        print(f"Database validation error: {e}")
+        print("Recreating database...")
+        backup_and_recreate_db()
 
 def backup_and_recreate_db():
     """Backup existing database and create a new one"""
@@ -61,8 +278,14 @@ def backup_and_recreate_db():
             shutil.copy2(DB_PATH, backup_path)
             print(f"Created backup at {backup_path}")
             
-            # Remove original
+            # Release pooled connections before the file goes away
+            close_pool()
+
+            # Remove original along with any WAL side files
             os.remove(DB_PATH)
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(DB_PATH + suffix):
+                    os.remove(DB_PATH + suffix)
             time.sleep(1)  # Small delay to ensure file is released
     except Exception as ex:
         print(f"Failed to backup database: {ex}")
@@ -71,170 +294,60 @@ def backup_and_recreate_db():
     setup_database()
 
 def verify_all_tables(conn=None):
-    """Verify all required tables exist and create them if needed"""
-    should_close = False
-    if conn is None:
-        conn = sqlite3.connect(DB_PATH)
-        should_close = True
-        
-    cursor = conn.cursor()
-    
+    """Verify all required tables exist by applying any pending migrations"""
     try:
-        # Check if required tables exist
-        required_tables = [
-            'users', 'consent', 'assessments', 'sessions', 'messages', 'tapping_steps'
-        ]
-        
-        # Get all existing tables
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        existing_tables = [row[0] for row in cursor.fetchall()]
-        print(f"Existing tables: {existing_tables}")
-        
-        # Create any missing tables
-        if 'messages' not in existing_tables:
-            print("Creating missing 'messages' table...")
-            cursor.execute('''
-            CREATE TABLE messages (
-                message_id TEXT PRIMARY KEY,
-                session_id TEXT,
-                timestamp TIMESTAMP,
-                sender TEXT,
-                content TEXT,
-                emotion TEXT,
-                FOREIGN KEY (session_id) REFERENCES sessions (session_id)
-            )
-            ''')
-        
-        if 'tapping_steps' not in existing_tables:
-            print("Creating missing 'tapping_steps' table...")
-            cursor.execute('''
-            CREATE TABLE tapping_steps (
-                step_id TEXT PRIMARY KEY,
-                session_id TEXT,
-                step_number INTEGER,
-                step_content TEXT,
-                completed BOOLEAN DEFAULT 0,
-                completed_at TIMESTAMP,
-                FOREIGN KEY (session_id) REFERENCES sessions (session_id)
-            )
-            ''')
-        
-        conn.commit()
+        if conn is not None:
+            upgrade(conn)
+        else:
+            for path in get_all_db_paths():
+                with get_connection(path) as pooled:
+                    upgrade(pooled)
         print("Database tables verified successfully")
     except Exception as e:
         print(f"Error verifying database tables: {e}")
-    
-    if should_close:
-        conn.close()
 
 def setup_database():
-    """Set up the SQLite database with required tables"""
+    """Set up the SQLite database, migrating it to the latest schema version"""
     try:
         # Create parent directory if it doesn't exist
         os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
         
-        # Create fresh database
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Create tables
-        print("Creating users table...")
-        cursor.execute('''
-        CREATE TABLE users (
-            user_id TEXT PRIMARY KEY,
-            username TEXT UNIQUE,
-            password_hash TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        print("Creating consent table...")
-        cursor.execute('''
-        CREATE TABLE consent (
-            consent_id TEXT PRIMARY KEY,
-            user_id TEXT,
-            consented_at TIMESTAMP,
-            consent_version TEXT,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
-        )
-        ''')
-        
-        print("Creating assessments table...")
-        cursor.execute('''
-        CREATE TABLE assessments (
-            assessment_id TEXT PRIMARY KEY,
-            user_id TEXT,
-            completed_at TIMESTAMP,
-            gad7_score INTEGER,
-            phq9_score INTEGER,
-            is_high_risk BOOLEAN,
-            has_suicide_risk BOOLEAN,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
-        )
-        ''')
-        
-        print("Creating sessions table...")
-        cursor.execute('''
-        CREATE TABLE sessions (
-            session_id TEXT PRIMARY KEY,
-            user_id TEXT,
-            start_time TIMESTAMP,
-            end_time TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
-        )
-        ''')
-        
-        print("Creating messages table...")
-        cursor.execute('''
-        CREATE TABLE messages (
-            message_id TEXT PRIMARY KEY,
-            session_id TEXT,
-            timestamp TIMESTAMP,
-            sender TEXT,
-            content TEXT,
-            emotion TEXT,
-            FOREIGN KEY (session_id) REFERENCES sessions (session_id)
-        )
-        ''')
-        
-        print("Creating tapping_steps table...")
-        cursor.execute('''
-        CREATE TABLE tapping_steps (
-            step_id TEXT PRIMARY KEY,
-            session_id TEXT,
-            step_number INTEGER,
-            step_content TEXT,
-            completed BOOLEAN DEFAULT 0,
-            completed_at TIMESTAMP,
-            FOREIGN KEY (session_id) REFERENCES sessions (session_id)
-        )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        print(f"Database setup complete at {DB_PATH}")
+        # The main database and every shard share one schema
+        for path in get_all_db_paths():
+            with get_connection(path) as conn:
+                applied = upgrade(conn)
+                version = get_schema_version(conn)
+            
+            if applied:
+                print(f"Applied migrations {applied}")
+            print(f"Database at {path} is at schema version {version}")
     except Exception as e:
         print(f"Error setting up database: {e}")
         raise
 
 def create_session(user_id):
-    """Create a new therapy session"""
+    """
+    Create a new therapy session
+    
+    Returns:
+        The new session id as a UUID string
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        session_id = str(uuid.uuid4())
+        session_id = new_id()
         now = datetime.datetime.now().isoformat()
         
-        cursor.execute(
-            "INSERT INTO sessions (session_id, user_id, start_time) VALUES (?, ?, ?)",
-            (session_id, user_id, now)
-        )
+        # Record the route first so a stored session is always reachable
+        if is_sharded():
+            _record_session_route(session_id, user_id)
         
-        conn.commit()
-        conn.close()
+        with get_connection(shard_path_for_user(user_id)) as conn:
+            conn.execute(
+                "INSERT INTO sessions (session_id, user_id, start_time) VALUES (?, ?, ?)",
+                (session_id, user_id, now)
+            )
+            conn.commit()
         
-        return session_id
+        return id_to_str(session_id)
     except Exception as e:
         print(f"Error creating session: {e}")
         return None
@@ -242,84 +355,182 @@ def create_session(user_id):
 def end_session(session_id):
     """End a therapy session"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
         now = datetime.datetime.now().isoformat()
         
-        cursor.execute(
-            "UPDATE sessions SET end_time = ? WHERE session_id = ?",
-            (now, session_id)
-        )
-        
-        conn.commit()
-        conn.close()
+        with get_connection(shard_path_for_session(session_id)) as conn:
+            conn.execute(
+                "UPDATE sessions SET end_time = ? WHERE session_id = ?",
+                (now, id_to_bytes(session_id))
+            )
+            conn.commit()
     except Exception as e:
         print(f"Error ending session: {e}")
 
+def build_message_row(session_id, sender, content, emotion=None, timestamp=None):
+    """
+    Build a messages row tuple, assigning its id and timestamp
+    
+    Returns:
+        Tuple of (message_id, session_id, timestamp, sender, content, emotion),
+        with both ids in their 16-byte stored form
+    """
+    message_id = new_id()
+    if timestamp is None:
+        timestamp = datetime.datetime.now().isoformat()
+    return (message_id, id_to_bytes(session_id), timestamp, sender, content, emotion)
+
 def store_message(session_id, sender, content, emotion=None):
     """Store a message with emotion"""
+    store_messages([build_message_row(session_id, sender, content, emotion)])
+
+def store_messages(rows):
+    """
+    Store a batch of messages in a single transaction
+    
+    The per-user emotion summary is updated in the same transaction. In
+    sharded mode the batch is split into one transaction per shard.
+    
+    Args:
+        rows: Row tuples from build_message_row
+        
+    Returns:
+        True if the batch was committed
+    """
+    if not rows:
+        return True
+    
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        message_id = str(uuid.uuid4())
-        now = datetime.datetime.now().isoformat()
+        rows_by_shard = {}
+        for row in rows:
+            rows_by_shard.setdefault(shard_path_for_session(row[1]), []).append(row)
+        
+        for path, shard_rows in rows_by_shard.items():
+            with get_connection(path) as conn:
+                conn.executemany(
+                    "INSERT INTO messages (message_id, session_id, timestamp, sender, content, emotion, emotion_pending) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [_stored_message_row(row) for row in shard_rows]
+                )
+                _update_emotion_rollup(conn, shard_rows)
+                conn.commit()
+        return True
+    except Exception as e:
+        print(f"Error storing message batch: {e}")
+        return False
+
+def _stored_message_row(row):
+    """Map a build_message_row tuple to the messages columns, including emotion_pending"""
+    message_id, session_id, timestamp, sender, content, emotion = row
+    if emotion == EMOTION_PENDING:
+        return (message_id, session_id, timestamp, sender, content, None, 1)
+    return (message_id, session_id, timestamp, sender, content, emotion, 0)
+
+def apply_emotion_tags(tags):
+    """
+    Fill in the emotion of messages stored as pending
+    
+    Each shard's updates and the matching emotion summary changes are
+    committed in one transaction. Messages that are no longer pending (e.g.
+    already tagged by an earlier run) are left alone.
+    
+    Args:
+        tags: List of (message_id, session_id, emotion), ids in their stored form
         
-        cursor.execute(
-            "INSERT INTO messages (message_id, session_id, timestamp, sender, content, emotion) VALUES (?, ?, ?, ?, ?, ?)",
-            (message_id, session_id, now, sender, content, emotion)
+    Returns:
+        Number of messages updated, or None if a shard's update failed
+    """
+    if not tags:
+        return 0
+    
+    updated = 0
+    try:
+        tags_by_shard = {}
+        for tag in tags:
+            tags_by_shard.setdefault(shard_path_for_session(tag[1]), []).append(tag)
+        
+        for path, shard_tags in tags_by_shard.items():
+            with get_connection(path) as conn:
+                tagged_rows = []
+                for message_id, session_id, emotion in shard_tags:
+                    cursor = conn.execute(
+                        "UPDATE messages SET emotion = ?, emotion_pending = 0 WHERE message_id = ? AND emotion_pending = 1",
+                        (emotion, message_id)
+                    )
+                    if cursor.rowcount:
+                        tagged_rows.append((message_id, session_id, None, "user", None, emotion))
+                _update_emotion_rollup(conn, tagged_rows)
+                conn.commit()
+                updated += len(tagged_rows)
+        return updated
+    except Exception as e:
+        print(f"Error applying emotion tags: {e}")
+        return None
+
+def get_pending_emotion_messages(limit=1000):
+    """
+    Messages still waiting for an emotion tag, e.g. left behind by a crash
+    
+    Returns:
+        List of (message_id, session_id, content), oldest first, ids in their stored form
+    """
+    try:
+        rows = query_all_shards(
+            """
+            SELECT message_id, session_id, content, timestamp FROM messages
+            WHERE emotion_pending = 1 ORDER BY timestamp LIMIT ?
+            """,
+            (limit,)
         )
-        
-        conn.commit()
-        conn.close()
+        rows.sort(key=lambda row: row[3])
+        return [(message_id, session_id, content) for message_id, session_id, content, _ in rows[:limit]]
     except Exception as e:
-        print(f"Error storing message: {e}")
+        print(f"Error reading pending emotion tags: {e}")
+        return []
 
 def record_consent(user_id, version="1.0"):
     """Record user consent"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Check if consent already exists
-        cursor.execute(
-            "SELECT consent_id FROM consent WHERE user_id = ? AND consent_version = ?",
-            (user_id, version)
-        )
-        
-        if cursor.fetchone():
-            # Consent already recorded
-            conn.close()
-            return
-        
-        consent_id = str(uuid.uuid4())
-        now = datetime.datetime.now().isoformat()
-        
-        cursor.execute(
-            "INSERT INTO consent (consent_id, user_id, consented_at, consent_version) VALUES (?, ?, ?, ?)",
-            (consent_id, user_id, now, version)
-        )
-        
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            
+            # Check if consent already exists
+            cursor.execute(
+                "SELECT consent_id FROM consent WHERE user_id = ? AND consent_version = ?",
+                (user_id, version)
+            )
+            
+            if cursor.fetchone():
+                # Consent already recorded
+                return
+            
+            consent_id = new_id()
+            now = datetime.datetime.now().isoformat()
+            
+            cursor.execute(
+                "INSERT INTO consent (consent_id, user_id, consented_at, consent_version) VALUES (?, ?, ?, ?)",
+                (consent_id, user_id, now, version)
+            )
+            
+            conn.commit()
+        _user_lookup_cache.invalidate(("consent", user_id, version))
     except Exception as e:
         print(f"Error recording consent: {e}")
 
 def has_given_consent(user_id, version="1.0"):
     """Check if user has given consent"""
+    cache_key = ("consent", user_id, version)
+    cached = _user_lookup_cache.get(cache_key)
+    if cached is not MISSING:
+        return cached
+    
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT consent_id FROM consent WHERE user_id = ? AND consent_version = ?",
-            (user_id, version)
-        )
-        
-        result = cursor.fetchone() is not None
-        conn.close()
+        with get_connection() as conn:
+            cursor = conn.execute(
+                "SELECT consent_id FROM consent WHERE user_id = ? AND consent_version = ?",
+                (user_id, version)
+            )
+            result = cursor.fetchone() is not None
         
+        _user_lookup_cache.set(cache_key, result, tag=user_id)
         return result
     except Exception as e:
         print(f"Error checking consent: {e}")
@@ -328,43 +539,42 @@ def has_given_consent(user_id, version="1.0"):
 def store_assessment_results(user_id, gad7_score, phq9_score, is_high_risk, has_suicide_risk):
     """Store assessment results"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        assessment_id = str(uuid.uuid4())
+        assessment_id = new_id()
         now = datetime.datetime.now().isoformat()
         
-        cursor.execute(
-            """
-            INSERT INTO assessments (assessment_id, user_id, completed_at, 
-                                   gad7_score, phq9_score, is_high_risk, has_suicide_risk) 
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (assessment_id, user_id, now, gad7_score, phq9_score, is_high_risk, has_suicide_risk)
-        )
-        
-        conn.commit()
-        conn.close()
+        with get_connection(shard_path_for_user(user_id)) as conn:
+            conn.execute(
+                """
+                INSERT INTO assessments (assessment_id, user_id, completed_at, 
+                                       gad7_score, phq9_score, is_high_risk, has_suicide_risk) 
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (assessment_id, user_id, now, gad7_score, phq9_score, is_high_risk, has_suicide_risk)
+            )
+            conn.commit()
+        _user_lookup_cache.invalidate_tag(user_id)
     except Exception as e:
         print(f"Error storing assessment results: {e}")
 
 def has_recent_assessment(user_id, days=7):
     """Check if user has completed an assessment recently"""
+    cache_key = ("recent_assessment", user_id, days)
+    cached = _user_lookup_cache.get(cache_key)
+    if cached is not MISSING:
+        return cached
+    
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
         # Calculate date threshold
         threshold_date = (datetime.datetime.now() - datetime.timedelta(days=days)).isoformat()
         
-        cursor.execute(
-            "SELECT assessment_id FROM assessments WHERE user_id = ? AND completed_at > ? LIMIT 1",
-            (user_id, threshold_date)
-        )
-        
-        result = cursor.fetchone() is not None
-        conn.close()
+        with get_connection(shard_path_for_user(user_id)) as conn:
+            cursor = conn.execute(
+                "SELECT assessment_id FROM assessments WHERE user_id = ? AND completed_at > ? LIMIT 1",
+                (user_id, threshold_date)
+            )
+            result = cursor.fetchone() is not None
         
+        _user_lookup_cache.set(cache_key, result, tag=user_id)
         return result
     except Exception as e:
         print(f"Error checking recent assessment: {e}")
@@ -372,26 +582,28 @@ def has_recent_assessment(user_id, days=7):
 
 def get_latest_assessment(user_id):
     """Get user's most recent assessment results"""
+    cache_key = ("latest_assessment", user_id)
+    cached = _user_lookup_cache.get(cache_key)
+    if cached is not MISSING:
+        return dict(cached) if cached else None
+    
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            """
-            SELECT gad7_score, phq9_score, is_high_risk, has_suicide_risk, completed_at
-            FROM assessments 
-            WHERE user_id = ? 
-            ORDER BY completed_at DESC 
-            LIMIT 1
-            """,
-            (user_id,)
-        )
-        
-        result = cursor.fetchone()
-        conn.close()
+        with get_connection(shard_path_for_user(user_id)) as conn:
+            cursor = conn.execute(
+                """
+                SELECT gad7_score, phq9_score, is_high_risk, has_suicide_risk, completed_at
+                FROM assessments 
+                WHERE user_id = ? 
+                ORDER BY completed_at DESC 
+                LIMIT 1
+                """,
+                (user_id,)
+            )
+            result = cursor.fetchone()
         
+        assessment = None
         if result:
-            return {
+            assessment = {
                 "gad7_score": result[0],
                 "phq9_score": result[1],
                 "is_high_risk": bool(result[2]),
@@ -399,7 +611,8 @@ def get_latest_assessment(user_id):
                 "completed_at": result[4]
             }
         
-        return None
+        _user_lookup_cache.set(cache_key, assessment, tag=user_id)
+        return dict(assessment) if assessment else None
     except Exception as e:
         print(f"Error getting latest assessment: {e}")
         return None
@@ -407,88 +620,222 @@ def get_latest_assessment(user_id):
 def store_tapping_sequence(session_id, tapping_steps):
     """Store a sequence of tapping steps"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        rows = [
+            (new_id(), id_to_bytes(session_id), i, step)
+            for i, step in enumerate(tapping_steps)
+        ]
         
-        for i, step in enumerate(tapping_steps):
-            step_id = str(uuid.uuid4())
-            
-            cursor.execute(
+        with get_connection(shard_path_for_session(session_id)) as conn:
+            conn.executemany(
                 """
                 INSERT INTO tapping_steps (step_id, session_id, step_number, step_content)
                 VALUES (?, ?, ?, ?)
                 """,
-                (step_id, session_id, i, step)
+                rows
             )
-        
-        conn.commit()
-        conn.close()
+            conn.commit()
     except Exception as e:
         print(f"Error storing tapping sequence: {e}")
 
 def mark_tapping_step_completed(session_id, step_number):
     """Mark a tapping step as completed"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
         now = datetime.datetime.now().isoformat()
         
-        cursor.execute(
-            """
-            UPDATE tapping_steps
-            SET completed = 1, completed_at = ?
-            WHERE session_id = ? AND step_number = ?
-            """,
-            (now, session_id, step_number)
-        )
-        
-        conn.commit()
-        conn.close()
+        with get_connection(shard_path_for_session(session_id)) as conn:
+            conn.execute(
+                """
+                UPDATE tapping_steps
+                SET completed = 1, completed_at = ?
+                WHERE session_id = ? AND step_number = ?
+                """,
+                (now, id_to_bytes(session_id), step_number)
+            )
+            conn.commit()
     except Exception as e:
         print(f"Error marking tapping step completed: {e}")
 
 def get_user_session_count(user_id):
-    """Get number of sessions for a user"""
+    """Get number of sessions for a user, including archived ones"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT COUNT(*) FROM sessions WHERE user_id = ?",
-            (user_id,)
-        )
-        
-        count = cursor.fetchone()[0]
-        conn.close()
-        
-        return count
+        with get_connection(shard_path_for_user(user_id)) as conn:
+            cursor = conn.execute(
+                """
+                SELECT (SELECT COUNT(*) FROM sessions WHERE user_id = ?)
+                     + (SELECT COUNT(*) FROM archived_sessions WHERE user_id = ?)
+                """,
+                (user_id, user_id)
+            )
+            return cursor.fetchone()[0]
     except Exception as e:
         print(f"Error getting user session count: {e}")
         return 0
 
+def _load_emotion_summary(conn, user_id):
+    """Read a user's emotion summary row as (recent, counts), or None if missing"""
+    row = conn.execute(
+        "SELECT recent_emotions, emotion_counts FROM user_emotion_summary WHERE user_id = ?",
+        (user_id,)
+    ).fetchone()
+    if not row:
+        return None
+    return json.loads(row[0]), json.loads(row[1])
+
+def _save_emotion_summary(conn, user_id, recent, counts):
+    """Write a user's emotion summary row"""
+    conn.execute(
+        """
+        INSERT INTO user_emotion_summary (user_id, recent_emotions, emotion_counts, last_updated)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            recent_emotions = excluded.recent_emotions,
+            emotion_counts = excluded.emotion_counts,
+            last_updated = excluded.last_updated
+        """,
+        (user_id, json.dumps(recent[:EMOTION_RING_SIZE]), json.dumps(counts),
+         datetime.datetime.now().isoformat())
+    )
+
+def _rebuild_emotion_summary(conn, user_id):
+    """Recompute a user's emotion summary from their full message history"""
+    cursor = conn.execute(
+        """
+        SELECT m.emotion 
+        FROM messages m
+        JOIN sessions s ON m.session_id = s.session_id
+        WHERE s.user_id = ? AND m.sender = 'user' AND m.emotion IS NOT NULL
+        ORDER BY m.timestamp DESC
+        """,
+        (user_id,)
+    )
+    emotions = [row[0] for row in cursor.fetchall()]
+    _save_emotion_summary(conn, user_id, emotions, dict(Counter(emotions)))
+
+def _update_emotion_rollup(conn, rows):
+    """Fold newly inserted or tagged message rows into the per-user emotion summaries"""
+    user_by_session = {}
+    emotions_by_user = {}
+    # Message ids are UUIDv7, so sorting by id puts the batch in the order it was written
+    for message_id, session_id, timestamp, sender, content, emotion in sorted(rows, key=lambda row: id_to_bytes(row[0])):
+        if sender != "user" or not emotion or emotion == EMOTION_PENDING:
+            continue
+        if session_id not in user_by_session:
+            row = conn.execute(
+                "SELECT user_id FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            user_by_session[session_id] = row[0] if row else None
+        user_id = user_by_session[session_id]
+        if user_id is not None:
+            emotions_by_user.setdefault(user_id, []).append(emotion)
+    
+    for user_id, emotions in emotions_by_user.items():
+        summary = _load_emotion_summary(conn, user_id)
+        if summary is None:
+            # First summary for this user - seed it from history, which already
+            # includes every row of this batch, from all of the user's sessions
+            _rebuild_emotion_summary(conn, user_id)
+            continue
+        
+        recent, counts = summary
+        recent = list(reversed(emotions)) + recent
+        for emotion in emotions:
+            counts[emotion] = counts.get(emotion, 0) + 1
+        _save_emotion_summary(conn, user_id, recent, counts)
+
+def rebuild_emotion_summaries(user_id=None):
+    """
+    Backfill the emotion summary table from existing message history
+    
+    Args:
+        user_id: Rebuild only this user (defaults to every user with sessions)
+        
+    Returns:
+        Number of users rebuilt
+    """
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        user_ids = [row[0] for row in query_all_shards(
+            "SELECT DISTINCT user_id FROM sessions WHERE user_id IS NOT NULL"
+        )]
+    
+    # One short transaction per user so live writers are never blocked for long
+    for uid in user_ids:
+        with get_connection(shard_path_for_user(uid)) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            _rebuild_emotion_summary(conn, uid)
+            conn.commit()
+    
+    return len(user_ids)
+
 def get_user_recent_emotions(user_id, limit=5):
     """Get recent emotions expressed by user"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            """
-            SELECT m.emotion 
-            FROM messages m
-            JOIN sessions s ON m.session_id = s.session_id
-            WHERE s.user_id = ? AND m.sender = 'user' AND m.emotion IS NOT NULL
-            ORDER BY m.timestamp DESC
-            LIMIT ?
-            """,
-            (user_id, limit)
-        )
-        
-        emotions = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        
-        return emotions
+        with get_connection(shard_path_for_user(user_id)) as conn:
+            if limit <= EMOTION_RING_SIZE:
+                summary = _load_emotion_summary(conn, user_id)
+                if summary is not None:
+                    return summary[0][:limit]
+            
+            # No summary yet (or a longer history requested) - read messages directly
+            cursor = conn.execute(
+                """
+                SELECT m.emotion 
+                FROM messages m
+                JOIN sessions s ON m.session_id = s.session_id
+                WHERE s.user_id = ? AND m.sender = 'user' AND m.emotion IS NOT NULL
+                ORDER BY m.timestamp DESC
+                LIMIT ?
+                """,
+                (user_id, limit)
+            )
+            return [row[0] for row in cursor.fetchall()]
     except Exception as e:
         print(f"Error getting user recent emotions: {e}")
-        return []
\ No newline at end of file
+        return []
+
+def get_user_emotion_histogram(user_id):
+    """
+    Get how often the user has expressed each emotion
+    
+    Returns:
+        Dictionary mapping emotion to message count
+    """
+    try:
+        with get_connection(shard_path_for_user(user_id)) as conn:
+            summary = _load_emotion_summary(conn, user_id)
+            if summary is not None:
+                return summary[1]
+            
+            cursor = conn.execute(
+                """
+                SELECT m.emotion, COUNT(*)
+                FROM messages m
+                JOIN sessions s ON m.session_id = s.session_id
+                WHERE s.user_id = ? AND m.sender = 'user' AND m.emotion IS NOT NULL
+                GROUP BY m.emotion
+                """,
+                (user_id,)
+            )
+            return {emotion: count for emotion, count in cursor.fetchall()}
+    except Exception as e:
+        print(f"Error getting user emotion histogram: {e}")
+        return {}
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="EFT Chatbot database maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    backfill_parser = subparsers.add_parser(
+        "backfill-emotions", help="Rebuild per-user emotion summaries from message history"
+    )
+    backfill_parser.add_argument("--user-id", help="Only rebuild this user")
+    
+    args = parser.parse_args()
+    
+    if args.command == "backfill-emotions":
+        ensure_db_exists()
+        count = rebuild_emotion_summaries(args.user_id)
+        print(f"Rebuilt emotion summaries for {count} users")
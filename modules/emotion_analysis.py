@@ -3,23 +3,236 @@ Emotion Analysis module for EFT Chatbot
 Uses BERT model to detect emotions in user messages
 """
 
-from transformers import pipeline
+import os
+import json
+import time
+import queue
+import atexit
+import hashlib
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from modules.cache import TTLCache, MISSING
+from modules.keyword_matcher import register_keywords, scan_keywords
+
+EMOTION_MODEL_NAME = "bhadresh-savani/distilbert-base-uncased-emotion"
+
+# "torch" runs the transformers pipeline; "onnx" runs the int8 ONNX export on onnxruntime
+# (see modules/emotion_onnx.py) and does not load torch
+EMOTION_BACKEND = os.getenv("EFT_EMOTION_BACKEND", "torch").lower()
+
+# Micro-batching: a batch runs once it has this many texts or the first one has waited this long
+EMOTION_BATCH_SIZE = int(os.getenv("EFT_EMOTION_BATCH_SIZE", "16"))
+EMOTION_BATCH_WAIT_MS = float(os.getenv("EFT_EMOTION_BATCH_WAIT_MS", "5"))
+
+# Longest a caller waits for its batch before giving up (the caller falls back to keywords)
+EMOTION_TIMEOUT = float(os.getenv("EFT_EMOTION_TIMEOUT", "5"))
+
+# Map model labels to more general categories for consistency
+EMOTION_MAPPING = {
+    "joy": "happy",
+    "love": "positive",
+    "sadness": "sad",
+    "anger": "angry",
+    "fear": "anxious",
+    "surprise": "surprised"
+}
+
+# Results cached per normalised text, kept across restarts while the model version stays the same
+EMOTION_CACHE_MAX_ENTRIES = int(os.getenv("EFT_EMOTION_CACHE_MAX_ENTRIES", "20000"))  # 0 disables the cache
+EMOTION_CACHE_PATH = os.getenv("EFT_EMOTION_CACHE_PATH", os.path.join(os.path.expanduser("~"), "eft_emotion_cache.json"))
+
+# Run once after loading so the first real message doesn't pay for lazy initialisation
+WARMUP_TEXT = "I feel a bit anxious about today."
 
 class EmotionAnalyzer:
-    def __init__(self):
-        # Initialize the emotion classifier
-        try:
-            # Load a pre-trained emotion detection model
-            self.classifier = pipeline(
-                "text-classification", 
-                model="bhadresh-savani/distilbert-base-uncased-emotion",
-                top_k=1
+    """
+    Emotion classifier that loads its model on demand
+
+    Creating one is cheap. The model is loaded by load() or, without blocking
+    the caller, by start_background_load(); is_initialized stays False until
+    the model is loaded and warmed up, and callers use the keyword fallback
+    until then. backend is "torch" or "onnx" (EFT_EMOTION_BACKEND by default).
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or EMOTION_BACKEND
+        self.classifier = None
+        self.is_initialized = False
+        self.load_failed = False
+        self.load_timings = {}  # phase -> seconds
+        self.model_version = None
+        self.cache_path = EMOTION_CACHE_PATH
+        # Results never go stale for a given model, so entries only leave by LRU eviction
+        self.result_cache = None
+        if EMOTION_CACHE_MAX_ENTRIES > 0:
+            self.result_cache = TTLCache("emotion_results", EMOTION_CACHE_MAX_ENTRIES, ttl=float("inf"))
+        self._load_thread = None
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        """
+        Load the model and run a warmup inference
+
+        Returns:
+            True if the model is ready
+        """
+        with self._load_lock:
+            if self.is_initialized or self.load_failed:
+                return self.is_initialized
+            try:
+                start = time.perf_counter()
+                if self.backend == "onnx":
+                    from modules.emotion_onnx import OnnxEmotionClassifier
+                else:
+                    from transformers import pipeline
+                self.load_timings["import"] = time.perf_counter() - start
+
+                # Load a pre-trained emotion detection model
+                start = time.perf_counter()
+                if self.backend == "onnx":
+                    self.classifier = OnnxEmotionClassifier()
+                else:
+                    self.classifier = pipeline(
+                        "text-classification", 
+                        model=EMOTION_MODEL_NAME,
+                        top_k=1
+                    )
+                self.load_timings["model"] = time.perf_counter() - start
+
+                start = time.perf_counter()
+                self.classifier(WARMUP_TEXT)
+                self.load_timings["warmup"] = time.perf_counter() - start
+
+                self.model_version = self._get_model_version()
+                if self.result_cache is not None and self.cache_path:
+                    self.load_cache()
+                    atexit.register(self.save_cache)
+
+                self.is_initialized = True
+                timings = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.load_timings.items())
+                print(f"Emotion analyzer initialized successfully ({self.backend} backend; {timings})")
+            except Exception as e:
+                print(f"Error initializing emotion analyzer: {e}")
+                print("Will use keyword-based fallback for emotion detection")
+                self.load_failed = True
+            return self.is_initialized
+
+    def start_background_load(self):
+        """Load the model on a daemon thread; returns the thread (the same one if already started)"""
+        with self._load_lock:
+            if self._load_thread is None:
+                self._load_thread = threading.Thread(target=self.load, name="emotion-model-loader", daemon=True)
+                self._load_thread.start()
+            return self._load_thread
+
+    def wait_until_ready(self, timeout=None):
+        """Block until a background load finishes; returns whether the model is ready"""
+        thread = self._load_thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.is_initialized
+    
+    def _get_model_version(self):
+        """Identify the loaded weights, so cached results from other weights are never reused"""
+        if self.backend == "onnx":
+            return f"onnx:{self.classifier.version}"
+        config = getattr(getattr(self.classifier, "model", None), "config", None)
+        commit = getattr(config, "_commit_hash", None)
+        return f"torch:{EMOTION_MODEL_NAME}@{commit or 'unknown'}"
+    
+    def _classify(self, texts, batch_size=None):
+        """
+        Model label and score for each text, running the model only for texts not in the cache
+        
+        Args:
+            texts: List of non-empty texts
+            batch_size: Texts per forward pass (default: all misses at once)
+            
+        Returns:
+            List of (label, score) tuples
+        """
+        results = [None] * len(texts)
+        misses = {}  # cache key -> indexes of texts with that key
+        for i, text in enumerate(texts):
+            key = cache_key(text)
+            cached = self.result_cache.get(key) if self.result_cache is not None else MISSING
+            if cached is MISSING:
+                misses.setdefault(key, []).append(i)
+            else:
+                results[i] = cached
+        
+        if misses:
+            # Repeats within the batch are classified once
+            keys = list(misses)
+            outputs = self.classifier(
+                [texts[misses[key][0]] for key in keys],
+                batch_size=batch_size or len(keys),
+                truncation=True
             )
-            self.is_initialized = True
-            print("Emotion analyzer initialized successfully")
+            for key, output in zip(keys, outputs):
+                result = (output[0]["label"], float(output[0]["score"]))
+                if self.result_cache is not None:
+                    self.result_cache.set(key, result)
+                for i in misses[key]:
+                    results[i] = result
+        return results
+    
+    def load_cache(self):
+        """Restore results saved by an earlier run, unless the model version has changed since"""
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except Exception as e:
+            print(f"Error loading emotion cache: {e}")
+            return
+        
+        entries = saved.get("entries", [])
+        if saved.get("model_version") != self.model_version:
+            print(f"Emotion model changed, discarding {len(entries)} cached results")
+            return
+        for key, label, score in entries:
+            self.result_cache.set(key, (label, score))
+        print(f"Loaded {len(entries)} cached emotion results")
+    
+    def save_cache(self, merge=False):
+        """
+        Write the cache to disk (least recently used first, so a reload keeps the LRU order)
+        
+        Args:
+            merge: Keep the entries already saved by other processes (e.g. the
+                other pool workers), ahead of this one's in LRU order
+        """
+        if self.result_cache is None or not self.cache_path or self.model_version is None:
+            return
+        entries = [[key, label, score] for key, (label, score) in self.result_cache.items()]
+        if merge and os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, "r", encoding="utf-8") as f:
+                    saved = json.load(f)
+                if saved.get("model_version") == self.model_version:
+                    # A key seen again moves to its later, more recently used position
+                    merged = {}
+                    for entry in saved.get("entries", []) + entries:
+                        merged.pop(entry[0], None)
+                        merged[entry[0]] = entry
+                    entries = list(merged.values())[-self.result_cache.max_entries:]
+            except Exception as e:
+                print(f"Error merging emotion cache: {e}")
+        temp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"model_version": self.model_version, "entries": entries}, f)
+            os.replace(temp_path, self.cache_path)
         except Exception as e:
-            print(f"Error initializing emotion analyzer: {e}")
-            self.is_initialized = False
+            print(f"Error saving emotion cache: {e}")
+    
+    def cache_stats(self):
+        """Hit rate and size of the result cache"""
+        if self.result_cache is None:
+            return {}
+        return self.result_cache.stats()
     
     def detect_emotion(self, text):
         """
@@ -38,23 +251,11 @@ class EmotionAnalyzer:
             return "neutral"
         
         try:
-            # Get prediction from model
-            result = self.classifier(text)[0][0]
-            emotion = result["label"]
-            confidence = result["score"]
-            
-            # Map to more general categories for consistency
-            emotion_mapping = {
-                "joy": "happy",
-                "love": "positive",
-                "sadness": "sad",
-                "anger": "angry",
-                "fear": "anxious",
-                "surprise": "surprised"
-            }
+            # Get prediction from the cache or the model
+            emotion, confidence = self._classify([text])[0]
             
             # Use mapped emotion or original if not in mapping
-            mapped_emotion = emotion_mapping.get(emotion, emotion)
+            mapped_emotion = EMOTION_MAPPING.get(emotion, emotion)
             
             return mapped_emotion
             
@@ -62,6 +263,34 @@ class EmotionAnalyzer:
             print(f"Error detecting emotion: {e}")
             return "neutral"
     
+    def detect_emotions(self, texts, batch_size=None):
+        """
+        Detect the primary emotion in several texts with padded batches
+        
+        Args:
+            texts: List of texts to analyze
+            batch_size: Texts per forward pass (default: all of them at once)
+            
+        Returns:
+            List of emotion strings, one per text
+        """
+        emotions = ["neutral"] * len(texts)
+        if not self.is_initialized:
+            return emotions
+        
+        indexes = [i for i, text in enumerate(texts) if text and text.strip()]
+        if not indexes:
+            return emotions
+        
+        try:
+            results = self._classify([texts[i] for i in indexes], batch_size)
+            for i, (emotion, _) in zip(indexes, results):
+                emotions[i] = EMOTION_MAPPING.get(emotion, emotion)
+        except Exception as e:
+            print(f"Error detecting emotions: {e}")
+        
+        return emotions
+    
     def analyze_with_details(self, text):
         """
         Analyze text and return detailed emotion information
@@ -79,22 +308,11 @@ class EmotionAnalyzer:
             return {"emotion": "neutral", "confidence": 1.0, "original": None}
         
         try:
-            # Get prediction from model
-            result = self.classifier(text)[0][0]
-            emotion = result["label"]
-            confidence = result["score"]
+            # Get prediction from the cache or the model
+            emotion, confidence = self._classify([text])[0]
             
             # Map to more general categories
-            emotion_mapping = {
-                "joy": "happy",
-                "love": "positive",
-                "sadness": "sad",
-                "anger": "angry",
-                "fear": "anxious",
-                "surprise": "surprised"
-            }
-            
-            mapped_emotion = emotion_mapping.get(emotion, emotion)
+            mapped_emotion = EMOTION_MAPPING.get(emotion, emotion)
             
             return {
                 "emotion": mapped_emotion,
@@ -106,6 +324,120 @@ class EmotionAnalyzer:
             print(f"Error analyzing emotion: {e}")
             return {"emotion": "neutral", "confidence": 1.0, "original": None}
 
+def normalise_text(text):
+    """Case- and whitespace-insensitive form of a message (the model is uncased)"""
+    return " ".join(text.lower().split())
+
+def cache_key(text):
+    """Result cache key: a hash of the normalised text, so message text is never stored in the cache"""
+    return hashlib.blake2b(normalise_text(text).encode("utf-8"), digest_size=16).hexdigest()
+
+class EmotionBatcher:
+    """
+    Micro-batching front end for an EmotionAnalyzer
+    
+    Callers on any thread submit one text each. A worker thread takes the
+    first waiting text, gathers whatever else arrives within max_wait (up to
+    max_batch_size texts), runs them as one padded batch and hands each
+    caller its own result. Texts that queue up while a batch is running go
+    into the next one, so batches grow with load.
+    """
+    
+    def __init__(self, analyzer, max_batch_size=None, max_wait=None):
+        self.analyzer = analyzer
+        self.max_batch_size = max_batch_size or EMOTION_BATCH_SIZE
+        self.max_wait = EMOTION_BATCH_WAIT_MS / 1000.0 if max_wait is None else max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+    
+    def submit(self, text):
+        """
+        Queue a text for the next batch
+        
+        Returns:
+            Future resolving to the emotion string
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="emotion-batcher", daemon=True)
+                self._thread.start()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+    
+    def detect_emotion(self, text, timeout=None):
+        """
+        Detect the emotion in one text as part of a batch
+        
+        Raises:
+            concurrent.futures.TimeoutError: If the batch doesn't finish in time
+        """
+        future = self.submit(text)
+        try:
+            return future.result(EMOTION_TIMEOUT if timeout is None else timeout)
+        except FutureTimeoutError:
+            # Skip the text if its batch hasn't started yet
+            future.cancel()
+            raise
+    
+    def _collect(self):
+        """Block for the first text, then gather more until the batch is full or max_wait passes"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Callers that already gave up don't need a result
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                emotions = self.analyzer.detect_emotions([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), emotion in zip(batch, emotions):
+                future.set_result(emotion)
+            self.batches += 1
+            self.items += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+    
+    def stats(self):
+        """Batch counts and sizes so far"""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "queued": self._queue.qsize()
+        }
+
+# Keywords for the fallback detector, checked in this order; whole words only,
+# and a trailing * matches any ending ("worr*" matches "worried", "worrying")
+EMOTION_KEYWORDS = {
+    "anxious": ["anxious", "anxiety", "worr*", "nervous", "stress*", "panic*", "afraid", "scared", "terrified"],
+    "sad": ["sad", "unhappy", "depressed", "feeling down", "feel down", "feeling low", "feeling blue",
+            "upset", "miserable", "grief", "griev*"],
+    "angry": ["angry", "mad", "furious", "annoyed", "irritated", "frustrat*", "upset"],
+    "happy": ["happy", "glad", "joy", "joyful", "pleased", "delighted", "satisfied"],
+    "positive": ["better", "good", "relieved", "hopeful", "grateful", "thankful"]
+}
+for _emotion, _keywords in EMOTION_KEYWORDS.items():
+    register_keywords(f"emotion:{_emotion}", _keywords)
+
 # Fallback emotion detection using keywords if BERT fails
 def detect_emotion_keywords(text):
     """
@@ -117,19 +449,11 @@ def detect_emotion_keywords(text):
     Returns:
         Detected emotion string
     """
-    text = text.lower()
-    
-    emotions = {
-        "anxious": ["anxious", "worried", "nervous", "stress", "panic", "afraid", "scared", "terrified"],
-        "sad": ["sad", "unhappy", "depressed", "down", "blue", "upset", "miserable", "grief"],
-        "angry": ["angry", "mad", "furious", "annoyed", "irritated", "frustrated", "upset"],
-        "happy": ["happy", "glad", "joy", "pleased", "delighted", "content", "satisfied"],
-        "positive": ["better", "good", "relieved", "hopeful", "grateful", "thankful"]
-    }
+    found = scan_keywords(text)
     
     # Check each emotion category
-    for emotion, keywords in emotions.items():
-        if any(keyword in text for keyword in keywords):
+    for emotion in EMOTION_KEYWORDS:
+        if f"emotion:{emotion}" in found:
             return emotion
     
     return "neutral"
\ No newline at end of file
@@ -0,0 +1,202 @@
+"""
+Emotion ONNX module for EFT Chatbot
+Runs the emotion model as an int8-quantised ONNX graph on onnxruntime, without torch
+"""
+
+import os
+import hashlib
+import numpy as np
+
+# Where the exported model, tokenizer and config live
+EMOTION_ONNX_DIR = os.getenv("EFT_EMOTION_ONNX_DIR", os.path.join(os.path.expanduser("~"), "eft_emotion_onnx"))
+ONNX_FP32_FILE = "model.onnx"
+ONNX_INT8_FILE = "model.int8.onnx"
+
+# Threads per inference; 0 lets onnxruntime use one per physical core
+ONNX_INTRA_OP_THREADS = int(os.getenv("EFT_ONNX_INTRA_OP_THREADS", "0"))
+
+# Same limit the transformers pipeline truncates to for DistilBERT
+MAX_SEQUENCE_LENGTH = 512
+
+# Labels must agree with the PyTorch backend on at least this share of the parity corpus
+PARITY_THRESHOLD = 0.95
+
+PARITY_TEXTS = [
+    "I've been feeling really anxious about work lately",
+    "My chest feels tight whenever I think about the presentation",
+    "I'm so angry at my brother for what he said",
+    "I feel sad and I don't really know why",
+    "Honestly I'm a bit better after that round",
+    "I keep worrying that I'll lose my job",
+    "I miss my mum so much since she passed",
+    "Everything feels like too much at the moment and I can't switch off at night",
+    "I'm frustrated that nothing seems to help",
+    "That was surprising, I didn't expect to feel lighter",
+    "I'm scared of flying and I have a trip next week",
+    "I feel calm now, thank you",
+    "My partner and I argued again this morning and I'm still shaking",
+    "I don't know, just tired and low",
+    "I'm grateful for this, it really helped",
+    "I love how peaceful I feel after tapping",
+    "Why does this keep happening to me, it's not fair",
+    "I'm terrified something bad will happen to my kids",
+    "I was shocked when they told me",
+    "I'm happy, the interview went well",
+]
+
+def export_onnx_model(model_name, output_dir=EMOTION_ONNX_DIR):
+    """
+    Export the transformers model to ONNX and quantise its weights to int8
+
+    Needs torch and transformers; the app itself only needs onnxruntime and
+    the tokenizer afterwards.
+
+    Args:
+        model_name: Hugging Face model to export
+        output_dir: Directory for the ONNX files, tokenizer and config
+
+    Returns:
+        Path of the quantised model
+    """
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    try:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+    except ImportError as e:
+        raise ImportError(
+            f"Exporting the ONNX emotion model needs onnxruntime and onnx ({e}); "
+            "install them with: pip install -r requirements-onnx.txt"
+        ) from e
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model.eval()
+
+    sample = tokenizer(["An example sentence for tracing"], return_tensors="pt")
+    fp32_path = os.path.join(output_dir, ONNX_FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"}
+            },
+            opset_version=14
+        )
+
+    int8_path = os.path.join(output_dir, ONNX_INT8_FILE)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(output_dir)
+    model.config.save_pretrained(output_dir)
+    print(f"Exported {model_name} to {int8_path}")
+    return int8_path
+
+def _file_digest(path):
+    """Short content hash of a model file, used as its version"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+class OnnxEmotionClassifier:
+    """
+    Drop-in replacement for the transformers text-classification pipeline (top_k=1)
+
+    Called with a string or a list of strings, it returns one [{"label", "score"}]
+    list per text, the same shape EmotionAnalyzer reads from the pipeline.
+    """
+
+    def __init__(self, model_dir=EMOTION_ONNX_DIR, intra_op_threads=None, quantized=True):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError(
+                "EFT_EMOTION_BACKEND=onnx needs onnxruntime, which is not installed; "
+                "install it with: pip install -r requirements-onnx.txt"
+            ) from e
+        from transformers import AutoConfig, AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        config = AutoConfig.from_pretrained(model_dir)
+        self.labels = [config.id2label[i] for i in range(len(config.id2label))]
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = ONNX_INTRA_OP_THREADS if intra_op_threads is None else intra_op_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        model_path = os.path.join(model_dir, ONNX_INT8_FILE if quantized else ONNX_FP32_FILE)
+        self.version = _file_digest(model_path)
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    def __call__(self, texts, batch_size=None, truncation=True, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        batch_size = batch_size or len(texts)
+
+        results = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=truncation,
+                max_length=MAX_SEQUENCE_LENGTH,
+                return_tensors="np"
+            )
+            feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            logits = self.session.run(None, feeds)[0]
+
+            # Softmax, shifted for numerical stability
+            exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+            probabilities = exp / exp.sum(axis=1, keepdims=True)
+            for row in probabilities:
+                best = int(row.argmax())
+                results.append([{"label": self.labels[best], "score": float(row[best])}])
+        return results
+
+def check_parity(reference, candidate, texts=PARITY_TEXTS):
+    """
+    Compare two classifiers' labels on the same texts
+
+    Args:
+        reference: Classifier whose labels are taken as correct (the PyTorch pipeline)
+        candidate: Classifier being checked
+        texts: Corpus to compare on
+
+    Returns:
+        (share of texts with the same label, list of (text, reference label, candidate label) mismatches)
+    """
+    expected = [result[0]["label"] for result in reference(list(texts), batch_size=len(texts), truncation=True)]
+    actual = [result[0]["label"] for result in candidate(list(texts), batch_size=len(texts), truncation=True)]
+    mismatches = [(text, want, got) for text, want, got in zip(texts, expected, actual) if want != got]
+    return 1.0 - len(mismatches) / len(texts), mismatches
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+    from modules.emotion_analysis import EMOTION_MODEL_NAME
+
+    parser = argparse.ArgumentParser(description="Export and check the ONNX emotion model")
+    parser.add_argument("--output-dir", default=EMOTION_ONNX_DIR)
+    parser.add_argument("--skip-export", action="store_true", help="Only run the parity check")
+    args = parser.parse_args()
+
+    if not args.skip_export:
+        export_onnx_model(EMOTION_MODEL_NAME, args.output_dir)
+
+    from transformers import pipeline
+    agreement, mismatches = check_parity(
+        pipeline("text-classification", model=EMOTION_MODEL_NAME, top_k=1),
+        OnnxEmotionClassifier(args.output_dir)
+    )
+    for text, want, got in mismatches:
+        print(f"  mismatch: {text!r}: torch {want}, onnx {got}")
+    print(f"Label agreement with the PyTorch backend: {agreement:.1%}")
+    sys.exit(0 if agreement >= PARITY_THRESHOLD else 1)
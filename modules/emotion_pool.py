@@ -0,0 +1,361 @@
+"""
+Emotion Pool module for EFT Chatbot
+Runs emotion inference in worker processes that share one copy of the model
+"""
+
+import os
+import gc
+import sys
+import atexit
+import socket
+import itertools
+import threading
+import subprocess
+import multiprocessing
+from multiprocessing.connection import Listener, Client, wait
+from concurrent.futures import Future
+from modules.emotion_analysis import EmotionAnalyzer, EMOTION_BACKEND, EMOTION_BATCH_SIZE, detect_emotion_keywords
+
+# Worker processes for emotion inference; 0 runs it in the app process instead
+EMOTION_WORKERS = int(os.getenv("EFT_EMOTION_WORKERS", "0"))
+
+# Longest a caller waits for the pool before tagging with keywords
+EMOTION_POOL_TIMEOUT = float(os.getenv("EFT_EMOTION_POOL_TIMEOUT", "2"))
+
+_AUTHKEY_ENV = "EFT_EMOTION_POOL_AUTHKEY"
+_PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded once in the pool process before the workers fork, so they share its pages
+_analyzer = None
+
+class EmotionWorkerPool:
+    """
+    Client for the emotion inference pool
+
+    The pool is a separate process (python -m modules.emotion_pool) that
+    loads the model once and forks the workers from there, so the weights
+    are shared copy-on-write rather than loaded per process. It talks to
+    the app over an authenticated Unix socket. Tokenisation and inference
+    run in the workers, outside the app's GIL. Offers the same
+    is_initialized / detect_emotion / detect_emotions / analyze_with_details /
+    cache_stats interface as EmotionAnalyzer. Requests that time out, or
+    arrive before the pool is ready, are tagged with keywords.
+    """
+
+    def __init__(self, workers=None, backend=None, timeout=None):
+        self.workers = workers or EMOTION_WORKERS or 1
+        self.backend = backend or EMOTION_BACKEND
+        self.timeout = EMOTION_POOL_TIMEOUT if timeout is None else timeout
+        self.is_initialized = False
+        self.load_failed = False
+        self.process = None
+        self.server_pid = None
+        self.worker_pids = []
+        self.requests = 0
+        self.fallbacks = 0
+        self._worker_cache_stats = {}  # worker pid -> its result cache counters, as of its last reply
+        self._conn = None
+        self._ids = itertools.count()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._closing = False
+
+    def start_background_load(self):
+        """Start the pool process; returns the thread that talks to it"""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="emotion-pool-client", daemon=True)
+                self._thread.start()
+            return self._thread
+
+    def wait_until_ready(self, timeout=None):
+        """Block until the pool is ready or has failed; returns whether it is ready"""
+        self._ready.wait(timeout)
+        return self.is_initialized
+
+    def _run(self):
+        authkey = os.urandom(16)
+        try:
+            with Listener(family="AF_UNIX", authkey=authkey) as listener:
+                self.process = subprocess.Popen(
+                    [sys.executable, "-m", "modules.emotion_pool", "--address", listener.address,
+                     "--workers", str(self.workers), "--backend", self.backend],
+                    cwd=_PACKAGE_ROOT,
+                    env=dict(os.environ, **{_AUTHKEY_ENV: authkey.hex()})
+                )
+                self._conn = listener.accept()
+        except Exception as e:
+            print(f"Error starting emotion worker pool: {e}")
+            self._fail()
+            return
+
+        while True:
+            try:
+                kind, request_id, payload = self._conn.recv()
+            except (EOFError, OSError):
+                if not self._closing:
+                    print("Emotion worker pool disconnected, using keyword fallback")
+                self._fail()
+                return
+
+            if kind == "result":
+                result, worker_pid, cache_stats = payload
+                with self._pending_lock:
+                    future = self._pending.pop(request_id, None)
+                    self._worker_cache_stats[worker_pid] = cache_stats
+                if future is not None:
+                    future.set_result(result)
+            elif kind == "ready":
+                self.server_pid, self.worker_pids = payload
+                self.is_initialized = True
+                self._ready.set()
+                print(f"Emotion worker pool ready with {len(self.worker_pids)} workers")
+            elif kind == "failed":
+                print(f"Emotion worker pool failed to start: {payload}")
+                self._fail()
+                return
+
+    def _fail(self):
+        self.is_initialized = False
+        self.load_failed = True
+        self._ready.set()
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(ConnectionError("Emotion worker pool is not running"))
+
+    def _send(self, kind, payload):
+        request_id = next(self._ids)
+        future = Future()
+        if not self.is_initialized:
+            future.set_exception(ConnectionError("Emotion worker pool is not running"))
+            return request_id, future
+        with self._pending_lock:
+            self._pending[request_id] = future
+        try:
+            with self._send_lock:
+                self._conn.send((kind, request_id, payload))
+        except Exception as e:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            future.set_exception(e)
+        return request_id, future
+
+    def detect_emotions(self, texts, timeout=None):
+        """
+        Detect the emotion in several texts in the pool
+
+        Args:
+            texts: List of texts to analyze
+            timeout: Seconds to wait (EFT_EMOTION_POOL_TIMEOUT by default)
+
+        Returns:
+            List of emotion strings, from keywords if the pool didn't answer in time
+        """
+        if not texts:
+            return []
+        result = self._request("detect", list(texts), timeout)
+        if result is None:
+            return [detect_emotion_keywords(text or "") for text in texts]
+        return result
+
+    def detect_emotion(self, text, timeout=None):
+        """Detect the emotion in one text in the pool (keywords if it doesn't answer in time)"""
+        return self.detect_emotions([text], timeout)[0]
+
+    def analyze_with_details(self, text, timeout=None):
+        """
+        Analyze text in the pool and return detailed emotion information
+
+        Args:
+            text: The text to analyze
+            timeout: Seconds to wait (EFT_EMOTION_POOL_TIMEOUT by default)
+
+        Returns:
+            Dictionary with emotion, confidence and the model's original label,
+            as EmotionAnalyzer.analyze_with_details returns; from keywords, with
+            no original label, if the pool didn't answer in time
+        """
+        result = self._request("details", text, timeout)
+        if result is None:
+            return {"emotion": detect_emotion_keywords(text or ""), "confidence": 1.0, "original": None}
+        return result
+
+    def cache_stats(self):
+        """
+        Hit rate and size of the workers' result caches, summed over the workers
+
+        Each worker has its own copy of the cache after the fork and reports its
+        counters with every reply, so these are as of each worker's last reply.
+        """
+        with self._pending_lock:
+            reports = [stats for stats in self._worker_cache_stats.values() if stats]
+        if not reports:
+            return {}
+        totals = {key: sum(stats[key] for stats in reports)
+                  for key in ("entries", "hits", "misses", "evictions", "invalidations")}
+        lookups = totals["hits"] + totals["misses"]
+        totals["hit_rate"] = totals["hits"] / lookups if lookups else 0.0
+        return totals
+
+    def _request(self, kind, payload, timeout):
+        """Send one request and wait for its result; None if the pool didn't answer in time"""
+        self.requests += 1
+        request_id, future = self._send(kind, payload)
+        try:
+            return future.result(self.timeout if timeout is None else timeout)
+        except Exception as e:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            self.fallbacks += 1
+            if self.is_initialized:
+                print(f"Emotion pool did not answer, using keywords: {str(e) or type(e).__name__}")
+            return None
+
+    def stats(self):
+        """Pool state and how often callers fell back to keywords"""
+        with self._pending_lock:
+            in_flight = len(self._pending)
+        return {
+            "ready": self.is_initialized,
+            "workers": len(self.worker_pids),
+            "requests": self.requests,
+            "fallbacks": self.fallbacks,
+            "in_flight": in_flight
+        }
+
+    def close(self):
+        """Stop the pool; its workers exit once the connection closes"""
+        self._closing = True
+        self.is_initialized = False
+        if self._conn is not None:
+            # Shut the socket down rather than just closing it: the client
+            # thread is blocked reading it, which would keep it open
+            sock = socket.socket(fileno=os.dup(self._conn.fileno()))
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+            self._conn.close()
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+def _worker_main(conn, read_lock, write_lock, save_lock, batch_size):
+    """
+    Serve requests from the shared connection, batching whatever is already waiting
+
+    Once the app has gone away, add this worker's cached results to the saved cache.
+    """
+    while True:
+        # Wait outside the lock, so a worker killed while idle can't leave it held
+        conn.poll(None)
+        with read_lock:
+            if not conn.poll(0):
+                # Another worker took it
+                continue
+            try:
+                requests = [conn.recv()]
+                while len(requests) < batch_size and conn.poll(0):
+                    requests.append(conn.recv())
+            except EOFError:
+                requests = None
+
+        if requests is None:
+            # Only this worker's copy of the cache saw its results; merge so workers don't overwrite each other
+            with save_lock:
+                _analyzer.save_cache(merge=True)
+            return
+
+        # Detections share one batch; detail requests are rare and run one at a time
+        detects = [request for request in requests if request[0] == "detect"]
+        texts = [text for _, _, request_texts in detects for text in request_texts]
+        emotions = _analyzer.detect_emotions(texts, batch_size=EMOTION_BATCH_SIZE) if texts else []
+
+        results = []
+        start = 0
+        for kind, request_id, payload in requests:
+            if kind == "detect":
+                results.append((request_id, emotions[start:start + len(payload)]))
+                start += len(payload)
+            else:
+                results.append((request_id, _analyzer.analyze_with_details(payload)))
+
+        cache_stats = _analyzer.cache_stats()
+        with write_lock:
+            for request_id, result in results:
+                conn.send(("result", request_id, (result, os.getpid(), cache_stats)))
+
+def serve(address, workers, backend):
+    """
+    Run the pool: load the model, fork the workers and restart any that crash
+
+    Exits once the app closes the connection and every worker has stopped.
+    """
+    global _analyzer
+    authkey = bytes.fromhex(os.environ.pop(_AUTHKEY_ENV))
+    conn = Client(address, family="AF_UNIX", authkey=authkey)
+
+    # Each worker gets one core's worth of threads; the pool scales by process
+    if backend == "onnx":
+        from modules import emotion_onnx
+        emotion_onnx.ONNX_INTRA_OP_THREADS = 1
+    else:
+        try:
+            import torch
+            torch.set_num_threads(1)
+        except ImportError:
+            pass
+
+    analyzer = EmotionAnalyzer(backend)
+    if not analyzer.load():
+        conn.send(("failed", None, "emotion model did not load"))
+        return
+    _analyzer = analyzer
+    # The workers save the cache as they stop; this process's copy stops changing at the fork
+    atexit.unregister(analyzer.save_cache)
+
+    # Keep the collector from writing to (and so copying) the model's objects in every worker
+    gc.freeze()
+
+    context = multiprocessing.get_context("fork")
+    read_lock, write_lock, save_lock = context.Lock(), context.Lock(), context.Lock()
+
+    def start_worker():
+        process = context.Process(target=_worker_main, args=(conn, read_lock, write_lock, save_lock, EMOTION_BATCH_SIZE),
+                                  name="emotion-worker", daemon=True)
+        process.start()
+        return process
+
+    processes = [start_worker() for _ in range(workers)]
+    with write_lock:
+        conn.send(("ready", None, (os.getpid(), [process.pid for process in processes])))
+
+    while processes:
+        wait([process.sentinel for process in processes])
+        for process in list(processes):
+            if process.exitcode is None:
+                continue
+            processes.remove(process)
+            if process.exitcode != 0:
+                print(f"Emotion worker {process.pid} exited with code {process.exitcode}, restarting")
+                processes.append(start_worker())
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Emotion inference worker pool (started by the app)")
+    parser.add_argument("--address", required=True, help="Unix socket the app is listening on")
+    parser.add_argument("--workers", type=int, default=max(1, EMOTION_WORKERS))
+    parser.add_argument("--backend", default=EMOTION_BACKEND)
+    args = parser.parse_args()
+
+    serve(args.address, args.workers, args.backend)
@@ -0,0 +1,196 @@
+"""
+Emotion Tagger module for EFT Chatbot
+Classifies stored user messages in the background and fills in their emotion
+"""
+
+import os
+import time
+import queue
+import threading
+from modules.database import EMOTION_PENDING, apply_emotion_tags, get_pending_emotion_messages
+
+# "deferred" stores user messages untagged and classifies them in the background;
+# "inline" classifies them on the request path before they are stored
+EMOTION_TAGGING = os.getenv("EFT_EMOTION_TAGGING", "deferred")
+EMOTION_TAGGER_BATCH_SIZE = int(os.getenv("EFT_EMOTION_TAGGER_BATCH_SIZE", "32"))
+EMOTION_TAGGER_INTERVAL = float(os.getenv("EFT_EMOTION_TAGGER_INTERVAL", "0.2"))  # seconds
+
+# Longest the tagger holds messages back while the model loads before tagging them with keywords
+EMOTION_TAGGER_MODEL_WAIT = float(os.getenv("EFT_EMOTION_TAGGER_MODEL_WAIT", "120"))
+
+# Pending messages picked up from the database at startup (left behind by a crash)
+EMOTION_TAGGER_RECOVERY_LIMIT = 10000
+
+class EmotionTagger:
+    """
+    Background thread that tags messages stored with EMOTION_PENDING
+
+    Rows reach it from the message journal once they are committed, so an
+    update never races the insert. Rows that fail to tag keep their pending
+    flag in the database and are picked up again at the next start.
+    """
+
+    def __init__(self, detect, ready=None, batch_size=EMOTION_TAGGER_BATCH_SIZE,
+                 interval=EMOTION_TAGGER_INTERVAL, model_wait=EMOTION_TAGGER_MODEL_WAIT):
+        """
+        Args:
+            detect: Function mapping a list of texts to a list of emotion labels
+            ready: Function returning True once detect uses the model (or the model has failed)
+            batch_size: Most messages classified together
+            interval: Longest a message waits for others to share its batch
+            model_wait: Longest to hold messages back while the model loads
+        """
+        self.detect = detect
+        self.ready = ready
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self.model_wait = model_wait
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+        self.batches = 0
+        self.tagged = 0
+        self.failures = 0
+
+    def start(self, recover=True):
+        """Start the background thread, first queueing any messages left pending in the database"""
+        if self._thread is not None:
+            return
+
+        if recover:
+            leftover = get_pending_emotion_messages(EMOTION_TAGGER_RECOVERY_LIMIT)
+            if leftover:
+                print(f"Emotion tagger recovering {len(leftover)} untagged messages")
+            self.submit(leftover)
+
+        self._thread = threading.Thread(target=self._run, name="emotion-tagger", daemon=True)
+        self._thread.start()
+
+    def submit(self, messages):
+        """
+        Queue stored messages for tagging
+
+        Args:
+            messages: List of (message_id, session_id, content), ids in their stored form
+        """
+        queued_at = time.monotonic()
+        for message_id, session_id, content in messages:
+            self._queue.put((message_id, session_id, content, queued_at))
+
+    def submit_rows(self, rows):
+        """Message journal listener: queue the committed rows that are waiting for an emotion"""
+        self.submit([
+            (message_id, session_id, content)
+            for message_id, session_id, timestamp, sender, content, emotion in rows
+            if emotion == EMOTION_PENDING
+        ])
+
+    def backlog(self):
+        """Number of messages queued or being tagged"""
+        return self._queue.unfinished_tasks
+
+    def stats(self):
+        """Backlog, how long its oldest message has waited, and totals so far"""
+        with self._queue.mutex:
+            oldest = self._queue.queue[0][3] if self._queue.queue else None
+        return {
+            "backlog": self.backlog(),
+            "oldest_seconds": time.monotonic() - oldest if oldest is not None else 0.0,
+            "batches": self.batches,
+            "tagged": self.tagged,
+            "failures": self.failures
+        }
+
+    def drain(self, timeout=None):
+        """
+        Block until every queued message has been tagged
+
+        Returns:
+            True if the backlog cleared before the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def close(self):
+        """Stop the background thread once the backlog is tagged"""
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+        # Anything submitted while the thread was stopping
+        while not self._queue.empty():
+            self._tag_batch(self._take(self.batch_size))
+
+    def _take(self, limit):
+        """Take up to limit messages off the queue without waiting"""
+        items = []
+        while len(items) < limit:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _wait_for_model(self):
+        """Hold the first batch back until the model is ready, so it isn't tagged with keywords"""
+        if self.ready is None:
+            return
+        deadline = time.monotonic() + self.model_wait
+        while not self.ready() and time.monotonic() < deadline:
+            # Stopping drains straight away with whatever detect has
+            if self._stop.wait(0.1):
+                return
+        self.ready = None
+
+    def _tag_batch(self, items):
+        """Classify a batch and write the emotions back"""
+        if not items:
+            return
+
+        try:
+            emotions = self.detect([content or "" for _, _, content, _ in items])
+            tags = [(message_id, session_id, emotion)
+                    for (message_id, session_id, _, _), emotion in zip(items, emotions)]
+            updated = apply_emotion_tags(tags)
+            if updated is None:
+                self.failures += len(items)
+            else:
+                self.tagged += updated
+            self.batches += 1
+        except Exception as e:
+            # The rows stay pending in the database and are retried at the next start
+            print(f"Error tagging message emotions: {e}")
+            self.failures += len(items)
+        finally:
+            for _ in items:
+                self._queue.task_done()
+
+    def _run(self):
+        """Background loop: wait for a message, gather a batch, tag it"""
+        while not self._stop.is_set() or not self._queue.empty():
+            try:
+                first = self._queue.get(timeout=self.interval)
+            except queue.Empty:
+                continue
+
+            self._wait_for_model()
+            items = [first]
+            deadline = time.monotonic() + self.interval
+            while len(items) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop.is_set():
+                    items.extend(self._take(self.batch_size - len(items)))
+                    break
+                try:
+                    items.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._tag_batch(items)
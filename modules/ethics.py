@@ -1,4 +1,6 @@
 # modules/ethics.py
+from modules.keyword_matcher import register_keywords, scan_keywords
+
 class EthicsGuide:
     def __init__(self):
         self.high_risk_topics = [
@@ -8,13 +10,15 @@ class EthicsGuide:
             "manipulative techniques",
             "exploitation",
         ]
+        for topic in self.high_risk_topics:
+            register_keywords(f"ethics:{topic}", [topic])
     
     def check_content(self, message):
         """Check content against ethical guidelines"""
-        message_lower = message.lower()
+        found = scan_keywords(message)
         
         for topic in self.high_risk_topics:
-            if topic in message_lower:
+            if f"ethics:{topic}" in found:
                 return False, f"Content related to {topic} is not supported for ethical reasons."
         
         return True, ""
@@ -0,0 +1,70 @@
+"""
+Identifier helpers for EFT Chatbot
+Time-ordered UUIDv7 identifiers stored as compact 16-byte BLOBs
+"""
+
+import os
+import time
+import uuid
+import threading
+
+# Namespace for mapping legacy ids that are not valid UUIDs
+LEGACY_ID_NAMESPACE = uuid.UUID("6f1c0f5e-2d1b-4c1a-9a55-3f1e8b7d2c40")
+
+_lock = threading.Lock()
+_last_ms = 0
+_sequence = 0
+
+def new_id():
+    """
+    Generate a UUIDv7 as 16 bytes
+
+    The first 48 bits are the Unix time in milliseconds and the next 12 bits a
+    counter within that millisecond, so ids generated by one process sort in
+    creation order and new rows are appended to the end of the B-tree.
+    """
+    global _last_ms, _sequence
+
+    now_ms = time.time_ns() // 1_000_000
+    with _lock:
+        if now_ms <= _last_ms:
+            now_ms = _last_ms
+            _sequence += 1
+            if _sequence > 0xFFF:
+                # Counter exhausted - borrow the next millisecond
+                now_ms += 1
+                _sequence = 0
+        else:
+            _sequence = 0
+        _last_ms = now_ms
+        sequence = _sequence
+
+    random_bits = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (now_ms << 80) | (0x7 << 76) | (sequence << 64) | (0b10 << 62) | random_bits
+    return value.to_bytes(16, "big")
+
+def id_to_bytes(value):
+    """
+    Convert an id to its 16-byte stored form
+
+    Accepts the stored bytes, a UUID string, or a legacy non-UUID string (which
+    is mapped deterministically with uuid5).
+    """
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value)
+    if isinstance(value, uuid.UUID):
+        return value.bytes
+    try:
+        return uuid.UUID(str(value)).bytes
+    except ValueError:
+        return uuid.uuid5(LEGACY_ID_NAMESPACE, str(value)).bytes
+
+def id_to_str(value):
+    """Convert a stored 16-byte id to its canonical UUID string"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    return str(uuid.UUID(bytes=bytes(value)))
@@ -0,0 +1,169 @@
+"""
+Keyword Matcher module for EFT Chatbot
+Finds every keyword category in a message with one pass of a compiled, whole-word regex
+"""
+
+import re
+import threading
+
+# Apostrophes are dropped ("don't" matches "dont") and hyphens read as spaces ("self-harm")
+_NORMALISE_TABLE = str.maketrans({"'": None, "’": None, "-": " "})
+
+# Recent texts and their categories, so the detectors run on one message share a single scan
+SCAN_CACHE_SIZE = 256
+
+# Trailing marker for a phrase that matches any word ending ("stress*" matches "stressed")
+STEM_MARKER = "*"
+
+_END = ""
+
+def normalise_keyword_text(text):
+    """Lower-case text, drop apostrophes and collapse hyphens and whitespace to single spaces"""
+    return " ".join(text.lower().translate(_NORMALISE_TABLE).split())
+
+def _prepare_text(text):
+    """Lower-case text and drop any apostrophes; the pattern itself allows any spacing or hyphens"""
+    text = text.lower()
+    if "'" in text or "’" in text:
+        text = text.replace("'", "").replace("’", "")
+    return text
+
+def _trie_pattern(node):
+    """Regex for a character trie, sharing prefixes so each position is tried against one branch per first letter"""
+    branches = [(r"[\s-]+" if char == " " else re.escape(char)) + _trie_pattern(child)
+                for char, child in sorted(node.items()) if char != _END]
+    end = node.get(_END)
+    if end == STEM_MARKER:
+        # Any word beginning with the stem, after any longer phrase that continues it
+        branches.append(r"\w*")
+        return "(?:" + "|".join(branches) + ")"
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    # Prefer the longer phrase, falling back to the one ending here
+    return f"(?:{body})?" if end else body
+
+def _with_contained(phrase, categories, exact, stems):
+    """Categories of phrase plus those of every other phrase found inside it"""
+    categories = set(categories)
+    for others, ending in ((exact, ""), (stems, r"\w*")):
+        for other, other_categories in others.items():
+            if other != phrase and re.search(r"(?<!\w)" + re.escape(other) + ending + r"(?!\w)", phrase):
+                categories |= other_categories
+    return frozenset(categories)
+
+class KeywordMatcher:
+    """
+    Matches the phrases of many categories at once, as whole words
+
+    Case, apostrophes and runs of whitespace or hyphens are ignored. A phrase
+    may belong to several categories. When a longer phrase matches, the
+    categories of any shorter phrase inside it count as matched too ("let's
+    tap" also hits the categories of "tap"). Results for recent texts are
+    kept, so several detectors asking about the same message cost one scan.
+    """
+
+    def __init__(self, keywords):
+        """
+        Args:
+            keywords: Dict of category -> list of phrases; a phrase ending in
+                STEM_MARKER matches any word that starts with it
+        """
+        self._exact = {}
+        self._stems = {}
+        for category, phrases in keywords.items():
+            for phrase in phrases:
+                stem = phrase.endswith(STEM_MARKER)
+                phrase = normalise_keyword_text(phrase.rstrip(STEM_MARKER))
+                if phrase:
+                    (self._stems if stem else self._exact).setdefault(phrase, set()).add(category)
+
+        trie = {}
+        for phrase, marker in [(p, True) for p in self._exact] + [(p, STEM_MARKER) for p in self._stems]:
+            node = trie
+            for char in phrase:
+                node = node.setdefault(char, {})
+            if node.get(_END) != STEM_MARKER:
+                node[_END] = marker
+        self.pattern = re.compile(r"(?<!\w)" + _trie_pattern(trie) + r"(?!\w)") if trie else None
+
+        # Longest stem first, so a match is credited to the most specific one
+        self._stem_order = sorted(self._stems, key=len, reverse=True)
+        exact, stems = self._exact, self._stems
+        self._exact = {phrase: _with_contained(phrase, categories, exact, stems)
+                       for phrase, categories in exact.items()}
+        self._stems = {stem: _with_contained(stem, categories, exact, stems)
+                       for stem, categories in stems.items()}
+        self._recent = {}
+
+    def _categories_for(self, matched):
+        categories = self._exact.get(matched)
+        if categories is not None:
+            return categories
+        if not matched.isalnum():
+            # Spread over a line break, extra spaces or a hyphen
+            matched = normalise_keyword_text(matched)
+            categories = self._exact.get(matched)
+            if categories is not None:
+                return categories
+        for stem in self._stem_order:
+            if matched.startswith(stem):
+                return self._stems[stem]
+        return frozenset()
+
+    def scan(self, text):
+        """
+        Find every category with a phrase in text
+
+        Args:
+            text: Text to search
+
+        Returns:
+            Frozen set of matched category names
+        """
+        if not text or self.pattern is None:
+            return frozenset()
+        found = self._recent.get(text)
+        if found is not None:
+            return found
+
+        found = set()
+        for match in self.pattern.finditer(_prepare_text(text)):
+            found |= self._categories_for(match.group())
+        found = frozenset(found)
+
+        if len(self._recent) >= SCAN_CACHE_SIZE:
+            self._recent.clear()
+        self._recent[text] = found
+        return found
+
+_keyword_lists = {}
+_matcher = None
+_matcher_lock = threading.Lock()
+
+def register_keywords(category, phrases):
+    """
+    Add phrases to a category of the shared matcher
+
+    Modules register their lists at import; the matcher is compiled once, on
+    first use, from everything registered by then (and again if more arrive).
+    """
+    global _matcher
+    with _matcher_lock:
+        known = _keyword_lists.setdefault(category, [])
+        for phrase in phrases:
+            if phrase not in known:
+                known.append(phrase)
+                _matcher = None
+
+def get_keyword_matcher():
+    """Get the matcher compiled from every registered keyword list"""
+    global _matcher
+    with _matcher_lock:
+        if _matcher is None:
+            _matcher = KeywordMatcher(_keyword_lists)
+        return _matcher
+
+def scan_keywords(text):
+    """Every registered keyword category with a phrase in text, found in one pass"""
+    return get_keyword_matcher().scan(text)
@@ -0,0 +1,210 @@
+"""
+Message Journal module for EFT Chatbot
+Write-behind queue that stores chat messages off the request thread
+"""
+
+import os
+import time
+import queue
+import atexit
+import threading
+from modules.database import build_message_row, store_messages
+from modules.ids import id_to_str
+
+# Durability modes: "sync" writes on the caller's thread, "batched" uses the background writer
+MESSAGE_DURABILITY = os.getenv("EFT_MESSAGE_DURABILITY", "batched")
+JOURNAL_BATCH_SIZE = int(os.getenv("EFT_JOURNAL_BATCH_SIZE", "64"))
+JOURNAL_FLUSH_INTERVAL = float(os.getenv("EFT_JOURNAL_FLUSH_INTERVAL", "0.05"))  # seconds
+JOURNAL_QUEUE_SIZE = int(os.getenv("EFT_JOURNAL_QUEUE_SIZE", "10000"))
+
+class MessageJournal:
+    """Accepts messages into a bounded queue and group-commits them in batches"""
+
+    def __init__(self, mode=MESSAGE_DURABILITY, batch_size=JOURNAL_BATCH_SIZE,
+                 flush_interval=JOURNAL_FLUSH_INTERVAL, max_queue=JOURNAL_QUEUE_SIZE):
+        if mode not in ("sync", "batched"):
+            raise ValueError(f"Unknown message durability mode: {mode}")
+
+        self.mode = mode
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._listeners = []
+        self.batches_written = 0
+        self.messages_written = 0
+        self.dropped = 0
+
+    def start(self):
+        """Start the background writer (no-op in sync mode)"""
+        if self.mode != "batched" or self._thread is not None:
+            return
+
+        self._thread = threading.Thread(target=self._run, name="message-journal", daemon=True)
+        self._thread.start()
+
+    def add_listener(self, callback):
+        """
+        Call callback(rows) with every batch of rows once it is committed
+
+        Callbacks run on the writing thread, so they should only hand the rows off.
+        """
+        self._listeners.append(callback)
+
+    def _store(self, rows):
+        """Write rows and pass them on to the listeners; returns whether they were committed"""
+        if not store_messages(rows):
+            return False
+        for callback in self._listeners:
+            try:
+                callback(rows)
+            except Exception as e:
+                print(f"Error in message journal listener: {e}")
+        return True
+
+    def submit(self, session_id, sender, content, emotion=None):
+        """
+        Queue a message for storage
+
+        Args:
+            session_id: Session the message belongs to
+            sender: 'user' or 'assistant'
+            content: Message content
+            emotion: Detected emotion, if any, or EMOTION_PENDING to have it tagged later
+
+        Returns:
+            The id assigned to the message
+        """
+        row = build_message_row(session_id, sender, content, emotion)
+
+        if self.mode == "sync" or self._thread is None or self._stop.is_set():
+            self._store([row])
+            return row[0]
+
+        try:
+            self._queue.put(row, timeout=1.0)
+        except queue.Full:
+            # Writer is falling behind; apply backpressure by writing inline
+            print("Warning: message journal queue full, writing synchronously")
+            self._store([row])
+
+        return row[0]
+
+    def pending(self):
+        """Number of messages waiting to be written"""
+        return self._queue.qsize()
+
+    def stats(self):
+        """Queue depth and totals so far, including messages that could not be stored"""
+        return {
+            "pending": self.pending(),
+            "batches_written": self.batches_written,
+            "messages_written": self.messages_written,
+            "dropped": self.dropped
+        }
+
+    def flush(self, timeout=None):
+        """
+        Block until every queued message has been written
+
+        Returns:
+            True if the queue drained before the timeout
+        """
+        if self._thread is None:
+            return True
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def close(self):
+        """Stop accepting batched writes and drain the queue"""
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+        # Anything submitted while the writer was stopping
+        self._write_batch(self._drain(self.batch_size * 1000))
+
+    def _drain(self, limit):
+        """Take up to limit rows off the queue without waiting"""
+        rows = []
+        while len(rows) < limit:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _write_batch(self, rows):
+        """Commit a batch, falling back to row-by-row writes if the batch fails"""
+        if not rows:
+            return
+
+        written = len(rows)
+        if not self._store(rows):
+            for row in rows:
+                if not self._store([row]):
+                    # The message is lost; say which one so it can be recovered from the logs
+                    message_id, session_id, timestamp, sender = row[:4]
+                    print(f"Error: message journal dropped {sender} message {id_to_str(message_id)} "
+                          f"of session {id_to_str(session_id)} ({timestamp})")
+                    self.dropped += 1
+                    written -= 1
+
+        self.batches_written += 1
+        self.messages_written += written
+        for _ in rows:
+            self._queue.task_done()
+
+    def _run(self):
+        """Background loop: wait for a message, gather a batch, commit it"""
+        while not self._stop.is_set() or not self._queue.empty():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            rows = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(rows) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._write_batch(rows)
+
+_journal = None
+_journal_lock = threading.Lock()
+
+def get_message_journal():
+    """Get the shared message journal, starting it on first use"""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = MessageJournal()
+            _journal.start()
+            atexit.register(shutdown_message_journal)
+        return _journal
+
+def shutdown_message_journal():
+    """Flush pending messages to disk; registered to run at interpreter exit"""
+    global _journal
+    with _journal_lock:
+        if _journal is not None:
+            _journal.close()
+            stats = _journal.stats()
+            print(f"Message journal flushed ({stats['messages_written']} messages written, "
+                  f"{stats['dropped']} dropped)")
+            _journal = None
@@ -0,0 +1,273 @@
+"""
+Schema migrations for EFT Chatbot
+Numbered migrations tracked in a schema_version table and applied once at startup
+"""
+
+import datetime
+from modules.ids import id_to_bytes
+
+# Tables rebuilt by migration 5: (table, id columns converted to BLOB, new definition, indexes)
+BLOB_ID_TABLES = [
+    ("sessions", ["session_id"], '''
+        CREATE TABLE sessions (
+            session_id BLOB PRIMARY KEY,
+            user_id TEXT,
+            start_time TIMESTAMP,
+            end_time TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''', ["CREATE INDEX idx_sessions_user_start ON sessions (user_id, start_time)"]),
+    ("messages", ["message_id", "session_id"], '''
+        CREATE TABLE messages (
+            message_id BLOB PRIMARY KEY,
+            session_id BLOB,
+            timestamp TIMESTAMP,
+            sender TEXT,
+            content TEXT,
+            emotion TEXT,
+            FOREIGN KEY (session_id) REFERENCES sessions (session_id)
+        )
+    ''', ["CREATE INDEX idx_messages_session_time ON messages (session_id, timestamp, sender, emotion)"]),
+    ("tapping_steps", ["step_id", "session_id"], '''
+        CREATE TABLE tapping_steps (
+            step_id BLOB PRIMARY KEY,
+            session_id BLOB,
+            step_number INTEGER,
+            step_content TEXT,
+            completed BOOLEAN DEFAULT 0,
+            completed_at TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES sessions (session_id)
+        )
+    ''', ["CREATE INDEX idx_tapping_steps_session_step ON tapping_steps (session_id, step_number)"]),
+    ("assessments", ["assessment_id"], '''
+        CREATE TABLE assessments (
+            assessment_id BLOB PRIMARY KEY,
+            user_id TEXT,
+            completed_at TIMESTAMP,
+            gad7_score INTEGER,
+            phq9_score INTEGER,
+            is_high_risk BOOLEAN,
+            has_suicide_risk BOOLEAN,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''', ["CREATE INDEX idx_assessments_user_completed ON assessments (user_id, completed_at)"]),
+    ("consent", ["consent_id"], '''
+        CREATE TABLE consent (
+            consent_id BLOB PRIMARY KEY,
+            user_id TEXT,
+            consented_at TIMESTAMP,
+            consent_version TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''', ["CREATE INDEX idx_consent_user_version ON consent (user_id, consent_version)"]),
+    ("session_routes", ["session_id"], '''
+        CREATE TABLE session_routes (
+            session_id BLOB PRIMARY KEY,
+            user_id TEXT
+        )
+    ''', []),
+]
+
+def _convert_ids_to_blobs(conn):
+    """Rebuild tables so their uuid TEXT keys are stored as 16-byte BLOBs"""
+    conn.create_function("id_to_blob", 1, id_to_bytes, deterministic=True)
+
+    for table, id_columns, definition, indexes in BLOB_ID_TABLES:
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        select_list = ", ".join(
+            f"id_to_blob({column})" if column in id_columns else column
+            for column in columns
+        )
+
+        conn.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+        conn.execute(definition)
+        conn.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"SELECT {select_list} FROM {table}_old ORDER BY rowid"
+        )
+        conn.execute(f"DROP TABLE {table}_old")
+        for index in indexes:
+            conn.execute(index)
+
+# Each migration is (version, description, statements). Migrations are applied in
+# order and must never be edited once released - add a new one instead.
+MIGRATIONS = [
+    (1, "Base schema", [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            username TEXT UNIQUE,
+            password_hash TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS consent (
+            consent_id TEXT PRIMARY KEY,
+            user_id TEXT,
+            consented_at TIMESTAMP,
+            consent_version TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS assessments (
+            assessment_id TEXT PRIMARY KEY,
+            user_id TEXT,
+            completed_at TIMESTAMP,
+            gad7_score INTEGER,
+            phq9_score INTEGER,
+            is_high_risk BOOLEAN,
+            has_suicide_risk BOOLEAN,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            user_id TEXT,
+            start_time TIMESTAMP,
+            end_time TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS messages (
+            message_id TEXT PRIMARY KEY,
+            session_id TEXT,
+            timestamp TIMESTAMP,
+            sender TEXT,
+            content TEXT,
+            emotion TEXT,
+            FOREIGN KEY (session_id) REFERENCES sessions (session_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS tapping_steps (
+            step_id TEXT PRIMARY KEY,
+            session_id TEXT,
+            step_number INTEGER,
+            step_content TEXT,
+            completed BOOLEAN DEFAULT 0,
+            completed_at TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES sessions (session_id)
+        )
+        ''',
+    ]),
+    (2, "Secondary indexes for per-user and per-session lookups", [
+        # Covers session history reads and the recent-emotions query without touching the table
+        "CREATE INDEX IF NOT EXISTS idx_messages_session_time ON messages (session_id, timestamp, sender, emotion)",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_user_start ON sessions (user_id, start_time)",
+        "CREATE INDEX IF NOT EXISTS idx_assessments_user_completed ON assessments (user_id, completed_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tapping_steps_session_step ON tapping_steps (session_id, step_number)",
+        "CREATE INDEX IF NOT EXISTS idx_consent_user_version ON consent (user_id, consent_version)",
+    ]),
+    (3, "Per-user emotion summary", [
+        # recent_emotions is a JSON list (newest first), emotion_counts a JSON object
+        '''
+        CREATE TABLE IF NOT EXISTS user_emotion_summary (
+            user_id TEXT PRIMARY KEY,
+            recent_emotions TEXT,
+            emotion_counts TEXT,
+            last_updated TIMESTAMP
+        )
+        ''',
+    ]),
+    (4, "Session routing table for sharded storage", [
+        # Lives in the main database and maps each session to its owning user's shard
+        '''
+        CREATE TABLE IF NOT EXISTS session_routes (
+            session_id TEXT PRIMARY KEY,
+            user_id TEXT
+        )
+        ''',
+    ]),
+    (5, "Time-ordered 16-byte BLOB primary keys", [_convert_ids_to_blobs]),
+    (6, "Index of sessions moved to the archive tier", [
+        '''
+        CREATE TABLE IF NOT EXISTS archived_sessions (
+            session_id BLOB PRIMARY KEY,
+            user_id TEXT,
+            start_time TIMESTAMP,
+            end_time TIMESTAMP,
+            archive_file TEXT,
+            message_count INTEGER,
+            archived_at TIMESTAMP
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_archived_sessions_user ON archived_sessions (user_id, start_time)",
+    ]),
+    (7, "Flag messages whose emotion is tagged after they are stored", [
+        "ALTER TABLE messages ADD COLUMN emotion_pending INTEGER NOT NULL DEFAULT 0",
+        "CREATE INDEX IF NOT EXISTS idx_messages_emotion_pending ON messages (timestamp) WHERE emotion_pending = 1",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def ensure_version_table(conn):
+    """Create the schema_version table if it does not exist"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_at TIMESTAMP
+    )
+    ''')
+    conn.commit()
+
+def get_schema_version(conn):
+    """Return the highest applied migration version (0 for an empty database)"""
+    ensure_version_table(conn)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+def upgrade(conn, target=None):
+    """
+    Apply all pending migrations in order
+
+    Each migration runs in its own write transaction and re-checks the current
+    version under the lock, so concurrent processes can call this safely.
+
+    Args:
+        conn: Open SQLite connection
+        target: Stop after this version (defaults to the latest)
+
+    Returns:
+        List of versions that were applied
+    """
+    if target is None:
+        target = LATEST_VERSION
+
+    ensure_version_table(conn)
+    applied = []
+
+    for version, description, statements in MIGRATIONS:
+        if version > target:
+            break
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] or 0
+            if version <= current:
+                conn.rollback()
+                continue
+
+            print(f"Applying migration {version}: {description}")
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+
+            conn.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, datetime.datetime.now().isoformat())
+            )
+            conn.commit()
+            applied.append(version)
+        except Exception:
+            conn.rollback()
+            raise
+
+    return applied
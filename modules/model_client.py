@@ -0,0 +1,530 @@
+"""
+Model Client module for EFT Chatbot
+Asynchronous OpenAI client with fair-share scheduling, deadlines, retries, hedging and a circuit breaker
+"""
+
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from contextlib import aclosing
+import openai
+from openai import AsyncOpenAI
+from modules.scheduler import FairScheduler, PRIORITY_NORMAL, estimate_tokens
+
+MODEL_NAME = os.getenv(
+    "EFT_MODEL_NAME",
+    "ft:gpt-3.5-turbo-0125:university-of-bolton:eft-therapist-v1:BRjhRNWc"
+)
+MODEL_TEMPERATURE = 0.7
+
+# Upper bound on concurrent requests to the model API from this process;
+# further calls queue in the scheduler instead of piling onto the API
+MODEL_MAX_CONCURRENCY = int(os.getenv("EFT_MODEL_MAX_CONCURRENCY", "64"))
+
+# Deadline for a whole call, including queueing, retries and hedges
+MODEL_DEADLINE = float(os.getenv("EFT_MODEL_DEADLINE", "30"))
+# Longest gap allowed between streamed chunks once a stream has started
+MODEL_STREAM_IDLE_TIMEOUT = float(os.getenv("EFT_MODEL_STREAM_IDLE_TIMEOUT", "15"))
+
+# Retries on timeouts, connection errors, 429s and 5xx, with full-jitter exponential backoff
+MODEL_MAX_RETRIES = int(os.getenv("EFT_MODEL_MAX_RETRIES", "2"))
+MODEL_RETRY_BASE_DELAY = 0.5  # seconds
+MODEL_RETRY_MAX_DELAY = 8.0  # seconds
+
+# Send a second, hedged request when the first has been running longer than
+# this percentile of recent latencies (0 disables hedging). Streams are hedged
+# on time to first chunk, against their own latency history
+MODEL_HEDGE_PERCENTILE = float(os.getenv("EFT_MODEL_HEDGE_PERCENTILE", "0"))
+MODEL_HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+# Open the breaker after this many consecutive failures, then let one trial call through after the timeout
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("EFT_BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("EFT_BREAKER_RESET_TIMEOUT", "30"))  # seconds
+
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+    asyncio.TimeoutError
+)
+
+class ModelUnavailableError(Exception):
+    """Raised without calling the API while the circuit breaker is open"""
+
+class CircuitBreaker:
+    """Fails calls fast while the model API looks down, probing with one call at a time"""
+
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        self.failure_threshold = failure_threshold or BREAKER_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout or BREAKER_RESET_TIMEOUT
+        self.state = "closed"  # closed, open or half_open
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def admit(self):
+        """
+        Decide whether a new call may go to the API
+
+        Returns:
+            "call" while closed, "trial" for the one probe let through while
+            half open, or None if the call should fail fast. A trial must end
+            in record_success, record_failure or release_trial.
+        """
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "closed":
+                return "call"
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return "trial"
+            return None
+
+    def release_trial(self):
+        """End a trial without a verdict (cancelled, or closed before any reply) so another call can probe"""
+        with self._lock:
+            if self.state == "half_open":
+                self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"Model API circuit breaker opened after {self.failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+class LatencyTracker:
+    """Recent successful request latencies, for picking the hedging threshold"""
+
+    def __init__(self, size=LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        """The pct-th percentile in seconds, or None until there are enough samples"""
+        with self._lock:
+            if len(self._samples) < MODEL_HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+_client = None
+_scheduler = None
+_breaker = CircuitBreaker()
+_latencies = LatencyTracker()
+_first_chunk_latencies = LatencyTracker()
+_state_lock = threading.Lock()
+_stats = {
+    "in_flight": 0, "waiting": 0, "peak_in_flight": 0, "completed": 0, "failed": 0,
+    "retries": 0, "timeouts": 0, "hedges": 0, "hedge_wins": 0, "rejected": 0
+}
+
+def get_client():
+    """
+    Get the shared AsyncOpenAI client, creating it on first use
+
+    Created lazily so the API key and OPENAI_BASE_URL are read after load_dotenv().
+    Retries are handled here rather than by the client.
+    """
+    global _client
+    with _state_lock:
+        if _client is None:
+            _client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+        return _client
+
+def get_scheduler():
+    """Scheduler admitting every model request (created on first use, inside the running event loop)"""
+    global _scheduler
+    with _state_lock:
+        if _scheduler is None:
+            _scheduler = FairScheduler(MODEL_MAX_CONCURRENCY)
+        return _scheduler
+
+def _update_stats(**changes):
+    with _state_lock:
+        for key, delta in changes.items():
+            _stats[key] += delta
+        _stats["peak_in_flight"] = max(_stats["peak_in_flight"], _stats["in_flight"])
+
+def _backoff(attempt):
+    """Full-jitter exponential backoff delay for a retry"""
+    return random.uniform(0, min(MODEL_RETRY_MAX_DELAY, MODEL_RETRY_BASE_DELAY * (2 ** attempt)))
+
+async def _request(messages, model, temperature, user_id, priority):
+    """One API request, admitted by the scheduler"""
+    scheduler = get_scheduler()
+
+    _update_stats(waiting=1)
+    try:
+        ticket = await scheduler.acquire(user_id, estimate_tokens(messages), priority)
+    finally:
+        _update_stats(waiting=-1)
+
+    _update_stats(in_flight=1)
+    started = time.monotonic()
+    response = None
+    try:
+        response = await get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature
+        )
+    finally:
+        usage = getattr(response, "usage", None)
+        scheduler.release(ticket, usage.total_tokens if usage else None)
+        _update_stats(in_flight=-1)
+
+    _latencies.record(time.monotonic() - started)
+    return response.choices[0].message.content.strip()
+
+async def _hedged_request(messages, model, temperature, user_id, priority, timeout):
+    """
+    Run a request within timeout, hedging it once it is slower than usual
+
+    The first of the two requests to succeed wins and the other is cancelled.
+    """
+    threshold = _latencies.percentile(MODEL_HEDGE_PERCENTILE) if MODEL_HEDGE_PERCENTILE else None
+    if threshold is None or threshold >= timeout:
+        return await asyncio.wait_for(_request(messages, model, temperature, user_id, priority), timeout)
+
+    deadline = time.monotonic() + timeout
+    primary = asyncio.ensure_future(_request(messages, model, temperature, user_id, priority))
+    tasks = {primary}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=threshold)
+        if not done:
+            _update_stats(hedges=1)
+            hedge = asyncio.ensure_future(_request(messages, model, temperature, user_id, priority))
+            tasks.add(hedge)
+
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0.0, deadline - time.monotonic()),
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                raise asyncio.TimeoutError()
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        _update_stats(hedge_wins=1)
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def _check_breaker():
+    """Admit a call through the breaker; returns True if it is the half-open trial"""
+    admitted = _breaker.admit()
+    if admitted is None:
+        _update_stats(rejected=1)
+        raise ModelUnavailableError("Model API is unavailable (circuit breaker open)")
+    return admitted == "trial"
+
+def _should_retry(error, attempt, deadline):
+    """Record a retryable failure and decide whether another attempt fits before the deadline"""
+    _breaker.record_failure()
+    if isinstance(error, asyncio.TimeoutError):
+        _update_stats(timeouts=1)
+    return attempt < MODEL_MAX_RETRIES and _breaker.state == "closed" and time.monotonic() < deadline
+
+async def complete_chat(messages, model=None, temperature=MODEL_TEMPERATURE,
+                        user_id=None, priority=PRIORITY_NORMAL):
+    """
+    Get a chat completion without blocking the event loop
+
+    Args:
+        messages: List of message dictionaries for the OpenAI API
+        model: Model name (defaults to MODEL_NAME)
+        temperature: Sampling temperature
+        user_id: User the call is for, so the scheduler can share capacity fairly
+        priority: Scheduler lane (see modules.scheduler)
+
+    Returns:
+        The assistant's reply text
+
+    Raises:
+        ModelUnavailableError while the circuit breaker is open, asyncio.TimeoutError
+        when the deadline passes, or the last OpenAI error once retries run out
+    """
+    trial = _check_breaker()
+    deadline = time.monotonic() + MODEL_DEADLINE
+    attempt = 0
+
+    try:
+        while True:
+            try:
+                reply = await _hedged_request(
+                    messages, model or MODEL_NAME, temperature, user_id, priority,
+                    deadline - time.monotonic()
+                )
+            except RETRYABLE_ERRORS as e:
+                delay = _backoff(attempt)
+                if not _should_retry(e, attempt, deadline - delay):
+                    _update_stats(failed=1)
+                    raise
+                attempt += 1
+                _update_stats(retries=1)
+                await asyncio.sleep(delay)
+                continue
+            except Exception:
+                # The API answered (e.g. a 400), so it is up as far as the breaker is concerned
+                _breaker.record_success()
+                _update_stats(failed=1)
+                raise
+
+            _breaker.record_success()
+            _update_stats(completed=1)
+            return reply
+    finally:
+        if trial:
+            # Cancelled before a verdict; a recorded verdict has already left half open
+            _breaker.release_trial()
+
+async def _stream_request(messages, model, temperature, user_id, priority, timeout):
+    """One streamed API request, admitted by the scheduler, with first-chunk and idle timeouts"""
+    scheduler = get_scheduler()
+    deadline = time.monotonic() + timeout
+
+    _update_stats(waiting=1)
+    try:
+        ticket = await asyncio.wait_for(
+            scheduler.acquire(user_id, estimate_tokens(messages), priority), timeout
+        )
+    finally:
+        _update_stats(waiting=-1)
+
+    _update_stats(in_flight=1)
+    started = time.monotonic()
+    stream = None
+    used_tokens = None
+    try:
+        stream = await asyncio.wait_for(
+            get_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                stream=True,
+                stream_options={"include_usage": True}
+            ),
+            max(0.0, deadline - time.monotonic())
+        )
+        chunks = stream.__aiter__()
+        wait = max(0.0, deadline - time.monotonic())
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), wait)
+            except StopAsyncIteration:
+                return
+            wait = MODEL_STREAM_IDLE_TIMEOUT
+            if getattr(chunk, "usage", None):
+                used_tokens = chunk.usage.total_tokens
+            if chunk.choices and chunk.choices[0].delta.content:
+                if started is not None:
+                    _first_chunk_latencies.record(time.monotonic() - started)
+                    started = None
+                yield chunk.choices[0].delta.content
+    finally:
+        scheduler.release(ticket, used_tokens)
+        _update_stats(in_flight=-1)
+        if stream is not None:
+            await stream.close()
+
+async def _first_delta(deltas):
+    """The first delta of a stream, or None if it ends without any text"""
+    try:
+        return await deltas.__anext__()
+    except StopAsyncIteration:
+        return None
+
+async def _close_streams(streams):
+    """Close streams that may still be starting in a _first_delta task"""
+    for task, deltas in streams.items():
+        task.cancel()
+        # Let the cancellation run the stream's cleanup before closing it
+        await asyncio.wait([task])
+        if not task.cancelled():
+            task.exception()  # retrieved, so a loser's error isn't logged as unhandled
+        await deltas.aclose()
+
+async def _hedged_stream(messages, model, temperature, user_id, priority, timeout):
+    """
+    Stream a request within timeout, hedging it while the first chunk is slower than usual
+
+    Whichever of the two streams yields text first is kept and the other is cancelled.
+    """
+    threshold = _first_chunk_latencies.percentile(MODEL_HEDGE_PERCENTILE) if MODEL_HEDGE_PERCENTILE else None
+    if threshold is None or threshold >= timeout:
+        async with aclosing(_stream_request(messages, model, temperature, user_id, priority, timeout)) as deltas:
+            async for delta in deltas:
+                yield delta
+        return
+
+    deadline = time.monotonic() + timeout
+    primary = _stream_request(messages, model, temperature, user_id, priority, timeout)
+    streams = {asyncio.ensure_future(_first_delta(primary)): primary}
+    winner = None
+    try:
+        done, _ = await asyncio.wait(streams, timeout=threshold)
+        if not done:
+            _update_stats(hedges=1)
+            hedge = _stream_request(
+                messages, model, temperature, user_id, priority, max(0.0, deadline - time.monotonic())
+            )
+            streams[asyncio.ensure_future(_first_delta(hedge))] = hedge
+
+        pending = set(streams)
+        error = None
+        while winner is None:
+            if not pending:
+                raise error
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0.0, deadline - time.monotonic()),
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                raise asyncio.TimeoutError()
+            for task in done:
+                if task.exception() is None:
+                    winner = task
+                    break
+                error = task.exception()
+
+        deltas = streams.pop(winner)
+        if deltas is not primary:
+            _update_stats(hedge_wins=1)
+        # The loser gives back its scheduler slot before the rest of the reply streams
+        await _close_streams(streams)
+        streams = {winner: deltas}
+
+        first = winner.result()
+        if first is None:
+            return
+        yield first
+        async for delta in deltas:
+            yield delta
+    finally:
+        await _close_streams(streams)
+
+async def stream_chat(messages, model=None, temperature=MODEL_TEMPERATURE,
+                      user_id=None, priority=PRIORITY_NORMAL):
+    """
+    Stream a chat completion as it is generated
+
+    Failures before the first chunk are retried like complete_chat, and a slow
+    first chunk is hedged; once text has been yielded a failure is raised,
+    since the caller has already shown it.
+
+    Args:
+        messages: List of message dictionaries for the OpenAI API
+        model: Model name (defaults to MODEL_NAME)
+        temperature: Sampling temperature
+        user_id: User the call is for, so the scheduler can share capacity fairly
+        priority: Scheduler lane (see modules.scheduler)
+
+    Yields:
+        Text deltas in the order the model produces them
+
+    Raises:
+        ModelUnavailableError while the circuit breaker is open, asyncio.TimeoutError
+        on a missed deadline or a stalled stream, or the last OpenAI error
+    """
+    trial = _check_breaker()
+    deadline = time.monotonic() + MODEL_DEADLINE
+    attempt = 0
+
+    try:
+        while True:
+            started = False
+            try:
+                # aclosing so an abandoned stream frees its slot straight away
+                async with aclosing(_hedged_stream(
+                    messages, model or MODEL_NAME, temperature, user_id, priority,
+                    deadline - time.monotonic()
+                )) as deltas:
+                    async for delta in deltas:
+                        if not started:
+                            # The API is answering; concurrent failures shouldn't outvote it
+                            # while the rest of the reply streams
+                            _breaker.record_success()
+                            started = True
+                        yield delta
+            except RETRYABLE_ERRORS as e:
+                delay = _backoff(attempt)
+                if started or not _should_retry(e, attempt, deadline - delay):
+                    _update_stats(failed=1)
+                    raise
+                attempt += 1
+                _update_stats(retries=1)
+                await asyncio.sleep(delay)
+                continue
+            except Exception:
+                _breaker.record_success()
+                _update_stats(failed=1)
+                raise
+
+            _breaker.record_success()
+            _update_stats(completed=1)
+            return
+    finally:
+        if trial:
+            # Ended before a verdict; a recorded verdict has already left half open
+            _breaker.release_trial()
+
+def get_model_call_stats():
+    """Counters for monitoring model call concurrency, scheduling and resilience"""
+    with _state_lock:
+        stats = dict(_stats)
+        scheduler = _scheduler
+    stats["max_concurrency"] = MODEL_MAX_CONCURRENCY
+    stats["scheduler"] = scheduler.stats() if scheduler is not None else None
+    stats["breaker_state"] = _breaker.state
+    stats["latency_p50"] = _latencies.percentile(50)
+    stats["latency_p95"] = _latencies.percentile(95)
+    stats["first_chunk_p50"] = _first_chunk_latencies.percentile(50)
+    stats["first_chunk_p95"] = _first_chunk_latencies.percentile(95)
+    return stats
+
+async def close_model_client():
+    """Close the shared client's connections from inside the event loop that used them"""
+    global _client
+    with _state_lock:
+        client, _client = _client, None
+    if client is not None:
+        await client.close()
+
+def reset_model_client():
+    """Drop the shared client, scheduler, breaker and latency history (e.g. before starting a new event loop)"""
+    global _client, _scheduler, _breaker, _latencies, _first_chunk_latencies
+    with _state_lock:
+        _client = None
+        _scheduler = None
+        _breaker = CircuitBreaker()
+        _latencies = LatencyTracker()
+        _first_chunk_latencies = LatencyTracker()
+        for key in _stats:
+            _stats[key] = 0
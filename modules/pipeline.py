@@ -0,0 +1,163 @@
+"""
+Pipeline module for EFT Chatbot
+Single-pass handling of a user message: validate, safety check, emotion tag, persist, build context, generate
+"""
+
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager
+from modules.personalisation import build_personalised_prompt
+from modules.model_client import stream_chat
+from modules.scheduler import PRIORITY_CRISIS, PRIORITY_NORMAL
+from modules.emotion_tagger import EMOTION_TAGGING
+from modules.keyword_matcher import register_keywords, scan_keywords
+
+STAGES = ["validate", "safety", "emotion", "persist", "context", "generate"]
+
+# Longest user message passed on to the model
+MAX_MESSAGE_CHARS = 4000
+
+TIMING_SAMPLE_SIZE = 1000
+
+SUICIDE_TERMS = [
+    "suicid*", "kill myself", "end my life", "take my life",
+    "don't want to live", "want to die", "end it all",
+    "no reason to live", "better off dead"
+]
+register_keywords("suicide", SUICIDE_TERMS)
+
+_timings_lock = threading.Lock()
+_timings = {stage: deque(maxlen=TIMING_SAMPLE_SIZE) for stage in STAGES + ["first_token"]}
+_counts = {stage: 0 for stage in STAGES}
+
+def contains_suicide_risk(message):
+    """Check a user message for mentions of suicide or self-harm"""
+    return "suicide" in scan_keywords(message)
+
+class Turn:
+    """One user message on its way through the pipeline"""
+
+    def __init__(self, chat_state, text):
+        self.chat_state = chat_state
+        self.text = text
+        self.is_crisis = False
+        self.emotion = None
+        self.prompt = None
+        self.timings = {}  # stage -> milliseconds
+
+def _record_timing(stage, elapsed_ms):
+    with _timings_lock:
+        _timings[stage].append(elapsed_ms)
+        if stage in _counts:
+            _counts[stage] += 1
+
+@contextmanager
+def _stage(turn, name):
+    """Time one stage of a turn"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        turn.timings[name] = elapsed_ms
+        _record_timing(name, elapsed_ms)
+
+async def prepare_turn(user_message, chat_state, build_context=True):
+    """
+    Run a user message through every stage up to generation, once each
+
+    Args:
+        user_message: Raw text from the chat box
+        chat_state: The browser session's ChatState
+        build_context: False when the reply will not come from the model
+
+    Returns:
+        The Turn, or None if the message is empty. The message is stored and
+        added to the chat context exactly once; its emotion is on the Turn only
+        with inline tagging. A crisis turn stops after persisting and has no prompt.
+    """
+    session_tracker = chat_state.session_tracker
+    turn = Turn(chat_state, None)
+
+    with _stage(turn, "validate"):
+        text = (user_message or "").strip()[:MAX_MESSAGE_CHARS]
+    if not text:
+        return None
+    turn.text = text
+
+    with _stage(turn, "safety"):
+        turn.is_crisis = contains_suicide_risk(text)
+        if turn.is_crisis:
+            chat_state.crisis_flagged = True
+
+    # With deferred tagging the message is stored untagged and classified in
+    # the background, so the reply never waits for the model
+    if EMOTION_TAGGING == "inline":
+        # Emotion inference runs the model, so keep it off the event loop
+        with _stage(turn, "emotion"):
+            turn.emotion = await asyncio.to_thread(session_tracker.detect_emotion, text)
+
+    with _stage(turn, "persist"):
+        if not session_tracker.is_active() and chat_state.user_id:
+            await asyncio.to_thread(session_tracker.start_session, chat_state.user_id)
+        # A sync journal writes to SQLite here, and the first deferred message starts the tagger
+        if EMOTION_TAGGING == "inline":
+            await asyncio.to_thread(session_tracker.record_message, "user", text, turn.emotion)
+        else:
+            await asyncio.to_thread(session_tracker.record_message, "user", text)
+
+    if turn.is_crisis or not build_context:
+        return turn
+
+    with _stage(turn, "context"):
+        messages = await asyncio.to_thread(
+            build_personalised_prompt,
+            chat_state.user_id,
+            session_tracker.get_chat_session()
+        )
+        # Without an active session the message is not in the tracked history
+        if not messages or messages[-1]["role"] != "user":
+            messages.append({"role": "user", "content": text})
+        turn.prompt = session_tracker.context_window.fit(messages)
+
+    return turn
+
+async def generate(turn):
+    """
+    Stream the model's reply to a prepared turn, timing the generate stage
+
+    Yields:
+        Text deltas from the model
+    """
+    chat_state = turn.chat_state
+    start = time.perf_counter()
+    first_token = True
+    with _stage(turn, "generate"):
+        async for delta in stream_chat(
+            turn.prompt,
+            user_id=chat_state.user_id,
+            priority=PRIORITY_CRISIS if chat_state.crisis_flagged else PRIORITY_NORMAL
+        ):
+            if first_token:
+                first_token = False
+                elapsed_ms = (time.perf_counter() - start) * 1000.0
+                turn.timings["first_token"] = elapsed_ms
+                _record_timing("first_token", elapsed_ms)
+            yield delta
+
+def get_pipeline_stats():
+    """Per-stage run counts and latency (milliseconds) for recent turns"""
+    with _timings_lock:
+        samples = {stage: sorted(values) for stage, values in _timings.items()}
+        counts = dict(_counts)
+
+    stats = {}
+    for stage, values in samples.items():
+        stats[stage] = {
+            "count": counts.get(stage, len(values)),
+            "mean_ms": sum(values) / len(values) if values else 0.0,
+            "p95_ms": values[min(len(values) - 1, int(len(values) * 0.95))] if values else 0.0,
+        }
+    return stats
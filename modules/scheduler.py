@@ -0,0 +1,207 @@
+"""
+Scheduler module for EFT Chatbot
+Fair-share admission for model API requests: per-user round robin, a crisis lane and global rate limits
+"""
+
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+
+# Lanes, served strictly in this order
+PRIORITY_CRISIS = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2  # e.g. conversation summaries
+LANE_NAMES = ["crisis", "normal", "background"]
+
+# Account-wide OpenAI limits to stay under
+MODEL_REQUESTS_PER_MINUTE = int(os.getenv("EFT_MODEL_RPM", "3500"))
+MODEL_TOKENS_PER_MINUTE = int(os.getenv("EFT_MODEL_TPM", "160000"))
+
+# Completion tokens charged up front; corrected once the real usage is known
+COMPLETION_TOKEN_ESTIMATE = int(os.getenv("EFT_COMPLETION_TOKEN_ESTIMATE", "400"))
+
+WAIT_SAMPLE_SIZE = 1000
+
+def estimate_tokens(messages):
+    """Rough prompt + completion token estimate for rate limiting (chars / 4)"""
+    return sum(len(message["content"]) for message in messages) // 4 + COMPLETION_TOKEN_ESTIMATE
+
+class TokenBucket:
+    """Continuously refilling allowance of some amount per minute"""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until amount is available (0 if it is now)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self._refill()
+        self.level -= amount
+
+    def give(self, amount):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+class Ticket:
+    """One queued or admitted request"""
+
+    __slots__ = ("user_id", "tokens", "priority", "future", "enqueued_at")
+
+    def __init__(self, user_id, tokens, priority, future):
+        self.user_id = user_id
+        self.tokens = tokens
+        self.priority = priority
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+class FairScheduler:
+    """
+    Admits model requests one slot at a time
+
+    Crisis requests always go first, then normal, then background. Within a
+    lane users take turns, one request each, so a user with many queued
+    requests cannot starve the others. A request is only admitted when a
+    concurrency slot is free and both the request and token buckets can
+    cover it. Must be used from a single event loop.
+    """
+
+    def __init__(self, max_concurrency, requests_per_minute=None, tokens_per_minute=None):
+        self.max_concurrency = max_concurrency
+        self._requests = TokenBucket(requests_per_minute or MODEL_REQUESTS_PER_MINUTE)
+        self._tokens = TokenBucket(tokens_per_minute or MODEL_TOKENS_PER_MINUTE)
+        self._lanes = [OrderedDict() for _ in LANE_NAMES]  # user_id -> deque of tickets, in turn order
+        self._active = 0
+        self._timer = None
+        self._waits = deque(maxlen=WAIT_SAMPLE_SIZE)
+        self.admitted = 0
+        self.throttled = 0
+        self.peak_queue_depth = 0
+
+    async def acquire(self, user_id=None, tokens=0, priority=PRIORITY_NORMAL):
+        """
+        Wait for admission
+
+        Args:
+            user_id: Whose request this is (requests with None share one turn)
+            tokens: Estimated tokens the request will use
+            priority: PRIORITY_CRISIS, PRIORITY_NORMAL or PRIORITY_BACKGROUND
+
+        Returns:
+            Ticket to pass to release() when the request has finished
+        """
+        ticket = Ticket(user_id, tokens, priority, asyncio.get_running_loop().create_future())
+        self._lanes[priority].setdefault(user_id, deque()).append(ticket)
+        self.peak_queue_depth = max(self.peak_queue_depth, self.queue_depth())
+        self._dispatch()
+
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            self._remove(ticket)
+            if ticket.future.done() and not ticket.future.cancelled():
+                # Admitted just as the caller gave up
+                self.release(ticket)
+            raise
+        return ticket
+
+    def release(self, ticket, actual_tokens=None):
+        """Free the ticket's slot, correcting the token charge if the real usage is known"""
+        self._active -= 1
+        if actual_tokens is not None:
+            difference = actual_tokens - ticket.tokens
+            if difference > 0:
+                self._tokens.take(difference)
+            else:
+                self._tokens.give(-difference)
+        self._dispatch()
+
+    def queue_depth(self, priority=None):
+        """Number of queued requests, in one lane or all of them"""
+        lanes = self._lanes if priority is None else [self._lanes[priority]]
+        return sum(len(queue) for lane in lanes for queue in lane.values())
+
+    def _remove(self, ticket):
+        lane = self._lanes[ticket.priority]
+        queue = lane.get(ticket.user_id)
+        if queue is not None and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del lane[ticket.user_id]
+
+    def _peek(self):
+        """The ticket whose turn it is, with its lane"""
+        for lane in self._lanes:
+            if lane:
+                return lane, next(iter(lane.values()))[0]
+        return None, None
+
+    def _dispatch(self):
+        while self._active < self.max_concurrency:
+            lane, ticket = self._peek()
+            if ticket is None:
+                return
+            if ticket.future.done():
+                # Cancelled while queued, before its waiter could remove it
+                self._remove(ticket)
+                continue
+
+            wait = max(self._requests.wait_time(1), self._tokens.wait_time(ticket.tokens))
+            if wait > 0:
+                self.throttled += 1
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(wait, self._on_timer)
+                return
+
+            # Pop the ticket and send its user to the back of the lane
+            queue = lane.pop(ticket.user_id)
+            queue.popleft()
+            if queue:
+                lane[ticket.user_id] = queue
+
+            self._requests.take(1)
+            self._tokens.take(ticket.tokens)
+            self._active += 1
+            self.admitted += 1
+            self._waits.append(time.monotonic() - ticket.enqueued_at)
+            ticket.future.set_result(None)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def stats(self):
+        """Queue depth and wait-time metrics"""
+        waits = sorted(self._waits)
+
+        def wait_percentile(pct):
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(len(waits) * pct / 100.0))]
+
+        return {
+            "active": self._active,
+            "queue_depth": self.queue_depth(),
+            "queue_depth_by_lane": {name: self.queue_depth(i) for i, name in enumerate(LANE_NAMES)},
+            "users_waiting": len({user_id for lane in self._lanes for user_id in lane}),
+            "peak_queue_depth": self.peak_queue_depth,
+            "admitted": self.admitted,
+            "throttled": self.throttled,
+            "wait_p50": wait_percentile(50),
+            "wait_p95": wait_percentile(95),
+            "wait_max": waits[-1] if waits else 0.0,
+        }
@@ -112,29 +112,35 @@ This chatbot is not equipped to handle crises or emergencies. If you experience
 By clicking "I Agree" below, you confirm that you understand and accept these terms.
 """
 
-# State variables
-current_assessment = "intro"  # Options: intro, consent, gad7, phq9, results, chatbot
-gad7_scores = []
-phq9_scores = []
-is_high_risk = False
-has_suicide_risk = False
-has_consented = False
-
-def reset_screening():
+class ScreeningState:
+    """Screening progress and results for one browser session (held in a gr.State)"""
+
+    def __init__(self):
+        self.current_assessment = "intro"  # Options: intro, consent, gad7, phq9, results, chatbot
+        self.gad7_scores = []
+        self.phq9_scores = []
+        self.is_high_risk = False
+        self.has_suicide_risk = False
+        self.has_consented = False
+
+def ensure_screening_state(state):
+    """Return state, creating a fresh ScreeningState for a new browser session"""
+    return state if state is not None else ScreeningState()
+
+def reset_screening(state):
     """Reset all screening data"""
-    global current_assessment, gad7_scores, phq9_scores, is_high_risk, has_suicide_risk, has_consented
-    current_assessment = "intro"
-    gad7_scores = []
-    phq9_scores = []
-    is_high_risk = False
-    has_suicide_risk = False
-    has_consented = False
+    state = ensure_screening_state(state)
+    state.__init__()
+    return state
 
 def create_screening_interface():
     """Create and return all the screening UI components"""
     # Create state for current user ID
     user_id_state = gr.State(None)
     
+    # Screening progress for this browser session
+    screening_state = gr.State(None)
+    
     # Introduction screen
     with gr.Row(visible=True) as intro_screen:
         with gr.Column():
@@ -226,50 +232,55 @@ def create_screening_interface():
                 skip_btn = gr.Button("Proceed to Chatbot", variant="primary")
     
     # Function to show consent screen
-    def show_consent():
-        global current_assessment
-        current_assessment = "consent"
+    def show_consent(state):
+        state = ensure_screening_state(state)
+        state.current_assessment = "consent"
         return {
             intro_screen: gr.update(visible=False),
-            consent_screen: gr.update(visible=True)
+            consent_screen: gr.update(visible=True),
+            screening_state: state
         }
     
     # Function to handle consent agreement
-    def agree_to_consent(user_id):
-        global current_assessment, has_consented
+    def agree_to_consent(user_id, state):
+        state = ensure_screening_state(state)
         
-        has_consented = True
+        state.has_consented = True
         if user_id:
             record_consent(user_id)
             
             # Check if user has a recent assessment
             if has_recent_assessment(user_id):
-                current_assessment = "returning"
+                state.current_assessment = "returning"
                 return {
                     consent_screen: gr.update(visible=False),
-                    returning_user_screen: gr.update(visible=True)
+                    returning_user_screen: gr.update(visible=True),
+                    screening_state: state
                 }
             else:
-                current_assessment = "gad7"
+                state.current_assessment = "gad7"
                 return {
                     consent_screen: gr.update(visible=False),
-                    gad7_screen: gr.update(visible=True)
+                    gad7_screen: gr.update(visible=True),
+                    screening_state: state
                 }
         
         # Default fallback if no user_id
-        current_assessment = "gad7"
+        state.current_assessment = "gad7"
         return {
             consent_screen: gr.update(visible=False),
-            gad7_screen: gr.update(visible=True)
+            gad7_screen: gr.update(visible=True),
+            screening_state: state
         }
     
     # Function to handle consent decline
-    def decline_consent():
-        global current_assessment
-        current_assessment = "declined"
+    def decline_consent(state):
+        state = ensure_screening_state(state)
+        state.current_assessment = "declined"
         return {
             consent_screen: gr.update(visible=False),
-            consent_declined_screen: gr.update(visible=True)
+            consent_declined_screen: gr.update(visible=True),
+            screening_state: state
         }
     
     # Function to validate GAD-7 answers
@@ -289,8 +300,8 @@ def create_screening_interface():
         return None
     
     # Function to handle GAD-7 submission
-    def submit_gad7(*answers):
-        global current_assessment, gad7_scores
+    def submit_gad7(state, *answers):
+        state = ensure_screening_state(state)
         
         # Validate answers
         error = validate_gad7(*answers)
@@ -300,7 +311,7 @@ def create_screening_interface():
             }
         
         # Convert answers to scores
-        gad7_scores = []
+        gad7_scores = state.gad7_scores = []
         for answer in answers:
             if answer == RESPONSE_OPTIONS[0]:
                 gad7_scores.append(0)
@@ -314,15 +325,16 @@ def create_screening_interface():
                 gad7_scores.append(0)  # Default if not answered
         
         # Move to PHQ-9
-        current_assessment = "phq9"
+        state.current_assessment = "phq9"
         return {
             gad7_screen: gr.update(visible=False),
-            phq9_screen: gr.update(visible=True)
+            phq9_screen: gr.update(visible=True),
+            screening_state: state
         }
     
     # Function to handle PHQ-9 submission
-    def submit_phq9(user_id, *answers):
-        global current_assessment, phq9_scores, is_high_risk, has_suicide_risk
+    def submit_phq9(user_id, state, *answers):
+        state = ensure_screening_state(state)
         
         # Validate answers
         error = validate_phq9(*answers)
@@ -332,7 +344,7 @@ def create_screening_interface():
             }
         
         # Convert answers to scores
-        phq9_scores = []
+        phq9_scores = state.phq9_scores = []
         for answer in answers:
             if answer == RESPONSE_OPTIONS[0]:
                 phq9_scores.append(0)
@@ -346,16 +358,18 @@ def create_screening_interface():
                 phq9_scores.append(0)  # Default if not answered
         
         # Calculate total scores
+        gad7_scores = state.gad7_scores
         gad7_total = sum(gad7_scores)
         phq9_total = sum(phq9_scores)
         
         # Check risk levels
-        is_high_risk = (gad7_total >= GAD7_HIGH_RISK_THRESHOLD or 
-                        phq9_total >= PHQ9_HIGH_RISK_THRESHOLD)
+        is_high_risk = state.is_high_risk = (gad7_total >= GAD7_HIGH_RISK_THRESHOLD or 
+                                             phq9_total >= PHQ9_HIGH_RISK_THRESHOLD)
         
         # Check suicide risk (PHQ-9 question 9, index 8)
         if len(phq9_scores) > SUICIDE_QUESTION_INDEX:
-            has_suicide_risk = phq9_scores[SUICIDE_QUESTION_INDEX] > 0
+            state.has_suicide_risk = phq9_scores[SUICIDE_QUESTION_INDEX] > 0
+        has_suicide_risk = state.has_suicide_risk
         
         # Store assessment results if we have a user_id
         if user_id:
@@ -369,21 +383,23 @@ def create_screening_interface():
         
         # Determine which screen to show next
         if has_suicide_risk:
-            current_assessment = "crisis"
+            state.current_assessment = "crisis"
             return {
                 phq9_screen: gr.update(visible=False),
                 risk_screen: gr.update(visible=True),
-                risk_message: CRISIS_RESOURCES
+                risk_message: CRISIS_RESOURCES,
+                screening_state: state
             }
         elif is_high_risk:
-            current_assessment = "high_risk"
+            state.current_assessment = "high_risk"
             return {
                 phq9_screen: gr.update(visible=False),
                 risk_screen: gr.update(visible=True),
-                risk_message: HIGH_RISK_MESSAGE
+                risk_message: HIGH_RISK_MESSAGE,
+                screening_state: state
             }
         else:
-            current_assessment = "results"
+            state.current_assessment = "results"
             # Format GAD-7 result
             gad7_interpretation = "Minimal anxiety"
             if sum(gad7_scores) >= 15:
@@ -408,59 +424,62 @@ def create_screening_interface():
                 phq9_screen: gr.update(visible=False),
                 results_screen: gr.update(visible=True),
                 gad7_result: f"**GAD-7 Score:** {sum(gad7_scores)}/21 - {gad7_interpretation}",
-                phq9_result: f"**PHQ-9 Score:** {sum(phq9_scores)}/27 - {phq9_interpretation}"
+                phq9_result: f"**PHQ-9 Score:** {sum(phq9_scores)}/27 - {phq9_interpretation}",
+                screening_state: state
             }
     
     # Function to skip assessment for returning users
-    def skip_assessment():
-        global current_assessment
-        current_assessment = "chatbot"
+    def skip_assessment(state):
+        state = ensure_screening_state(state)
+        state.current_assessment = "chatbot"
         return {
-            returning_user_screen: gr.update(visible=False)
+            returning_user_screen: gr.update(visible=False),
+            screening_state: state
         }
     
     # Function to take assessment again
-    def retake_assessment():
-        global current_assessment
-        current_assessment = "gad7"
+    def retake_assessment(state):
+        state = ensure_screening_state(state)
+        state.current_assessment = "gad7"
         return {
             returning_user_screen: gr.update(visible=False),
-            gad7_screen: gr.update(visible=True)
+            gad7_screen: gr.update(visible=True),
+            screening_state: state
         }
     
     # Connect button handlers
     intro_btn.click(
         show_consent,
-        inputs=[],
-        outputs=[intro_screen, consent_screen]
+        inputs=[screening_state],
+        outputs=[intro_screen, consent_screen, screening_state]
     )
     
     # Use user_id_state as input for agree_to_consent
     consent_btn_output = consent_btn.click(
         agree_to_consent,
-        inputs=[user_id_state],
-        outputs=[consent_screen, gad7_screen, returning_user_screen]
+        inputs=[user_id_state, screening_state],
+        outputs=[consent_screen, gad7_screen, returning_user_screen, screening_state]
     )
     
     decline_btn.click(
         decline_consent,
-        inputs=[],
-        outputs=[consent_screen, consent_declined_screen]
+        inputs=[screening_state],
+        outputs=[consent_screen, consent_declined_screen, screening_state]
     )
     
     gad7_submit.click(
         submit_gad7,
-        inputs=gad7_questions,
-        outputs=[gad7_screen, phq9_screen]
+        inputs=[screening_state] + gad7_questions,
+        outputs=[gad7_screen, phq9_screen, screening_state]
     )
     
     # Pass user_id to submit_phq9
     phq9_submit_output = phq9_submit.click(
         submit_phq9,
-        inputs=[user_id_state] + phq9_questions,  # Pass user_id as first argument
+        inputs=[user_id_state, screening_state] + phq9_questions,  # Pass user_id as first argument
         outputs=[
             phq9_screen, risk_screen, risk_message,
-            phq9_screen, results_screen, gad7_result, phq9_result
+            phq9_screen, results_screen, gad7_result, phq9_result, screening_state
         ]
     )
     
@@ -472,14 +491,14 @@ def create_screening_interface():
     
     skip_btn_output = skip_btn.click(
         skip_assessment,
-        inputs=[],
-        outputs=[returning_user_screen]
+        inputs=[screening_state],
+        outputs=[returning_user_screen, screening_state]
     )
     
     reassess_btn.click(
         retake_assessment,
-        inputs=[],
-        outputs=[returning_user_screen, gad7_screen]
+        inputs=[screening_state],
+        outputs=[returning_user_screen, gad7_screen, screening_state]
     )
     
     # Return all screen components and output events for visibility control
@@ -497,23 +516,26 @@ def create_screening_interface():
         "phq9_submit_output": phq9_submit_output,
         "continue_btn_output": continue_btn_output,
         "skip_btn_output": skip_btn_output,
-        "user_id_state": user_id_state
+        "user_id_state": user_id_state,
+        "screening_state": screening_state
     }
 
-def check_eligibility():
+def check_eligibility(state):
     """Check if the user is eligible to use the chatbot based on screening results"""
-    return has_consented and not (is_high_risk or has_suicide_risk)
+    state = ensure_screening_state(state)
+    return state.has_consented and not (state.is_high_risk or state.has_suicide_risk)
 
-def get_screening_status():
-    """Return the current status of the screening process"""
+def get_screening_status(state):
+    """Return the current status of the screening process for one browser session"""
+    state = ensure_screening_state(state)
     return {
-        "completed": current_assessment in ["results", "chatbot", "crisis", "high_risk"],
-        "consented": has_consented,
-        "eligible": check_eligibility(),
-        "current_screen": current_assessment,
-        "gad7_score": sum(gad7_scores) if gad7_scores else 0,
-        "phq9_score": sum(phq9_scores) if phq9_scores else 0,
-        "suicide_risk": has_suicide_risk
+        "completed": state.current_assessment in ["results", "chatbot", "crisis", "high_risk"],
+        "consented": state.has_consented,
+        "eligible": check_eligibility(state),
+        "current_screen": state.current_assessment,
+        "gad7_score": sum(state.gad7_scores) if state.gad7_scores else 0,
+        "phq9_score": sum(state.phq9_scores) if state.phq9_scores else 0,
+        "suicide_risk": state.has_suicide_risk
     }
 
 def skip_consent_for_returning_user(user_id):
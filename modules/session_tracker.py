@@ -5,14 +5,122 @@ Manages current user session state and tracks interactions
 
 import datetime
 import os
+import atexit
+import threading
 from modules.database import (
     create_session, 
     end_session, 
-    store_message, 
     store_tapping_sequence,
-    mark_tapping_step_completed
+    mark_tapping_step_completed,
+    EMOTION_PENDING
 )
-from modules.emotion_analysis import EmotionAnalyzer, detect_emotion_keywords
+from modules.emotion_analysis import EmotionAnalyzer, EmotionBatcher, detect_emotion_keywords
+from modules.emotion_pool import EmotionWorkerPool, EMOTION_WORKERS
+from modules.message_journal import get_message_journal, shutdown_message_journal
+from modules.emotion_tagger import EmotionTagger, EMOTION_TAGGING
+from modules.context_window import ContextWindow
+
+# Default for record_message's emotion argument: run detection
+DETECT_EMOTION = object()
+
+_emotion_analyzer = None
+_emotion_batcher = None
+_emotion_tagger = None
+_emotion_analyzer_lock = threading.Lock()
+
+def get_emotion_analyzer():
+    """
+    Get the emotion analyzer shared by every session (its model may still be loading)
+    
+    With EFT_EMOTION_WORKERS set this is the client for the worker pool,
+    which offers the same interface.
+    """
+    global _emotion_analyzer
+    with _emotion_analyzer_lock:
+        if _emotion_analyzer is None:
+            _emotion_analyzer = EmotionWorkerPool() if EMOTION_WORKERS > 0 else EmotionAnalyzer()
+        return _emotion_analyzer
+
+def get_emotion_batcher():
+    """Get the micro-batcher that runs concurrent sessions' messages through the model together"""
+    global _emotion_batcher
+    analyzer = get_emotion_analyzer()
+    if isinstance(analyzer, EmotionWorkerPool):
+        # The pool's workers batch whatever is waiting for them
+        return analyzer
+    with _emotion_analyzer_lock:
+        if _emotion_batcher is None:
+            _emotion_batcher = EmotionBatcher(analyzer)
+        return _emotion_batcher
+
+def detect_emotions(texts):
+    """
+    Tag many texts at once, e.g. to backfill stored messages
+    
+    Args:
+        texts: List of message texts
+        
+    Returns:
+        List of emotion labels, from the model once it is ready or keywords until then
+    """
+    analyzer = get_emotion_analyzer()
+    if analyzer.is_initialized:
+        emotions = analyzer.detect_emotions(texts)
+    else:
+        emotions = [detect_emotion_keywords(text) if text else None for text in texts]
+    # Match detect_emotion: no label for an empty message
+    return [emotion if text else None for text, emotion in zip(texts, emotions)]
+
+def get_emotion_tagger():
+    """
+    Get the background tagger for messages stored with their emotion pending,
+    starting it on first use
+
+    It receives rows from the message journal once they are written, and at
+    startup picks up any that a previous run left untagged.
+    """
+    global _emotion_tagger
+    analyzer = get_emotion_analyzer()
+    with _emotion_analyzer_lock:
+        if _emotion_tagger is None:
+            _emotion_tagger = EmotionTagger(
+                detect_emotions,
+                ready=lambda: analyzer.is_initialized or analyzer.load_failed
+            )
+            get_message_journal().add_listener(_emotion_tagger.submit_rows)
+            _emotion_tagger.start()
+            atexit.register(shutdown_emotion_tagger)
+        return _emotion_tagger
+
+def shutdown_emotion_tagger():
+    """Tag every pending message before exit; registered to run at interpreter exit"""
+    global _emotion_tagger
+    if _emotion_tagger is None:
+        return
+    # Write out the journal first so its pending rows reach the tagger
+    shutdown_message_journal()
+    _emotion_tagger.close()
+    print(f"Emotion tagger drained ({_emotion_tagger.tagged} messages tagged, {_emotion_tagger.failures} failed)")
+    _emotion_tagger = None
+
+def start_emotion_model_loading():
+    """
+    Load the emotion model in the background
+
+    Messages are tagged with the keyword fallback until it is ready.
+
+    Returns:
+        The loader thread (the pool client's thread when using worker processes)
+    """
+    thread = get_emotion_analyzer().start_background_load()
+    if EMOTION_TAGGING == "deferred":
+        # Picks up messages left untagged by the last run; they wait for the model
+        get_emotion_tagger()
+    return thread
+
+def emotion_model_ready():
+    """Whether messages are being tagged by the model rather than keywords"""
+    return get_emotion_analyzer().is_initialized
 
 class SessionTracker:
     """Class for tracking therapy session data"""
@@ -22,14 +130,10 @@ class SessionTracker:
         self.current_session_id = None
         self.is_session_active = False
         self.chat_session = []
-        self.emotion_analyzer = None
-        
-        # Try to initialize emotion analyzer
-        try:
-            self.emotion_analyzer = EmotionAnalyzer()
-        except Exception as e:
-            print(f"Error initializing emotion analyzer: {e}")
-            print("Will use keyword-based fallback for emotion detection")
+        self.context_window = ContextWindow()
+        
+        # The model is loaded once per process, in the background, and shared between sessions
+        self.emotion_analyzer = get_emotion_analyzer()
     
     def start_session(self, user_id):
         """Start a new therapy session for user"""
@@ -40,6 +144,7 @@ class SessionTracker:
         self.current_session_id = create_session(user_id)
         self.is_session_active = True
         self.chat_session = []
+        self.context_window.reset()
         
         print(f"Started new session {self.current_session_id} for user {self.current_user_id}")
         return self.current_session_id
@@ -54,33 +159,60 @@ class SessionTracker:
         
         print(f"Ended session {self.current_session_id} for user {self.current_user_id}")
     
-    def record_message(self, sender, content):
+    def detect_emotion(self, content):
+        """
+        Detect the emotion in a user message
+        
+        Args:
+            content: Message content
+            
+        Returns:
+            Emotion label, from the model once it is ready or keywords until then
+        """
+        if not content:
+            return None
+        if self.emotion_analyzer and self.emotion_analyzer.is_initialized:
+            try:
+                # Batched with other sessions' messages into one forward pass
+                return get_emotion_batcher().detect_emotion(content)
+            except Exception as e:
+                print(f"Error detecting emotion, using keywords: {e}")
+        return detect_emotion_keywords(content)
+    
+    def record_message(self, sender, content, emotion=DETECT_EMOTION):
         """
         Record a message in the current session
         
         Args:
             sender: 'user' or 'assistant'
             content: Message content
+            emotion: Emotion label if already known; detected for user messages when omitted
+            
+        Returns:
+            The emotion stored with the message, or None if it is tagged later
         """
         if not self.is_session_active:
             print("Warning: Trying to record message but no active session")
             return
         
-        # Detect emotion for user messages
-        emotion = None
-        if sender == "user" and content:
-            if self.emotion_analyzer and self.emotion_analyzer.is_initialized:
-                emotion = self.emotion_analyzer.detect_emotion(content)
+        # Detect emotion for user messages unless the caller already has it.
+        # With deferred tagging it is stored pending and the tagger fills it in.
+        if emotion is DETECT_EMOTION:
+            if sender != "user":
+                emotion = None
+            elif EMOTION_TAGGING == "deferred" and content:
+                get_emotion_tagger()
+                emotion = EMOTION_PENDING
             else:
-                emotion = detect_emotion_keywords(content)
+                emotion = self.detect_emotion(content)
         
-        # Store in database
-        store_message(self.current_session_id, sender, content, emotion)
+        # Queue for storage; the journal writes it off the request thread
+        get_message_journal().submit(self.current_session_id, sender, content, emotion)
         
         # Update chat session for context
         self.chat_session.append({"role": sender, "content": content})
         
-        return emotion
+        return None if emotion == EMOTION_PENDING else emotion
     
     def record_tapping_sequence(self, tapping_steps):
         """
@@ -113,6 +245,7 @@ class SessionTracker:
     def clear_chat_session(self):
         """Clear the current chat session"""
         self.chat_session = []
+        self.context_window.reset()
     
     def is_active(self):
         """Check if a session is currently active"""
@@ -0,0 +1,234 @@
+"""
+Tapping Parser module for EFT Chatbot
+Finds tapping sequences in model replies, either all at once or line by line while a reply streams in
+"""
+
+import re
+from modules.keyword_matcher import register_keywords, scan_keywords
+
+# Tapping points in the order a sequence visits them
+TAPPING_POINT_NAMES = ["karate chop", "top of head", "eyebrow", "side of eye", "under eye",
+                       "under nose", "chin", "collarbone", "under arm"]
+
+# Phrases that mark a reply as containing a full tapping sequence
+TAPPING_SEQUENCE_PHRASES = ["tapping through the points", "tapping sequence", "tap through each point"]
+
+# Phrases in a user message asking for a round of tapping
+TAPPING_REQUEST_PHRASES = ["let's tap", "another round", "start tapping", "do tapping",
+                           "let's go again", "tap", "tapping"]
+
+# Points whose presence alongside the karate chop marks a reply as a sequence
+SEQUENCE_MARKER_POINTS = ["top of head", "eyebrow", "collarbone"]
+
+register_keywords("tapping_sequence", TAPPING_SEQUENCE_PHRASES)
+register_keywords("tapping_request", TAPPING_REQUEST_PHRASES)
+for _point in TAPPING_POINT_NAMES:
+    register_keywords(f"point:{_point}", [_point])
+
+# Fewer steps than this is treated as an ordinary reply
+MIN_TAPPING_STEPS = 3
+
+DEFAULT_TAPPING_INTRO = "Let's begin tapping through the points."
+
+# A karate chop phrase that opens a round rather than explaining the point
+_SETUP_STATEMENT_RE = re.compile(r"^[\W_]*even\s+though\b", re.IGNORECASE)
+
+# Other ways replies name each point; "the" before a point and "point" after it are also accepted
+POINT_ALIASES = {
+    "karate chop": ["side of hand", "side of the hand"],
+    "top of head": ["top of the head", "crown of the head"],
+    "eyebrow": ["eye brow", "start of the eyebrow", "beginning of the eyebrow", "inner eyebrow"],
+    "side of eye": ["side of the eye"],
+    "under eye": ["under the eye"],
+    "under nose": ["under the nose"],
+    "chin": ["chin point", "crease of the chin"],
+    "collarbone": ["collar bone"],
+    "under arm": ["under the arm", "underarm"],
+}
+
+# A step line: any mix of bullets, numbering ("3.", "4)", "(5)", "Step 6:") and markdown,
+# then either the point followed by a dash or a quoted phrase, or within a few words by
+# a colon ("Eyebrow (inner edge):"), or a short instruction naming the point and ending
+# in a colon ("Tap the eyebrow point:"). A dash only separates right after the point,
+# so prose like "Collarbone pain is self-reported - ..." is not a step
+_ALIAS_TO_POINT = {alias: point for point in TAPPING_POINT_NAMES for alias in [point] + POINT_ALIASES.get(point, [])}
+_POINT_PATTERN = "|".join(
+    r"\s+".join(re.escape(word) for word in alias.split())
+    for alias in sorted(_ALIAS_TO_POINT, key=len, reverse=True)
+)
+_STEP_RE = re.compile(
+    r"^(?:[\s>*_#•·‣◦\-–—]|\(?\d{1,2}[.):]|step\s+\d{1,2}[.):]?)*"
+    r"(?:(?:the\s+)?(?P<point>" + _POINT_PATTERN + r")(?![a-z])(?:\s+point)?"
+    r"(?:[*_]*\s*[\-–—](?=\s|$)|[^:\n\"“'‘]{0,40}?[*_]*\s*:|[*_]*\s+(?=[\"“'‘]))"
+    r"|[^:\n]{1,60}?\b(?P<named_point>" + _POINT_PATTERN + r")(?![a-z])[^:\n]{0,40}?:)"
+    r"[*_\s]*(?P<phrase>.*?)[*_\s]*$",
+    re.IGNORECASE
+)
+
+# Closing lines asking the user to rate the feeling again
+_SUD_RE = re.compile(r"\b(?:0|zero)\s*(?:-|–|to|and)\s*10\b|\bintens|\bhow (?:strong|high|much)", re.IGNORECASE)
+
+class TappingSequence:
+    """
+    A tapping sequence parsed from a reply
+
+    steps holds (point, phrase) pairs in reply order, with points as
+    TAPPING_POINT_NAMES entries; the karate chop step, if it comes first,
+    carries the setup statement. closing is the rating prompt after the
+    last step, if the reply asks for one.
+    """
+
+    __slots__ = ("intro", "steps", "closing")
+
+    def __init__(self, intro="", steps=(), closing=None):
+        self.intro = intro
+        self.steps = list(steps)
+        self.closing = closing
+
+    @property
+    def setup(self):
+        """The setup statement, or None if the sequence doesn't open on the karate chop"""
+        if self.steps and self.steps[0][0] == TAPPING_POINT_NAMES[0]:
+            return self.steps[0][1]
+        return None
+
+    def step_lines(self):
+        """Steps formatted for display and storage, e.g. Eyebrow: 'All this worry.'"""
+        return [f"{point.capitalize()}: {phrase}" for point, phrase in self.steps]
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __repr__(self):
+        return f"TappingSequence(intro={self.intro!r}, steps={self.steps!r}, closing={self.closing!r})"
+
+def parse_step_line(line):
+    """
+    Read one line of a reply as a tapping step
+
+    Args:
+        line: A single line of text
+
+    Returns:
+        (point, phrase) with point from TAPPING_POINT_NAMES and phrase possibly
+        empty (when it follows on the next line), or None if the line is not a step
+    """
+    match = _STEP_RE.match(line)
+    if not match:
+        return None
+    name = match.group("point") or match.group("named_point")
+    point = _ALIAS_TO_POINT[" ".join(name.lower().split())]
+    return point, match.group("phrase")
+
+def parse_tapping_sequence(text):
+    """
+    Parse a whole reply in one pass
+
+    Returns:
+        The TappingSequence; it has no steps if the reply names no tapping points
+    """
+    parser = TappingStreamParser()
+    parser.feed(text)
+    parser.close()
+    return parser.sequence
+
+def has_tapping_indicators(text):
+    """Check whether a reply reads like a full tapping sequence"""
+    found = scan_keywords(text)
+    return (
+        "tapping_sequence" in found or
+        ("point:karate chop" in found and
+         any(f"point:{point}" in found for point in SEQUENCE_MARKER_POINTS))
+    )
+
+def is_tapping_request(message):
+    """Check whether a user message asks to start (or repeat) a tapping round"""
+    return "tapping_request" in scan_keywords(message or "")
+
+class TappingStreamParser:
+    """
+    Incremental tapping detection for a streamed reply
+
+    Feed text chunks as they arrive; each line is parsed as soon as its newline
+    comes in, so the sequence is ready the moment the stream ends.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.sequence = TappingSequence()
+        self._intro_lines = []
+        self._trailing_lines = []
+        self._pending = ""
+        self._awaiting_phrase = None
+
+    def feed(self, chunk):
+        """Add a chunk of streamed text and parse any lines it completes"""
+        self.text += chunk
+        self._pending += chunk
+        while "\n" in self._pending:
+            line, self._pending = self._pending.split("\n", 1)
+            self._take_line(line)
+
+    def close(self):
+        """Parse the final line once the stream has ended"""
+        if self._pending:
+            self._take_line(self._pending)
+            self._pending = ""
+
+        trailing = "\n".join(self._trailing_lines).strip()
+        if trailing and _SUD_RE.search(trailing):
+            self.sequence.closing = trailing
+
+    def _take_line(self, line):
+        line = line.strip()
+        step = parse_step_line(line) if line else None
+
+        if step:
+            point, phrase = step
+            self.sequence.steps.append((point, phrase))
+            # Anything between two steps is commentary, not the closing
+            self._trailing_lines = []
+            self._awaiting_phrase = None if phrase else len(self.sequence.steps) - 1
+        elif not self.sequence.steps:
+            self._intro_lines.append(line)
+            self.sequence.intro = "\n".join(self._intro_lines).strip()
+        elif line and self._awaiting_phrase is not None:
+            # "Karate chop:" with its phrase on the line below
+            point, _ = self.sequence.steps[self._awaiting_phrase]
+            self.sequence.steps[self._awaiting_phrase] = (point, line)
+            self._awaiting_phrase = None
+        elif line:
+            self._trailing_lines.append(line)
+
+    @property
+    def steps(self):
+        """Steps found so far, formatted for display"""
+        return self.sequence.step_lines()
+
+    @property
+    def in_sequence(self):
+        """True once a line naming a tapping point has arrived"""
+        return bool(self.sequence.steps)
+
+    @property
+    def intro(self):
+        """Text before the first tapping point line"""
+        return self.sequence.intro
+
+    def visible_text(self):
+        """
+        What to show while streaming: everything until the sequence starts,
+        then just the intro, since the steps are shown one at a time via Next
+        """
+        if self.sequence.steps:
+            return self.sequence.intro
+        return self.text
+
+    def starts_with_setup(self):
+        """True once the reply has begun a full round with a karate chop setup statement ("Even though ...")"""
+        setup = self.sequence.setup
+        return bool(setup) and bool(_SETUP_STATEMENT_RE.match(setup))
+
+    def is_tapping_sequence(self):
+        """Whether the finished reply should run as a step-by-step tapping sequence"""
+        return has_tapping_indicators(self.text) and len(self.sequence.steps) >= MIN_TAPPING_STEPS
@@ -0,0 +1,321 @@
+"""
+Tapping Scripts module for EFT Chatbot
+Builds tapping rounds locally from the user's issue and emotion using a curated phrase bank
+"""
+
+import os
+import re
+import threading
+from modules.tapping_parser import TAPPING_POINT_NAMES
+from modules.emotion_analysis import detect_emotion_keywords
+
+# Build tapping rounds here instead of letting the model write all nine points
+LOCAL_TAPPING_SCRIPTS = os.getenv("EFT_LOCAL_TAPPING_SCRIPTS", "1") != "0"
+
+# How far back to look for what the user wants to tap on
+ISSUE_LOOKBACK_MESSAGES = 6
+MAX_ISSUE_WORDS = 10
+
+# Reminder phrase templates use {noun} ("anxiety"), {feeling} ("anxious"),
+# {issue} (" about my exam", or "") and {location} ("in my chest", or "in my body")
+PHRASE_BANK = {
+    "anxious": {
+        "feeling": "anxious",
+        "noun": "anxiety",
+        "reminders": [
+            "This {noun}{issue}.",
+            "All this worry.",
+            "I feel so {feeling}.",
+            "This {noun} {location}.",
+            "What if it goes wrong?",
+            "My mind keeps racing.",
+            "All this fear{issue}.",
+            "It's hard to feel safe right now.",
+            "This tight, nervous feeling.",
+            "I can let myself breathe.",
+            "Maybe I can let some of this worry go.",
+            "Calming down a little, just for now."
+        ]
+    },
+    "sad": {
+        "feeling": "sad",
+        "noun": "sadness",
+        "reminders": [
+            "This {noun}{issue}.",
+            "I feel so low.",
+            "This heavy feeling {location}.",
+            "All this hurt.",
+            "It's hard to carry this.",
+            "I miss how things were.",
+            "This {noun} I've been holding.",
+            "It's okay to feel {feeling}.",
+            "I don't have to push it away.",
+            "Letting myself feel this.",
+            "Being gentle with myself.",
+            "Some of this {noun} can soften."
+        ]
+    },
+    "angry": {
+        "feeling": "angry",
+        "noun": "anger",
+        "reminders": [
+            "This {noun}{issue}.",
+            "I feel so {feeling}.",
+            "All this frustration.",
+            "This hot feeling {location}.",
+            "It just isn't fair.",
+            "I'm so fed up.",
+            "All this {noun} I'm holding on to.",
+            "It makes sense that I'm {feeling}.",
+            "I don't have to act on it.",
+            "Letting some of this heat cool.",
+            "I can choose how I respond.",
+            "Releasing this {noun} bit by bit."
+        ]
+    },
+    "overwhelmed": {
+        "feeling": "overwhelmed",
+        "noun": "stress",
+        "reminders": [
+            "All this {noun}{issue}.",
+            "There's too much going on.",
+            "I feel so {feeling}.",
+            "This pressure {location}.",
+            "I can't keep up.",
+            "Everything at once.",
+            "All this tension.",
+            "I'm doing the best I can.",
+            "One thing at a time.",
+            "I can slow down right now.",
+            "Letting my body relax a little.",
+            "Releasing some of this pressure."
+        ]
+    },
+    "neutral": {
+        "feeling": "unsettled",
+        "noun": "feeling",
+        "reminders": [
+            "This {noun}{issue}.",
+            "Whatever is going on for me.",
+            "This {noun} {location}.",
+            "I notice it's still there.",
+            "All of this.",
+            "I don't need to fix it right now.",
+            "Just noticing this {noun}.",
+            "It's safe to feel what I feel.",
+            "Tuning in to my body.",
+            "Letting it be as it is.",
+            "Allowing it to shift.",
+            "Feeling a little calmer."
+        ]
+    }
+}
+
+# Detected emotions that share a phrase set
+EMOTION_ALIASES = {
+    "stressed": "overwhelmed",
+    "surprised": "anxious",
+    "fear": "anxious",
+    "sadness": "sad",
+    "anger": "angry",
+    # Tapping on a good feeling still starts from whatever is left over
+    "happy": "neutral",
+    "positive": "neutral"
+}
+
+SETUP_ENDINGS = [
+    "I deeply and completely accept myself.",
+    "I'm okay, and I accept how I feel.",
+    "I choose to be kind to myself.",
+    "I accept myself and I'm open to feeling calmer."
+]
+
+BODY_LOCATIONS = ["chest", "stomach", "tummy", "throat", "shoulders", "neck", "head",
+                  "jaw", "back", "heart", "gut", "hands", "legs"]
+
+# Ways users introduce what is bothering them; the captured text keeps its connector.
+# "that" only counts after a feeling ("worried that..."), not in "I think that..."
+ISSUE_PATTERNS = [
+    re.compile(r"\b(?:tap|tapping|work)\s+(?:on|for|about)\s+(.+)", re.IGNORECASE),
+    re.compile(r"\b(?:worried|scared|afraid|anxious|nervous|stressed|upset|sad|angry|frustrated|"
+               r"ashamed|guilty)\s+(that\s+.+)", re.IGNORECASE),
+    re.compile(r"\b((?:about|because|since)\s+.+)", re.IGNORECASE),
+]
+
+# Issues naming the tapping itself ("about tapping") say nothing about the problem
+ISSUE_TAPPING_WORDS = {"tap", "taps", "tapping", "eft"}
+
+# "about" takes a thing, not a new clause ("about I don't know")
+ISSUE_CLAUSE_STARTS = {"i", "im", "i'm", "ive", "i've", "id", "i'd", "you", "we", "they", "he", "she", "there"}
+
+# Short replies that say nothing about the issue
+_RATING_RE = re.compile(r"^\s*(?:it'?s\s+)?(?:about\s+|maybe\s+|a\s+)?(\d{1,2})(?:\s*/\s*10|\s+out\s+of\s+10)?\s*\.?\s*$",
+                        re.IGNORECASE)
+_CLAUSE_END_RE = re.compile(r"[.!?;,\n]|\s(?:and|but|so)\s")
+
+_stats_lock = threading.Lock()
+_stats = {"scripts_built": 0, "model_scripts_replaced": 0}
+
+def _phrase_set(emotion):
+    emotion = (emotion or "neutral").lower()
+    emotion = EMOTION_ALIASES.get(emotion, emotion)
+    return PHRASE_BANK.get(emotion, PHRASE_BANK["neutral"])
+
+def _trim_issue(text):
+    """Cut a captured issue down to its first clause"""
+    text = _CLAUSE_END_RE.split(text, 1)[0].strip()
+    words = text.split()
+    if not words:
+        return ""
+    return " ".join(words[:MAX_ISSUE_WORDS])
+
+def _is_clean_issue(issue):
+    """Whether an issue with its connector reads well after "Even though I feel anxious" """
+    words = [word.strip("'\"") for word in issue.lower().split()]
+    if len(words) < 2 or ISSUE_TAPPING_WORDS.intersection(words):
+        return False
+    # "about it" says nothing new
+    if len(words) == 2 and words[1] in ("it", "this", "that"):
+        return False
+    return not (words[0] == "about" and words[1] in ISSUE_CLAUSE_STARTS)
+
+def extract_issue(chat_session):
+    """
+    Find what the user wants to tap on in the recent conversation
+
+    Args:
+        chat_session: Chat messages, oldest first
+
+    Returns:
+        The issue with its connector (e.g. "about my exam tomorrow"), or "" if
+        no message states one cleanly enough to quote back
+    """
+    user_messages = [message["content"] for message in chat_session[-ISSUE_LOOKBACK_MESSAGES:]
+                     if message["role"] == "user"]
+    for text in reversed(user_messages):
+        if _RATING_RE.match(text):
+            continue
+        for pattern in ISSUE_PATTERNS:
+            match = pattern.search(text)
+            if match:
+                issue = _trim_issue(match.group(1))
+                if pattern is ISSUE_PATTERNS[0]:
+                    # "tap on my exam" -> "about my exam"
+                    issue = f"about {issue}"
+                if _is_clean_issue(issue):
+                    return issue
+                # Otherwise try the other patterns, then earlier messages
+    return ""
+
+def extract_body_location(chat_session):
+    """Where the user said they feel it, e.g. "in my chest", or "" if they haven't"""
+    for message in reversed(chat_session[-ISSUE_LOOKBACK_MESSAGES:]):
+        if message["role"] != "user":
+            continue
+        words = set(re.findall(r"[a-z]+", message["content"].lower()))
+        for location in BODY_LOCATIONS:
+            if location in words:
+                return f"in my {location}"
+    return ""
+
+def extract_intensity(chat_session):
+    """The most recent 0-10 rating the user gave, or None"""
+    for message in reversed(chat_session[-ISSUE_LOOKBACK_MESSAGES:]):
+        if message["role"] != "user":
+            continue
+        match = _RATING_RE.match(message["content"])
+        if match and int(match.group(1)) <= 10:
+            return int(match.group(1))
+    return None
+
+def session_emotion(chat_session, current_emotion=None):
+    """
+    The emotion to tap on: the current message's if it carries one, otherwise
+    the latest one the keyword detector finds in recent user messages
+    """
+    if current_emotion and current_emotion not in ("neutral", "happy", "positive"):
+        return current_emotion
+    for message in reversed(chat_session[-ISSUE_LOOKBACK_MESSAGES:]):
+        if message["role"] == "user":
+            emotion = detect_emotion_keywords(message["content"])
+            if emotion != "neutral":
+                return emotion
+    return current_emotion or "neutral"
+
+def build_tapping_script(issue="", emotion="neutral", location="", intensity=None, variant=0):
+    """
+    Build a full tapping round: a karate chop setup statement and eight reminder phrases
+
+    Args:
+        issue: What the user is tapping on, with its connector (e.g. "about my exam")
+        emotion: Detected emotion label
+        location: Where the user feels it (e.g. "in my chest")
+        intensity: Latest 0-10 rating, if known
+        variant: Round number, so repeated rounds use different phrases
+
+    Returns:
+        List of nine steps in TAPPING_POINT_NAMES order, formatted like
+        "Eyebrow: 'All this worry.'"
+    """
+    phrases = _phrase_set(emotion)
+    values = {
+        "noun": phrases["noun"],
+        "feeling": phrases["feeling"],
+        "issue": f" {issue}" if issue else "",
+        "location": location or "in my body"
+    }
+
+    # Later rounds start from what is left over
+    if variant > 0 and intensity is not None and intensity > 0:
+        setup = f"Even though I still have some of this {values['noun']}{values['issue']}"
+    elif intensity is not None and intensity >= 7:
+        setup = f"Even though I feel really {values['feeling']}{values['issue']}"
+    elif issue:
+        setup = f"Even though I feel {values['feeling']}{values['issue']}"
+    else:
+        setup = f"Even though I feel {values['feeling']} right now"
+    setup_ending = SETUP_ENDINGS[variant % len(SETUP_ENDINGS)]
+    steps = [f"{TAPPING_POINT_NAMES[0].capitalize()}: '{setup}, {setup_ending}'"]
+
+    # Eight consecutive reminders, starting further into the bank each round;
+    # the first point always names the issue
+    reminders = phrases["reminders"]
+    offset = (variant * 4) % len(reminders)
+    chosen = [reminders[0]] + [reminders[1 + (offset + i) % (len(reminders) - 1)]
+                               for i in range(len(TAPPING_POINT_NAMES) - 2)]
+    for point, template in zip(TAPPING_POINT_NAMES[1:], chosen):
+        steps.append(f"{point.capitalize()}: '{template.format(**values)}'")
+
+    with _stats_lock:
+        _stats["scripts_built"] += 1
+    return steps
+
+def build_script_for_session(chat_session, emotion=None, variant=0):
+    """
+    Build a tapping round from the conversation so far
+
+    Args:
+        chat_session: Chat messages, oldest first
+        emotion: Emotion detected for the latest user message, if any
+        variant: Round number within the session
+
+    Returns:
+        List of nine tapping steps
+    """
+    return build_tapping_script(
+        issue=extract_issue(chat_session),
+        emotion=session_emotion(chat_session, emotion),
+        location=extract_body_location(chat_session),
+        intensity=extract_intensity(chat_session),
+        variant=variant
+    )
+
+def count_replaced_model_script():
+    """Note a model reply cut short because the round was built locally"""
+    with _stats_lock:
+        _stats["model_scripts_replaced"] += 1
+
+def get_script_stats():
+    """How many rounds were built locally and how many model scripts they replaced"""
+    with _stats_lock:
+        return dict(_stats)